@@ -0,0 +1,341 @@
+"""
+Core analysis functions for the Quick Edit experiment
+Run: python analysis_functions.py data/processed/sessions.csv
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from data_generation import FUNNEL_STEPS
+from sessionization import STEP_BITS
+
+SEGMENT_COLUMNS = ['creator_cohort', 'device_type']
+
+# Business model constants (see README "Business Assumptions")
+INSTAGRAM_DAU = 1.5e9
+CASUAL_SHARE_OF_CREATORS = 0.6  # 15% casual + 10% power = 25% of DAU
+CASUAL_ABSOLUTE_LIFT = 0.017  # 15.3% -> 17.0% creation success
+POWER_ABSOLUTE_LIFT = 0.043  # 34.8% -> 39.1% creation success
+REELS_PER_ADDITIONAL_CREATOR = 1.1
+WATCH_SECONDS_PER_REEL = 25
+AD_IMPRESSIONS_PER_MONETIZED_REEL = 1.5
+DAYS_PER_MONTH = 30
+
+
+def funnel_step_counts(sessions, by=None):
+    """Sessions that reached each funnel step, one row overall or per value of `by`
+
+    Counts of disjoint sets of sessions add up, so daily partials can be
+    merged by summing rows with the same label.
+    """
+    masks = sessions['steps_mask'].to_numpy()
+    reached = pd.DataFrame({step: (masks & STEP_BITS[step]) > 0 for step in FUNNEL_STEPS})
+    if by is None:
+        return reached.sum().to_frame().T
+    return reached.groupby(sessions[by].to_numpy()).sum()
+
+
+def funnel_conversion(counts, by=None):
+    """Funnel sessions_reached / conversion_rate / dropoff_rate from funnel_step_counts() rows"""
+    conversion = counts.div(counts.iloc[:, 0], axis=0)
+    dropoff = (1 - counts / counts.shift(1, axis=1)).fillna(0.0)
+
+    funnel = pd.DataFrame({
+        'funnel_step': np.tile(FUNNEL_STEPS, len(counts)),
+        'sessions_reached': counts.to_numpy().ravel(),
+        'conversion_rate': conversion.to_numpy().ravel(),
+        'dropoff_rate': dropoff.to_numpy().ravel(),
+    })
+    if by is not None:
+        funnel.insert(0, by, np.repeat(counts.index.to_numpy(), len(FUNNEL_STEPS)))
+    return funnel
+
+
+def calculate_funnel_conversion(sessions, by=None):
+    """Funnel sessions_reached / conversion_rate / dropoff_rate from a session table"""
+    return funnel_conversion(funnel_step_counts(sessions, by), by)
+
+
+def ratio_variance(sum_y, sum_n, sum_yy, sum_nn, sum_yn):
+    """Ratio sum_y / sum_n and its cluster-robust (delta-method) variance
+
+    Arguments are sums over clusters (users) of the per-cluster totals y and
+    n and of their squares and cross product:
+    var = sum((y - r n)^2) / sum(n)^2 = (s_yy - 2 r s_yn + r^2 s_nn) / s_n^2
+    """
+    ratio = sum_y / sum_n
+    variance = (sum_yy - 2 * ratio * sum_yn + ratio ** 2 * sum_nn) / sum_n ** 2
+    return ratio, np.maximum(variance, 0)
+
+
+def _first_rows(codes):
+    """Row of the first occurrence of every code from pd.factorize (codes appear in order)"""
+    seen = np.maximum.accumulate(codes)
+    return np.flatnonzero(np.r_[True, codes[1:] > seen[:-1]])
+
+
+def srm_chi_square(observed, expected_shares):
+    """Sample-ratio-mismatch chi-square test for every row of a (groups x variants) count array
+
+    expected_shares is one share vector for all rows, or one per row.
+    Returns (chi2, p_value) arrays with one entry per row.
+    """
+    observed = np.atleast_2d(np.asarray(observed, dtype=float))
+    shares = np.asarray(expected_shares, dtype=float)
+    expected = observed.sum(axis=1, keepdims=True) * (shares / shares.sum(axis=-1, keepdims=True))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        chi2 = np.where(expected > 0, (observed - expected) ** 2 / expected, 0.0).sum(axis=1)
+    return chi2, stats.chi2.sf(chi2, observed.shape[1] - 1)
+
+
+def adjust_p_values(p_values, method='holm'):
+    """Multiplicity-adjusted p-values, each row of a 2-D array being one family
+
+    method is 'holm' (family-wise error), 'bh' (Benjamini-Hochberg false
+    discovery rate) or 'bonferroni'. NaN p-values (tests that could not be
+    run) are not part of their family and stay NaN.
+    """
+    p = np.atleast_2d(np.asarray(p_values, dtype=float))
+    m = (~np.isnan(p)).sum(axis=1, keepdims=True)
+    if method == 'bonferroni':
+        return np.minimum(p * m, 1.0)
+    # argsort puts NaNs last, so the first m ranks of each row are its family
+    order = np.argsort(p, axis=1, kind='stable')
+    ranked = np.take_along_axis(p, order, axis=1)
+    rank = np.arange(p.shape[1])
+    if method == 'holm':
+        ranked = np.maximum.accumulate(ranked * (m - rank), axis=1)
+    elif method == 'bh':
+        scaled = np.where(np.isnan(ranked), np.inf, ranked * m / (rank + 1))
+        ranked = np.minimum.accumulate(scaled[:, ::-1], axis=1)[:, ::-1]
+        ranked[rank >= m] = np.nan
+    else:
+        raise ValueError(f"unknown p-value adjustment {method!r}")
+    adjusted = np.empty_like(p)
+    np.put_along_axis(adjusted, order, np.minimum(ranked, 1.0), axis=1)
+    return adjusted
+
+
+def contrast_pairs(variants, control='control', pairwise=False):
+    """(variant, baseline) index pairs: every arm against control, plus every other pair if pairwise"""
+    others = [i for i, v in enumerate(variants) if v != control]
+    pairs = [(i, variants.index(control)) for i in others]
+    if pairwise:
+        pairs += [(j, i) for k, i in enumerate(others) for j in others[k + 1:]]
+    return pairs
+
+
+def user_totals(sessions, metrics, segments=SEGMENT_COLUMNS, cluster='user_id'):
+    """Per-user session count n and metric totals, with the user's variant and segments
+
+    Randomization is per user, so sessions of one user are not independent
+    and the tests work on these totals (one factorize plus a bincount per
+    metric). Only user-sized arrays are built, so memory stays user-sized
+    however many sessions there are. cluster=None treats every session as
+    its own cluster, which gives a normal-approximation z-test on
+    independent sessions with n-denominator variances (not Welch's t-test).
+    Totals of disjoint sets of sessions add up per user, which is how
+    incremental.py merges daily partitions.
+    """
+    if cluster is None:
+        codes = np.arange(len(sessions))
+    else:
+        codes = pd.factorize(sessions[cluster])[0]
+    n_users = codes.max() + 1 if len(codes) else 0
+    first = _first_rows(codes)
+
+    # Segments and variant are user attributes
+    totals = pd.DataFrame({col: sessions[col].iloc[first].astype(str).to_numpy() for col in ['variant'] + list(segments)})
+    if cluster is not None:
+        totals.insert(0, cluster, sessions[cluster].to_numpy()[first])
+    totals['n'] = np.bincount(codes, minlength=n_users).astype(float)
+    for m in metrics:
+        totals[m] = np.bincount(codes, weights=sessions[m].to_numpy(dtype=float), minlength=n_users)
+    return totals
+
+
+def variant_sums(totals, metrics, segments=SEGMENT_COLUMNS, variants=None):
+    """Per-(segment, variant) sums of the per-user totals from user_totals() for every metric
+
+    Everything here works on user-sized arrays, so memory does not grow
+    with the number of sessions, metrics or segments. Segment labels are
+    sorted, so the result does not depend on the order of the users.
+
+    Returns (variants, [(metric, segment labels, {statistic: (segments x variants) array})]).
+    """
+    n = totals['n'].to_numpy(dtype=float)
+    user_variant = totals['variant'].to_numpy()
+    variants = list(variants) if variants is not None else sorted(set(user_variant))
+    variant_codes = pd.Index(variants).get_indexer(user_variant)
+    k = len(variants)
+
+    groups = [(np.zeros(len(totals), dtype=np.int64), np.array(['overall']))]
+    for col in segments:
+        seg_codes, labels = pd.factorize(totals[col].to_numpy(), sort=True)
+        groups.append((seg_codes, np.asarray(labels)))
+
+    tables = []
+    for m in metrics:
+        y = totals[m].to_numpy(dtype=float)
+        for seg_codes, labels in groups:
+            # (segment, variant) cell of every user
+            cell = k * seg_codes + variant_codes
+            sums = {name: np.bincount(cell, weights=w, minlength=k * len(labels)).reshape(-1, k)
+                    for name, w in [('users', None), ('n', n), ('y', y), ('yy', y ** 2),
+                                    ('nn', n ** 2), ('yn', y * n)]}
+            tables.append((m, labels, sums))
+    return variants, tables
+
+
+def compare_variants(sessions, metric='successful_post', segments=SEGMENT_COLUMNS, control='control',
+                     pairwise=False, alpha=0.05, correction='holm', cluster='user_id'):
+    """Every variant against control (and optionally against each other), overall and per segment
+
+    See compare_totals(); this reduces a session table to per-user totals first.
+    """
+    metrics = [metric] if isinstance(metric, str) else list(metric)
+    return compare_totals(user_totals(sessions, metrics, segments, cluster), metric, segments, control,
+                          pairwise, alpha, correction)
+
+
+def compare_totals(totals, metric='successful_post', segments=SEGMENT_COLUMNS, control='control',
+                   pairwise=False, alpha=0.05, correction='holm'):
+    """Variant contrasts from per-user totals (user_totals(), or merged daily partials)
+
+    Means are ratios of user sums with cluster-robust variances. All contrasts
+    of a segment come from one contrast-matrix product over the (segments x
+    variants) mean and variance arrays. p_adjusted controls multiplicity
+    across the contrasts of each segment and metric; ci_low / ci_high are
+    Bonferroni-simultaneous intervals for the relative lift.
+    """
+    metrics = [metric] if isinstance(metric, str) else list(metric)
+    observed = totals['variant'].unique()
+    variants = [control] + sorted(v for v in observed if v != control)
+    pairs = contrast_pairs(variants, control, pairwise)
+    # Rows select the variant (A) and baseline (B) arm of each contrast
+    a = np.eye(len(variants))[[i for i, _ in pairs]]
+    b = np.eye(len(variants))[[j for _, j in pairs]]
+    z = stats.norm.ppf(1 - alpha / (2 * len(pairs)))
+
+    frames = []
+    for m, labels, sums in variant_sums(totals, metrics, segments, variants)[1]:
+        mean, var = ratio_variance(sums['y'], sums['n'], sums['yy'], sums['nn'], sums['yn'])
+        mean_a, mean_b, var_a, var_b = mean @ a.T, mean @ b.T, var @ a.T, var @ b.T
+        p_value = 2 * stats.norm.sf(np.abs(mean_a - mean_b) / np.sqrt(var_a + var_b))
+        relative = mean_a / mean_b - 1
+        relative_se = np.sqrt(var_a / mean_b ** 2 + mean_a ** 2 * var_b / mean_b ** 4)
+        shape = relative.shape
+        frames.append(pd.DataFrame({
+            'metric': m,
+            'segment': np.repeat(labels, len(pairs)),
+            'variant': np.tile([variants[i] for i, _ in pairs], len(labels)),
+            'baseline': np.tile([variants[j] for _, j in pairs], len(labels)),
+            'baseline_mean': mean_b.ravel(),
+            'variant_mean': mean_a.ravel(),
+            'relative_lift': relative.ravel(),
+            'p_value': p_value.ravel(),
+            'p_adjusted': adjust_p_values(p_value, correction).reshape(shape).ravel(),
+            'ci_low': (relative - z * relative_se).ravel(),
+            'ci_high': (relative + z * relative_se).ravel(),
+            'baseline_n': (sums['n'] @ b.T).ravel().astype(np.int64),
+            'variant_n': (sums['n'] @ a.T).ravel().astype(np.int64),
+            'baseline_users': (sums['users'] @ b.T).ravel().astype(np.int64),
+            'variant_users': (sums['users'] @ a.T).ravel().astype(np.int64),
+        }))
+
+    results = pd.concat(frames, ignore_index=True)
+    results['significant'] = results['p_adjusted'] < alpha
+    return results if len(metrics) > 1 else results.drop(columns='metric')
+
+
+def analyze_ab_test(sessions, metric='successful_post', segments=SEGMENT_COLUMNS, alpha=0.05, cluster='user_id'):
+    """Treatment vs control test of session metrics with user-clustered standard errors
+
+    Two-arm view of compare_variants() in the ab_results layout (control_* /
+    treatment_* columns), overall and for every segment. `metric` may be a
+    list; the result then has a metric column.
+    """
+    contrasts = compare_variants(sessions, metric, segments, 'control', alpha=alpha, cluster=cluster)
+    contrasts = contrasts[contrasts['variant'] == 'treatment'].reset_index(drop=True)
+    return wide_ab_results(contrasts)
+
+
+def wide_ab_results(contrasts):
+    """Treatment-vs-control rows of a contrast table in the ab_results layout"""
+    renamed = contrasts.rename(columns={'baseline_mean': 'control_mean', 'variant_mean': 'treatment_mean',
+                                       'baseline_n': 'control_n', 'variant_n': 'treatment_n',
+                                       'baseline_users': 'control_users', 'variant_users': 'treatment_users'})
+    return renamed.drop(columns=['variant', 'baseline', 'p_adjusted'])
+
+
+def long_ab_results(ab_results):
+    """ab_results rows as treatment-vs-control contrasts (the compare_variants layout)"""
+    contrasts = ab_results.rename(columns={'control_mean': 'baseline_mean', 'treatment_mean': 'variant_mean',
+                                           'control_n': 'baseline_n', 'treatment_n': 'variant_n',
+                                           'control_users': 'baseline_users', 'treatment_users': 'variant_users'})
+    contrasts.insert(contrasts.columns.get_loc('segment') + 1, 'variant', 'treatment')
+    contrasts.insert(contrasts.columns.get_loc('variant') + 1, 'baseline', 'control')
+    if 'p_adjusted' not in contrasts:
+        contrasts['p_adjusted'] = contrasts['p_value']
+    return contrasts
+
+
+def calculate_business_impact(adoption_rate=0.6, monetization_rate=0.35, cpm=20, creator_share=0.25,
+                              casual_lift=CASUAL_ABSOLUTE_LIFT, power_lift=POWER_ABSOLUTE_LIFT):
+    """Daily and monthly business impact under the given assumptions
+
+    Arguments may be scalars or broadcastable numpy arrays, so a whole grid
+    of assumptions is evaluated in one call. The lifts are absolute changes
+    in creation success rate for casual and power creators.
+    """
+    adoption_rate, monetization_rate, cpm, creator_share = np.broadcast_arrays(
+        *[np.asarray(x, dtype=float) for x in (adoption_rate, monetization_rate, cpm, creator_share)])
+
+    casual = creator_share * CASUAL_SHARE_OF_CREATORS
+    power = creator_share * (1 - CASUAL_SHARE_OF_CREATORS)
+    creators = INSTAGRAM_DAU * adoption_rate * (casual * casual_lift + power * power_lift)
+    reels = creators * REELS_PER_ADDITIONAL_CREATOR
+    watch_hours = reels * WATCH_SECONDS_PER_REEL / 3600
+    revenue = reels * monetization_rate * AD_IMPRESSIONS_PER_MONETIZED_REEL * cpm / 1000
+
+    return {
+        'daily': {
+            'additional_creators': creators,
+            'additional_reels': reels,
+            'additional_watch_time_hours': watch_hours,
+            'additional_revenue': revenue
+        },
+        'monthly': {
+            'additional_reels': reels * DAYS_PER_MONTH,
+            'additional_watch_time_hours': watch_hours * DAYS_PER_MONTH,
+            'additional_revenue': revenue * DAYS_PER_MONTH
+        }
+    }
+
+
+def absolute_lifts(ab_results):
+    """Casual / power creator absolute lifts from an ab_results table"""
+    by_segment = ab_results.set_index('segment')
+    lift = by_segment['treatment_mean'] - by_segment['control_mean']
+    return {'casual_lift': float(lift['casual_creator']), 'power_lift': float(lift['power_creator'])}
+
+
+def main(sessions_path, output_dir='results'):
+    """Write funnel and A/B result tables from a session table"""
+    os.makedirs(output_dir, exist_ok=True)
+    sessions = pd.read_csv(sessions_path)
+
+    calculate_funnel_conversion(sessions).to_csv(os.path.join(output_dir, 'funnel_metrics_overall.csv'), index=False)
+    calculate_funnel_conversion(sessions, by='creator_cohort').to_csv(
+        os.path.join(output_dir, 'funnel_metrics_by_cohort.csv'), index=False)
+    analyze_ab_test(sessions).to_csv(os.path.join(output_dir, 'ab_test_results.csv'), index=False)
+    compare_variants(sessions, pairwise=True).to_csv(os.path.join(output_dir, 'ab_contrasts.csv'), index=False)
+    print(f"Wrote funnel and A/B results for {len(sessions):,} sessions to {output_dir}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1])
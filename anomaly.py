@@ -0,0 +1,229 @@
+"""
+Streaming anomaly detection on hourly rollout metrics
+Run: python anomaly.py data/generated/events_sample.csv data/generated/users.csv
+
+Each monitored metric is a rate (crashes / sessions, posts / sessions)
+tracked per series, where a series is a variant crossed with a segment
+(overall, each segment value, and each creator cohort x device). Every hour,
+all series of a metric are scored at once with a Bernoulli CUSUM:
+
+    llr   = x log(p1 / p0) + (n - x) log((1 - p1) / (1 - p0)),  p1 = shift * p0
+    S     = max(0, S + llr)            -> alert when S > threshold, then restart
+
+where x / n are the hour's events / sessions and p0 is the expected rate. p0
+comes from exponentially decayed sums of events and sessions: a seasonal
+estimate per hour-of-day slot, shrunk towards the series' all-hours level,
+which is itself shrunk towards the rate pooled over all series. Sparse
+series (rare crashes) therefore do not alert on their first event, and a
+slot only departs from the level once it has enough sessions of its own.
+An alerting hour is not added to the baseline.
+
+Per-series state is fixed size (24 slots, one level, one CUSUM), so
+memory and the cost of an hourly update are linear in the number of series
+and do not depend on history. detect_anomalies() scores the stored history
+in one pass; LiveAnomalies keeps the detectors between polls of the live
+event stream (live.py) and scores each hour as it completes. The threshold
+sets the false-alarm rate per series: an alert is expected about once per
+e^threshold in-control hours.
+"""
+
+import sys
+
+import numpy as np
+import pandas as pd
+
+from analysis_functions import SEGMENT_COLUMNS
+from data_generation import CRASH_EVENT
+from sessionization import STEP_BITS, summarize_sessions
+
+# metric -> (events column, exposure column, rate shift to detect)
+MONITORS = {
+    'success_rate': ('posts', 'sessions', 0.8),
+    'crash_rate': ('crashes', 'sessions', 2.0),
+}
+DEFAULT_THRESHOLD = 8.0
+LEVEL_DECAY = 0.02  # per hour, for the all-hours level
+SEASON_DECAY = 0.2  # per day, for each hour-of-day slot
+PRIOR_SESSIONS = 50  # pseudo-sessions at the rate pooled over series, added to each level
+SEASON_PRIOR_SESSIONS = 1000  # pseudo-sessions at the series level, added to each hour-of-day slot
+WARMUP_HOURS = 6
+
+COUNT_COLUMNS = ['sessions', 'posts', 'crashes']
+ALERT_COLUMNS = ['hour', 'metric', 'variant', 'segment', 'observed_rate', 'expected_rate', 'sessions', 'cusum']
+
+
+class RateCusum:
+    """Seasonal-baseline Bernoulli CUSUM over many rate series at once"""
+
+    def __init__(self, n_series, shift, threshold=DEFAULT_THRESHOLD):
+        self.shift = shift
+        self.threshold = threshold
+        # Exponentially decayed sums of events and exposure: overall and per hour-of-day slot
+        self.level_events = np.zeros(n_series)
+        self.level_exposure = np.zeros(n_series)
+        self.slot_events = np.zeros((24, n_series))
+        self.slot_exposure = np.zeros((24, n_series))
+        self.hours_seen = np.zeros(n_series, dtype=np.int64)
+        self.cusum = np.zeros(n_series)
+
+    def expected(self, slot):
+        """Baseline rate per series for an hour-of-day slot"""
+        pooled = self.level_events.sum() / max(self.level_exposure.sum(), 1e-12)
+        level = (self.level_events + PRIOR_SESSIONS * pooled) / (self.level_exposure + PRIOR_SESSIONS)
+        return ((self.slot_events[slot] + SEASON_PRIOR_SESSIONS * level)
+                / (self.slot_exposure[slot] + SEASON_PRIOR_SESSIONS))
+
+    def update(self, hour, events, exposure):
+        """Score one hour of counts per series; returns (cusum, alert mask, expected rate)"""
+        events = np.asarray(events, dtype=float)
+        exposure = np.asarray(exposure, dtype=float)
+        slot = pd.Timestamp(hour).hour
+
+        p0 = np.clip(self.expected(slot), 1e-9, 1 - 1e-9)
+        p1 = np.clip(self.shift * p0, 1e-9, 1 - 1e-9)
+        llr = events * np.log(p1 / p0) + (exposure - events) * np.log((1 - p1) / (1 - p0))
+        scored = self.hours_seen >= WARMUP_HOURS
+        self.cusum = np.where(scored, np.maximum(self.cusum + llr, 0), 0)
+        statistic = self.cusum.copy()
+        alert = statistic > self.threshold
+        self.cusum[alert] = 0
+
+        # The alerting hour itself is kept out of the baseline
+        learn = ~alert
+        self.level_events = np.where(learn, (1 - LEVEL_DECAY) * self.level_events + events, self.level_events)
+        self.level_exposure = np.where(learn, (1 - LEVEL_DECAY) * self.level_exposure + exposure,
+                                       self.level_exposure)
+        self.slot_events[slot] = np.where(learn, (1 - SEASON_DECAY) * self.slot_events[slot] + events,
+                                          self.slot_events[slot])
+        self.slot_exposure[slot] = np.where(learn, (1 - SEASON_DECAY) * self.slot_exposure[slot] + exposure,
+                                            self.slot_exposure[slot])
+        self.hours_seen += exposure > 0
+        return statistic, alert, p0
+
+
+def hourly_segment_counts(events, users, segments=SEGMENT_COLUMNS):
+    """Dense (hour x series) session, post and crash counts
+
+    Returns (hours, series, counts): series is a frame of (variant, segment)
+    labels, counts maps each of COUNT_COLUMNS to an (hours x series) array.
+    Sessions and posts count at the session start hour, crashes at the
+    crash event's hour.
+    """
+    attributes = users.set_index('user_id')[['variant'] + list(segments)].astype(str)
+    sessions = summarize_sessions(events).join(attributes, on='user_id')
+    crashes = events[events['event_name'] == CRASH_EVENT][['user_id', 'timestamp']].join(attributes, on='user_id')
+
+    start = events['timestamp'].min().floor('h')
+    n_hours = int((events['timestamp'].max() - start) // pd.Timedelta(hours=1)) + 1
+    hours = pd.date_range(start, periods=n_hours, freq='h')
+
+    # Every variant x (overall, each segment value, each full segment cross) is one series
+    groupings = [[]] + [[column] for column in segments] + ([list(segments)] if len(segments) > 1 else [])
+    labels, blocks = [], {name: [] for name in COUNT_COLUMNS}
+    for grouping in groupings:
+        keys = ['variant'] + grouping
+        index = sessions.groupby(keys).size().index
+        index = index if isinstance(index, pd.MultiIndex) else pd.MultiIndex.from_arrays([index])
+        for name, frame, times, weights in [
+            ('sessions', sessions, sessions['session_start'], None),
+            ('posts', sessions, sessions['session_start'], sessions['steps_mask'] & STEP_BITS['reels_posted']),
+            ('crashes', crashes, crashes['timestamp'], None),
+        ]:
+            codes = index.get_indexer(pd.MultiIndex.from_frame(frame[keys])) if len(frame) else np.empty(0, int)
+            hour = ((times - start) // pd.Timedelta(hours=1)).to_numpy()
+            keep = codes >= 0
+            flat = hour[keep] * len(index) + codes[keep]
+            w = None if weights is None else (np.asarray(weights)[keep] > 0).astype(float)
+            counts = np.bincount(flat, weights=w, minlength=n_hours * len(index))
+            blocks[name].append(counts.reshape(n_hours, len(index)))
+        labels += [(key[0], ' · '.join(key[1:]) or 'overall') for key in index]
+
+    series = pd.DataFrame(labels, columns=['variant', 'segment'])
+    return hours, series, {name: np.hstack(parts) for name, parts in blocks.items()}
+
+
+def _alert_rows(hour, metric, series, events, exposure, statistic, alert, expected):
+    return [{'hour': hour, 'metric': metric, 'variant': series['variant'].iat[s], 'segment': series['segment'].iat[s],
+             'observed_rate': events[s] / exposure[s] if exposure[s] else np.nan,
+             'expected_rate': expected[s], 'sessions': int(exposure[s]), 'cusum': statistic[s]}
+            for s in np.flatnonzero(alert)]
+
+
+def detect_anomalies(hours, series, counts, monitors=MONITORS, threshold=DEFAULT_THRESHOLD):
+    """Stream the hourly counts through one RateCusum per metric; returns the alerts frame"""
+    rows = []
+    for metric, (numerator, denominator, shift) in monitors.items():
+        detector = RateCusum(len(series), shift, threshold)
+        for h, hour in enumerate(hours):
+            events, exposure = counts[numerator][h], counts[denominator][h]
+            statistic, alert, expected = detector.update(hour, events, exposure)
+            rows += _alert_rows(hour, metric, series, events, exposure, statistic, alert, expected)
+    alerts = pd.DataFrame(rows, columns=ALERT_COLUMNS)
+    return alerts.sort_values(['hour', 'metric', 'variant', 'segment'], ignore_index=True)
+
+
+class LiveAnomalies:
+    """One RateCusum per metric kept across live polls, over the overall series of each variant
+
+    Each hour is scored once, when the caller reports it complete, so the
+    detector state is the same fixed-size state as in detect_anomalies and
+    a poll costs O(variants) per newly completed hour.
+    """
+
+    def __init__(self, variants, monitors=MONITORS, threshold=DEFAULT_THRESHOLD):
+        self.series = pd.DataFrame({'variant': list(variants), 'segment': 'overall'})
+        self.monitors = monitors
+        self.detectors = {metric: RateCusum(len(variants), shift, threshold)
+                          for metric, (_, _, shift) in monitors.items()}
+        self.scored_until = None
+        self.rows = []
+
+    def update(self, hours, columns, complete_until, horizon=None):
+        """Score the hours up to complete_until not scored yet
+
+        hours maps an hour to its (variants x columns) counts; alerts before
+        horizon are dropped.
+        """
+        for hour in sorted(h for h in hours if h <= complete_until
+                           and (self.scored_until is None or h > self.scored_until)):
+            counts = dict(zip(columns, np.asarray(hours[hour], dtype=float).T))
+            for metric, (numerator, denominator, _) in self.monitors.items():
+                events, exposure = counts[numerator], counts[denominator]
+                statistic, alert, expected = self.detectors[metric].update(hour, events, exposure)
+                self.rows += _alert_rows(hour, metric, self.series, events, exposure, statistic, alert, expected)
+            self.scored_until = hour
+        if horizon is not None:
+            self.rows = [row for row in self.rows if row['hour'] >= horizon]
+        return self
+
+    def table(self):
+        return pd.DataFrame(self.rows, columns=ALERT_COLUMNS)
+
+
+def hourly_overall(hours, series, counts):
+    """Long (hour, variant) table of the overall series' counts and rates, for charts"""
+    overall = np.flatnonzero(series['segment'].to_numpy() == 'overall')
+    table = pd.DataFrame({
+        'hour': np.repeat(hours, len(overall)),
+        'variant': np.tile(series['variant'].to_numpy()[overall], len(hours)),
+        **{name: values[:, overall].ravel().astype(np.int64) for name, values in counts.items()},
+    })
+    sessions = table['sessions'].where(table['sessions'] > 0)
+    table['success_rate'] = table['posts'] / sessions
+    table['crash_rate'] = table['crashes'] / sessions
+    return table
+
+
+def rollout_monitor(events, users, threshold=DEFAULT_THRESHOLD):
+    """Hourly overall rates per variant and the anomaly alerts over every series"""
+    hours, series, counts = hourly_segment_counts(events, users)
+    return hourly_overall(hours, series, counts), detect_anomalies(hours, series, counts, threshold=threshold)
+
+
+if __name__ == "__main__":
+    from sessionization import sessionize
+
+    events = sessionize(pd.read_csv(sys.argv[1], parse_dates=['timestamp']))
+    hourly, alerts = rollout_monitor(events, pd.read_csv(sys.argv[2]))
+    print(f"{len(hourly) // hourly['variant'].nunique():,} hours monitored, {len(alerts)} alert(s)")
+    print(alerts.to_string(index=False))
@@ -0,0 +1,176 @@
+"""
+HyperLogLog sketches for distinct creator / poster counts
+
+One sketch is kept per (metric, variant, segment, day). Sketches are
+mergeable with an element-wise max, so any rollup (a variant over the whole
+experiment, a segment over a week, everything) is answered by OR-ing a
+handful of register rows instead of holding exact user-id sets.
+
+Error bound: the relative standard error of a HyperLogLog estimate with
+m = 2**p registers is 1.04 / sqrt(m), i.e. ~1.6% at the default p=12
+(4 KB per sketch). Roughly 95% of estimates fall within two standard errors.
+"""
+
+import numpy as np
+import pandas as pd
+
+from hashing import bit_length, hash_ids
+
+DEFAULT_PRECISION = 12
+
+# Event that qualifies a user as a creator / poster for the day
+METRIC_EVENTS = {
+    'creator': 'create_button_clicked',
+    'poster': 'reels_posted',
+}
+SEGMENT_COLUMNS = ['creator_cohort', 'device_type']
+
+_INV_POW2 = 2.0 ** -np.arange(66)
+
+
+def relative_error(precision=DEFAULT_PRECISION):
+    """Relative standard error of a sketch with 2**precision registers"""
+    return 1.04 / np.sqrt(2 ** precision)
+
+
+def register_updates(ids, precision=DEFAULT_PRECISION):
+    """Register index and rank for each id"""
+    h = hash_ids(ids)
+    tail_bits = 64 - precision
+    idx = (h >> np.uint64(tail_bits)).astype(np.int64)
+    tail = h & np.uint64((1 << tail_bits) - 1)
+    rank = (tail_bits + 1 - bit_length(tail)).astype(np.uint8)
+    return idx, rank
+
+
+def _factorize_keys(frame):
+    """Integer code per row and the unique key rows, in order of first appearance"""
+    codes = frame.groupby(list(frame.columns), sort=False, observed=True).ngroup().to_numpy()
+    return codes, frame.drop_duplicates().reset_index(drop=True)
+
+
+def estimate_cardinality(registers):
+    """HyperLogLog estimate over the last axis of a register array"""
+    registers = np.asarray(registers)
+    m = registers.shape[-1]
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / _INV_POW2[registers].sum(axis=-1)
+
+    # Linear counting for small cardinalities
+    zeros = (registers == 0).sum(axis=-1)
+    with np.errstate(divide='ignore'):
+        linear = m * np.log(m / np.maximum(zeros, 1))
+    return np.where((raw <= 2.5 * m) & (zeros > 0), linear, raw)
+
+
+class CreatorSketches:
+    """Table of HyperLogLog sketches keyed by (metric, variant, segment, day)"""
+
+    def __init__(self, keys, registers, precision=DEFAULT_PRECISION):
+        self.keys = keys.reset_index(drop=True)
+        self.registers = registers
+        self.precision = precision
+        # Integer codes per key column so rollup filters are plain array compares
+        self._codes = {}
+        for c in self.keys.columns:
+            codes, uniques = pd.factorize(self.keys[c])
+            self._codes[c] = (codes, {v: i for i, v in enumerate(uniques)})
+
+    @property
+    def relative_error(self):
+        return relative_error(self.precision)
+
+    def _match(self, column, values):
+        codes, lookup = self._codes[column]
+        wanted = [lookup[v] for v in values if v in lookup]
+        if len(wanted) == 1:
+            return codes == wanted[0]
+        return np.isin(codes, wanted)
+
+    def _mask(self, metric, variant=None, segment=None, days=None):
+        mask = self._match('metric', [metric])
+        if variant is not None:
+            mask &= self._match('variant', [variant])
+        if segment is not None and segment != 'overall':
+            mask &= self._match('segment', [segment])
+        if days is not None:
+            mask &= self._match('day', [pd.Timestamp(d) for d in days])
+        return mask
+
+    def merged(self, metric, variant=None, segment=None, days=None):
+        """Union of all sketches matching the filter, as one register row"""
+        mask = self._mask(metric, variant, segment, days)
+        if not mask.any():
+            return np.zeros(2 ** self.precision, dtype=np.uint8)
+        return self.registers[mask].max(axis=0)
+
+    def count(self, metric, variant=None, segment=None, days=None):
+        """Estimated distinct users for any rollup"""
+        return float(estimate_cardinality(self.merged(metric, variant, segment, days)))
+
+    def rollup(self, metric, by=('variant', 'segment')):
+        """Estimated distinct users for every group of the given key columns"""
+        keys = self.keys[self.keys['metric'] == metric]
+        groups = keys.groupby(list(by), observed=True).indices
+        rows = [self.registers[keys.index[pos]].max(axis=0) for pos in groups.values()]
+        index = pd.MultiIndex.from_tuples(
+            [g if isinstance(g, tuple) else (g,) for g in groups], names=list(by)
+        )
+        return pd.Series(estimate_cardinality(np.stack(rows)), index=index, name=f'unique_{metric}s')
+
+    def merge(self, other):
+        """Combine two sketch tables; overlapping keys are unioned"""
+        keys = pd.concat([self.keys, other.keys], ignore_index=True)
+        registers = np.vstack([self.registers, other.registers])
+        codes, uniques = _factorize_keys(keys)
+        merged = np.zeros((len(uniques), registers.shape[1]), dtype=np.uint8)
+        np.maximum.at(merged, codes, registers)
+        return CreatorSketches(uniques, merged, self.precision)
+
+    def save(self, path):
+        np.savez(
+            path,
+            registers=self.registers,
+            precision=self.precision,
+            **{f'key_{c}': np.asarray(self.keys[c], dtype=str) for c in ['metric', 'variant', 'segment']},
+            key_day=self.keys['day'].to_numpy().astype('datetime64[D]'),
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as f:
+            keys = pd.DataFrame({
+                'metric': f['key_metric'],
+                'variant': f['key_variant'],
+                'segment': f['key_segment'],
+                'day': pd.to_datetime(f['key_day']),
+            })
+            return cls(keys, f['registers'], int(f['precision']))
+
+
+def build_creator_sketches(events, users, precision=DEFAULT_PRECISION):
+    """Build sketches from raw events joined to the user table"""
+    qualifying = events[events['event_name'].isin(list(METRIC_EVENTS.values()))]
+    qualifying = qualifying.merge(users[['user_id', 'variant'] + SEGMENT_COLUMNS], on='user_id')
+    metric_of_event = {v: k for k, v in METRIC_EVENTS.items()}
+
+    # A user lands in one sketch per segment dimension; HLL unions are
+    # idempotent so the duplication never double-counts in a rollup.
+    frames = [
+        pd.DataFrame({
+            'metric': qualifying['event_name'].astype(str).map(metric_of_event).to_numpy(),
+            'variant': qualifying['variant'].to_numpy(),
+            'segment': qualifying[col].astype(str).to_numpy(),
+            'day': qualifying['timestamp'].dt.normalize().to_numpy(),
+            'user_id': qualifying['user_id'].to_numpy(),
+        })
+        for col in SEGMENT_COLUMNS
+    ]
+    rows = pd.concat(frames, ignore_index=True)
+
+    codes, uniques = _factorize_keys(rows[['metric', 'variant', 'segment', 'day']])
+    idx, rank = register_updates(rows['user_id'].to_numpy(), precision)
+    registers = np.zeros((len(uniques), 2 ** precision), dtype=np.uint8)
+    np.maximum.at(registers, (codes, idx), rank)
+
+    return CreatorSketches(uniques, registers, precision)
@@ -0,0 +1,140 @@
+"""
+Synthetic data generation for the Instagram Reels Quick Edit experiment
+Run: python data_generation.py
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+FUNNEL_STEPS = ['reels_tab_opened', 'create_button_clicked', 'camera_opened',
+                'clip_recorded', 'audio_selected', 'edit_tool_opened', 'reels_posted']
+
+EXPERIMENT_START = pd.Timestamp('2024-03-01')
+EXPERIMENT_DAYS = 14
+
+# Probability of moving from step k to step k+1, by creator cohort
+STEP_CONTINUATION = {
+    'casual_creator': np.array([0.85, 0.82, 0.86, 0.83, 0.80, 0.39]),
+    'power_creator': np.array([0.92, 0.90, 0.92, 0.90, 0.88, 0.58]),
+}
+DEVICE_MULTIPLIER = {'iPhone': 1.04, 'Android': 0.97}
+QUICK_EDIT_MULTIPLIER = 1.11  # treatment boost on edit_tool_opened -> reels_posted
+# Boost by experiment arm; treatment_b is an alternative Quick Edit implementation for A/B/n runs
+VARIANT_MULTIPLIERS = {'control': 1.0, 'treatment': QUICK_EDIT_MULTIPLIER, 'treatment_b': 1.06}
+
+SESSIONS_PER_DAY = {'casual_creator': 0.4, 'power_creator': 1.2}
+SECONDS_PER_STEP = np.array([4, 6, 15, 40, 25, 90])
+
+# What sessions that abandon at the edit stage do next, and how often
+DIVERGENT_EVENTS = ['edit_tool_closed', 'audio_selected', 'draft_saved', 'camera_opened', 'app_backgrounded']
+DIVERGENT_WEIGHTS = np.array([0.35, 0.2, 0.2, 0.1, 0.15])
+OUT_OF_ORDER_RATE = 0.08  # sessions that open the editor before choosing audio
+
+CRASH_EVENT = 'app_crashed'
+CRASH_RATE = 0.0005  # per session, same in both variants
+
+
+def generate_users(n_users=20000, seed=42, variants=('control', 'treatment')):
+    """Generate the experiment user table, split evenly across `variants`
+
+    Variants come from the production salted-hash bucketing
+    (rollout.assign_variants), so a user's arm is reproducible from the id.
+    """
+    from rollout import assign_variants  # rollout -> analysis_functions imports this module
+
+    rng = np.random.default_rng(seed)
+    user_ids = np.arange(1, n_users + 1, dtype=np.int64)
+
+    return pd.DataFrame({
+        'user_id': user_ids,
+        'variant': assign_variants(user_ids, variants),
+        'device_type': rng.choice(['iPhone', 'Android'], size=n_users, p=[0.55, 0.45]),
+        'creator_cohort': rng.choice(['casual_creator', 'power_creator'], size=n_users, p=[0.6, 0.4]),
+    })
+
+
+def generate_events(users, days=EXPERIMENT_DAYS, start=EXPERIMENT_START, seed=42):
+    """Generate raw creation-flow events (user_id, event_name, timestamp) for the given users"""
+    rng = np.random.default_rng(seed + 1)
+    n_users = len(users)
+
+    # Sessions per user per day
+    lam = users['creator_cohort'].map(SESSIONS_PER_DAY).to_numpy()
+    counts = rng.poisson(lam[:, None], size=(n_users, days))
+    user_idx = np.repeat(np.repeat(np.arange(n_users), days), counts.ravel())
+    day_idx = np.repeat(np.tile(np.arange(days), n_users), counts.ravel())
+    n_sessions = len(user_idx)
+
+    # Funnel progression per session
+    continuation = np.vstack([STEP_CONTINUATION[c] for c in users['creator_cohort']])
+    continuation = continuation * users['device_type'].map(DEVICE_MULTIPLIER).to_numpy()[:, None]
+    continuation[:, -1] *= users['variant'].map(VARIANT_MULTIPLIERS).to_numpy(dtype=float)
+    continuation = np.clip(continuation, 0, 1)[user_idx]
+
+    advanced = rng.random((n_sessions, len(FUNNEL_STEPS) - 1)) < continuation
+    reached = np.hstack([np.ones((n_sessions, 1), dtype=bool), np.cumprod(advanced, axis=1).astype(bool)])
+
+    # Timestamps: session start plus exponential gaps between steps
+    start_s = day_idx * 86400 + rng.integers(0, 86400 - 3600, size=n_sessions)
+    # Redraw starts that repeat within a user, whose sessions would emit identical events
+    redraw_rng = np.random.default_rng([seed, 3])
+    while True:
+        clash = pd.Series(user_idx * days * 86400 + start_s).duplicated().to_numpy()
+        if not clash.any():
+            break
+        start_s[clash] = day_idx[clash] * 86400 + redraw_rng.integers(0, 86400 - 3600, size=clash.sum())
+    gaps = rng.exponential(SECONDS_PER_STEP, size=(n_sessions, len(SECONDS_PER_STEP))) + 1
+    offsets = np.hstack([np.zeros((n_sessions, 1)), np.cumsum(gaps, axis=1)])
+
+    # Some sessions open the editor before choosing audio
+    audio, edit = FUNNEL_STEPS.index('audio_selected'), FUNNEL_STEPS.index('edit_tool_opened')
+    swapped = rng.random(n_sessions) < OUT_OF_ORDER_RATE
+    offsets[swapped, audio], offsets[swapped, edit] = offsets[swapped, edit], offsets[swapped, audio].copy()
+
+    session_of_event, step_of_event = np.nonzero(reached)
+    seconds = start_s[session_of_event] + offsets[session_of_event, step_of_event]
+
+    # Sessions abandoning at the edit stage wander off in one to three extra events
+    abandoned = np.flatnonzero(reached[:, edit] & ~reached[:, -1])
+    n_extra = rng.integers(1, 4, size=len(abandoned))
+    extra_session = np.repeat(abandoned, n_extra)
+    extra_kind = rng.choice(len(DIVERGENT_EVENTS), size=len(extra_session), p=DIVERGENT_WEIGHTS)
+    extra_gap = np.cumsum(rng.exponential(30, size=len(extra_session)) + 1)
+    extra_gap -= np.repeat(np.r_[0, extra_gap[np.cumsum(n_extra)[:-1] - 1]], n_extra)
+    extra_seconds = start_s[extra_session] + offsets[extra_session, edit] + extra_gap
+
+    categories = FUNNEL_STEPS + [e for e in DIVERGENT_EVENTS if e not in FUNNEL_STEPS] + [CRASH_EVENT]
+    extra_codes = np.array([categories.index(e) for e in DIVERGENT_EVENTS])[extra_kind]
+
+    # Rare crashes, drawn from their own stream so the draws above are unchanged
+    crash_rng = np.random.default_rng([seed, 2])
+    crashed = np.flatnonzero(crash_rng.random(n_sessions) < CRASH_RATE)
+    last_step = reached.sum(axis=1) - 1
+    crash_seconds = start_s[crashed] + crash_rng.random(len(crashed)) * offsets[crashed, last_step[crashed]]
+    crash_codes = np.full(len(crashed), categories.index(CRASH_EVENT))
+
+    events = pd.DataFrame({
+        'user_id': users['user_id'].to_numpy()[user_idx[np.r_[session_of_event, extra_session, crashed]]],
+        'event_name': pd.Categorical.from_codes(np.r_[step_of_event, extra_codes, crash_codes],
+                                                categories=categories),
+        'timestamp': start + pd.to_timedelta(np.r_[seconds, extra_seconds, crash_seconds].round(3), unit='s'),
+    })
+    return events.sort_values('timestamp', kind='stable').reset_index(drop=True)
+
+
+def main(output_dir='data/generated', n_users=20000, seed=42, variants=('control', 'treatment')):
+    """Write users.csv and events_sample.csv"""
+    os.makedirs(output_dir, exist_ok=True)
+
+    users = generate_users(n_users, seed, variants)
+    events = generate_events(users, seed=seed)
+
+    users.to_csv(os.path.join(output_dir, 'users.csv'), index=False)
+    events.to_csv(os.path.join(output_dir, 'events_sample.csv'), index=False)
+    print(f"Wrote {len(users):,} users and {len(events):,} events to {output_dir}")
+
+
+if __name__ == "__main__":
+    main()
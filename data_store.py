@@ -0,0 +1,208 @@
+"""
+Data loading for the dashboard and headless tools (metrics API, load tests)
+
+Everything read here passes through validation.py on the way in (raw events
+chunk by chunk as they are parsed); the collected violations, including any
+fallback to demo data, are returned under data['validation'].
+
+The dashboard loads this data once per server process and shares it across
+every viewer session. freeze_data() makes that shared instance read-only:
+the dicts become mapping proxies and the numpy-backed columns of every
+DataFrame become read-only arrays, so an in-place write (df.loc[...] = x)
+raises instead of leaking into other sessions. Pandas cannot lock the
+column set or extension-typed columns (strings, categoricals), so the
+contract stands: renderers copy a shared frame before they modify it.
+"""
+
+import json
+import os
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+
+from analysis_functions import long_ab_results
+from anomaly import rollout_monitor
+from creator_sketches import CreatorSketches, build_creator_sketches
+from data_generation import generate_events, generate_users
+from guardrails import user_metric_sums
+from memory_profile import ChunkBudget, enforce_budgets
+from retention import build_retention
+from rollout import rollout_report
+from sensitivity import load_sensitivity_surface
+from sessionization import sessionize, summarize_sessions
+from uplift import DECILES_PATH, build_uplift
+from validation import (EventValidator, assignment_health, assignment_health_violations, check_unknown_users,
+                        source_fallback, validate_results, validate_users, violation_report)
+
+EVENT_CHUNKSIZE = 500_000
+
+
+def load_data():
+    """Load analysis results"""
+    violations = []
+    try:
+        # Load business impact
+        with open('results/business_impact.json', 'r') as f:
+            business_impact = json.load(f)
+        
+        # Load A/B test results
+        ab_results = pd.read_csv('results/ab_test_results.csv')
+        ab_contrasts = pd.read_csv('results/ab_contrasts.csv') if os.path.exists('results/ab_contrasts.csv') \
+            else long_ab_results(ab_results)
+        
+        # Load funnel metrics
+        funnel_overall = pd.read_csv('results/funnel_metrics_overall.csv')
+        funnel_cohort = pd.read_csv('results/funnel_metrics_by_cohort.csv')
+        
+        data = {
+            'business_impact': business_impact,
+            'ab_results': ab_results,
+            'ab_contrasts': ab_contrasts,
+            'funnel_overall': funnel_overall,
+            'funnel_cohort': funnel_cohort
+        }
+    except FileNotFoundError as e:
+        # Create sample data for demo, but say so in the validation report
+        violations.append(source_fallback('results', e))
+        data = create_sample_data()
+    
+    violations += validate_results(data)
+    data.update(load_event_data(violations))
+    data['sensitivity_surface'] = load_sensitivity_surface()
+    violations += enforce_budgets(data)
+    data['validation'] = violation_report(violations)
+    return data
+
+
+def load_raw_events(violations=None):
+    """Load raw users and events, generating a small synthetic set if missing
+
+    Events are validated and checked against their memory budget chunk by
+    chunk as they are read; violations are appended to `violations` when a
+    list is given.
+    """
+    validator = EventValidator()
+    budget = ChunkBudget('events')
+    try:
+        users = pd.read_csv('data/generated/users.csv')
+        chunks = pd.read_csv('data/generated/events_sample.csv', parse_dates=['timestamp'],
+                             chunksize=EVENT_CHUNKSIZE)
+        for chunk in chunks:
+            budget.add(validator.validate_chunk(chunk))
+        events = budget.frame()
+    except FileNotFoundError as e:
+        validator.violations.append(source_fallback('events', e))
+        users = generate_users(n_users=5000)
+        events = validator.validate_chunk(generate_events(users))
+    
+    if violations is not None:
+        violations += validator.violations + budget.violations + validate_users(users) + \
+            check_unknown_users(events, users)
+    return users, events
+
+
+def load_event_data(violations=None):
+    """Load sessionized raw events and the aggregates built from them (sketches, retention, rollout, uplift, guardrails, assignment health)"""
+    users, events = load_raw_events(violations)
+    if os.path.exists('results/creator_sketches.npz'):
+        creator_sketches = CreatorSketches.load('results/creator_sketches.npz')
+    else:
+        creator_sketches = build_creator_sketches(events, users)
+    
+    health = assignment_health(users, events.groupby('user_id')['timestamp'].min())
+    if violations is not None:
+        violations += assignment_health_violations(health)
+    
+    events = sessionize(events)
+    rollout_hourly, rollout_alerts = rollout_monitor(events, users)
+    return {
+        'events': events,
+        'creator_sketches': creator_sketches,
+        'retention': build_retention(events, users),
+        'rollout_report': rollout_report(users),
+        'uplift_deciles': load_uplift_deciles(events, users),
+        'guardrail_stats': user_metric_sums(events, users),
+        'rollout_hourly': rollout_hourly,
+        'rollout_alerts': rollout_alerts,
+        'assignment_health': health
+    }
+
+
+def load_uplift_deciles(events, users):
+    """Cached uplift deciles from the pipeline, or trained on the loaded events"""
+    if os.path.exists(DECILES_PATH):
+        return pd.read_csv(DECILES_PATH)
+    attributes = users.set_index('user_id')[['variant', 'device_type', 'creator_cohort']]
+    sessions = summarize_sessions(events).join(attributes, on='user_id')
+    return build_uplift(sessions)[1]
+
+
+def create_sample_data():
+    """Create sample data for dashboard demo"""
+    # Business impact
+    business_impact = {
+        'daily': {
+            'additional_creators': 6085535,
+            'additional_reels': 6694089,
+            'additional_watch_time_hours': 46486.7,
+            'additional_revenue': 70288
+        },
+        'monthly': {
+            'additional_reels': 200822672,
+            'additional_watch_time_hours': 1394601,
+            'additional_revenue': 2108638
+        }
+    }
+    
+    # A/B test results
+    ab_results = pd.DataFrame({
+        'segment': ['overall', 'casual_creator', 'power_creator', 'Android', 'iPhone'],
+        'control_mean': [0.23, 0.153, 0.348, 0.255, 0.315],
+        'treatment_mean': [0.26, 0.170, 0.391, 0.279, 0.355],
+        'relative_lift': [0.13, 0.106, 0.124, 0.094, 0.127],
+        'p_value': [0.0001, 0.0000, 0.0000, 0.0000, 0.0000],
+        'significant': [True, True, True, True, True]
+    })
+    
+    # Funnel metrics
+    funnel_steps = ['reels_tab_opened', 'create_button_clicked', 'camera_opened', 
+                    'clip_recorded', 'audio_selected', 'edit_tool_opened', 'reels_posted']
+    
+    funnel_overall = pd.DataFrame({
+        'funnel_step': funnel_steps,
+        'sessions_reached': [100000, 85000, 70000, 60000, 50000, 40000, 30000],
+        'conversion_rate': [1.0, 0.85, 0.70, 0.60, 0.50, 0.40, 0.30],
+        'dropoff_rate': [0.0, 0.15, 0.18, 0.14, 0.17, 0.20, 0.25]
+    })
+    
+    return {
+        'business_impact': business_impact,
+        'ab_results': ab_results,
+        'ab_contrasts': long_ab_results(ab_results),
+        'funnel_overall': funnel_overall,
+        'funnel_cohort': None
+    }
+
+
+def read_only_frame(frame):
+    """The same frame with its numpy-backed columns as read-only views (no copy)"""
+    columns = {}
+    for name, column in frame.items():
+        if isinstance(column.dtype, np.dtype):
+            column = column.to_numpy().view()
+            column.flags.writeable = False
+        columns[name] = column
+    return pd.DataFrame(columns, index=frame.index, columns=frame.columns, copy=False)
+
+
+def freeze_data(data):
+    """Read-only view of a loaded data dict, for sharing across sessions"""
+    frozen = {}
+    for key, value in data.items():
+        if isinstance(value, dict):
+            value = freeze_data(value)
+        elif isinstance(value, pd.DataFrame):
+            value = read_only_frame(value)
+        frozen[key] = value
+    return MappingProxyType(frozen)
@@ -0,0 +1,256 @@
+"""
+Parallel out-of-core CSV -> partitioned Parquet ETL
+Run: python etl.py data/generated/events_sample.csv data/processed/events \\
+         --parse-dates timestamp --partition-date timestamp --workers 8
+
+The CSV is split into newline-aligned byte ranges that worker processes
+parse independently, so no process ever holds more than one range. At
+most two ranges per worker are in flight, which bounds memory regardless
+of file size, while throughput scales with the number of cores.
+
+Column dtypes are declared, or inferred from a sample of the first rows.
+Inferred integers and booleans are nullable (Int64, boolean), so a
+missing value later in the file still parses; a range whose values do not
+fit the inferred dtypes at all is parsed with pandas' own inference for
+those columns instead of failing the run. Strings are written as plain
+strings (Parquet dictionary-encodes them per file), since categories
+chosen range by range would give every part a different dictionary. A
+declared integer dtype that a range overflows is an error.
+
+Output layout (Hive style, readable by pandas / pyarrow / Spark):
+
+    out_dir/event_date=2024-03-01/part-00000.parquet
+
+Part numbers follow byte order, so for a time-ordered CSV reading the
+partitions in sorted order replays the events in time order.
+
+With --validate, each worker also runs the vectorized schema checks from
+validation.py on its range before writing it; violations are summed into
+the result (duplicates are only detected within a range here).
+
+Limitation: quoted fields containing newlines are not supported, since a
+range boundary could fall inside them.
+"""
+
+import argparse
+import io
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CHUNK_BYTES = 64 * 1024 * 1024
+SAMPLE_ROWS = 100_000
+
+
+def byte_ranges(path, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """Header line and newline-aligned (start, end) byte ranges covering the data rows"""
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        header = f.readline()
+        start = f.tell()
+        ranges = []
+        while start < size:
+            f.seek(min(start + chunk_bytes, size))
+            f.readline()  # move to the end of the line the nominal boundary falls in
+            end = min(f.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return header.decode().rstrip('\r\n'), ranges
+
+
+def infer_dtypes(path, parse_dates=(), declared=None, sample_rows=SAMPLE_ROWS):
+    """Dtypes per column, inferred from the first rows unless declared
+
+    Integers are inferred as nullable Int64 and booleans as nullable
+    boolean: the first rows say nothing about the range of later values or
+    whether some are missing. Declare a narrower integer dtype to store one;
+    it is checked against every range (see parse_range). Strings get no
+    dtype, so every part stores them the same way.
+    """
+    declared = dict(declared or {})
+    sample = pd.read_csv(path, nrows=sample_rows)
+    dtypes = {}
+    for col in sample.columns:
+        if col in declared or col in parse_dates:
+            continue
+        values = sample[col]
+        if pd.api.types.is_bool_dtype(values):
+            dtypes[col] = 'boolean'
+        elif pd.api.types.is_integer_dtype(values):
+            dtypes[col] = 'Int64'
+        elif pd.api.types.is_float_dtype(values):
+            dtypes[col] = 'float64'
+    dtypes.update(declared)
+    return dtypes
+
+
+def parse_range(path, start, end, names, dtypes, parse_dates=(), inferred=()):
+    """Parse one byte range of the CSV into a DataFrame
+
+    If the range does not parse with the `inferred` dtypes (e.g. a float in
+    a column sampled as integers), those columns are left to pandas'
+    inference for this range; declared dtypes are never relaxed.
+
+    read_csv wraps integers that overflow a narrow dtype, so integer columns
+    are parsed as int64 and narrowed only once the range's values are known
+    to fit; otherwise this raises OverflowError rather than writing wrapped values.
+    """
+    narrow = {col: np.dtype(dtype) for col, dtype in dtypes.items() if _is_numpy_int(dtype)}
+    with open(path, 'rb') as f:
+        f.seek(start)
+        raw = f.read(end - start)
+    read = {**dtypes, **{col: 'int64' for col in narrow}}
+    try:
+        frame = pd.read_csv(io.BytesIO(raw), header=None, names=names, dtype=read,
+                            parse_dates=list(parse_dates) or False)
+    except (ValueError, TypeError):
+        if not inferred:
+            raise
+        read = {col: dtype for col, dtype in read.items() if col not in inferred}
+        frame = pd.read_csv(io.BytesIO(raw), header=None, names=names, dtype=read,
+                            parse_dates=list(parse_dates) or False)
+    for col, dtype in narrow.items():
+        if not len(frame) or dtype == np.int64:
+            continue
+        lo, hi, info = frame[col].min(), frame[col].max(), np.iinfo(dtype)
+        if lo < info.min or hi > info.max:
+            raise OverflowError(f"{path} bytes {start}-{end}: {col} ranges {lo}..{hi}, which does not fit "
+                                f"{dtype}; declare a wider dtype (--dtype {col}=int64)")
+        frame[col] = frame[col].astype(dtype)
+    return frame
+
+
+def _is_numpy_int(dtype):
+    try:
+        return np.dtype(dtype).kind in 'iu'
+    except TypeError:
+        return False
+
+
+def write_partitioned(frame, out_dir, part, partition_date=None):
+    """Write one parsed range, split by date partition if requested"""
+    if partition_date is None:
+        groups = [(None, frame)]
+    else:
+        dates = frame[partition_date].dt.strftime('%Y-%m-%d')
+        groups = frame.groupby(dates.to_numpy(), sort=True)
+
+    written = []
+    for value, group in groups:
+        directory = out_dir if value is None else os.path.join(out_dir, f'event_date={value}')
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'part-{part:05d}.parquet')
+        group.to_parquet(path, index=False)
+        written.append(path)
+    return written
+
+
+def _etl_range(path, part, start, end, names, dtypes, inferred, parse_dates, out_dir, partition_date, schema):
+    frame = parse_range(path, start, end, names, dtypes, parse_dates, inferred)
+    violations = []
+    if schema is not None:
+        from validation import check_schema
+        violations = check_schema(frame, schema, os.path.basename(path))
+    written = write_partitioned(frame, out_dir, part, partition_date)
+    return part, len(frame), written, violations
+
+
+def run_etl(path, out_dir, dtypes=None, parse_dates=(), partition_date=None,
+            workers=None, chunk_bytes=DEFAULT_CHUNK_BYTES, schema=None, log=print):
+    """Convert a CSV to partitioned Parquet with a bounded process pool
+
+    If a validation schema is given, every range is checked as it is parsed
+    and the summed violations are returned under 'validation'.
+    """
+    try:
+        import pyarrow  # noqa: F401  (optional dependency, needed for Parquet output)
+    except ImportError as e:
+        raise ImportError("Parquet output requires pyarrow: pip install pyarrow") from e
+
+    parse_dates = list(parse_dates)
+    if partition_date and partition_date not in parse_dates:
+        parse_dates.append(partition_date)
+
+    header, ranges = byte_ranges(path, chunk_bytes)
+    names = header.split(',')
+    declared = dict(dtypes or {})
+    dtypes = infer_dtypes(path, parse_dates, declared)
+    inferred = [col for col in dtypes if col not in declared]
+    workers = workers or os.cpu_count()
+    os.makedirs(out_dir, exist_ok=True)
+
+    started = time.perf_counter()
+    rows, files, violations = 0, [], []
+    pending = iter(enumerate(ranges))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = set()
+        while True:
+            # Keep at most two ranges per worker in flight to bound memory
+            while len(in_flight) < 2 * workers:
+                item = next(pending, None)
+                if item is None:
+                    break
+                part, (start, end) = item
+                in_flight.add(pool.submit(_etl_range, path, part, start, end, names, dtypes, inferred,
+                                          parse_dates, out_dir, partition_date, schema))
+            if not in_flight:
+                break
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                _, n, written, found = future.result()
+                rows += n
+                files += written
+                violations += found
+
+    elapsed = time.perf_counter() - started
+    mb = os.path.getsize(path) / 1e6
+    log(f"{rows:,} rows, {len(ranges)} ranges -> {len(files)} files in {elapsed:.1f}s "
+        f"({mb / max(elapsed, 1e-9):.0f} MB/s, {workers} workers)")
+    result = {'rows': rows, 'files': sorted(files), 'dtypes': dtypes, 'seconds': elapsed}
+    if schema is not None:
+        from validation import violation_report
+        result['validation'] = violation_report(violations)
+        log(f"{int(result['validation']['violations'].sum()):,} validation violations")
+    return result
+
+
+def read_partitions(out_dir, columns=None):
+    """Yield partition files as DataFrames, in partition then part order"""
+    paths = []
+    for root, _, filenames in os.walk(out_dir):
+        paths += [os.path.join(root, name) for name in filenames if name.endswith('.parquet')]
+    for path in sorted(paths):
+        yield pd.read_parquet(path, columns=columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a large CSV to partitioned Parquet in parallel")
+    parser.add_argument('csv')
+    parser.add_argument('out_dir')
+    parser.add_argument('--dtype', action='append', default=[], metavar='COLUMN=DTYPE',
+                        help="Declare a column dtype instead of inferring it")
+    parser.add_argument('--parse-dates', action='append', default=[], metavar='COLUMN')
+    parser.add_argument('--partition-date', metavar='COLUMN',
+                        help="Partition output by the calendar date of this datetime column")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk-mb', type=int, default=DEFAULT_CHUNK_BYTES // (1024 * 1024))
+    parser.add_argument('--validate', choices=['events', 'users'],
+                        help="Check every range against this schema from validation.py")
+    args = parser.parse_args()
+
+    schema = None
+    if args.validate:
+        from validation import SCHEMAS
+        schema = SCHEMAS[args.validate]
+    declared = dict(pair.split('=', 1) for pair in args.dtype)
+    result = run_etl(args.csv, args.out_dir, declared, args.parse_dates, args.partition_date,
+                     args.workers, args.chunk_mb * 1024 * 1024, schema)
+    if schema is not None and len(result['validation']):
+        print(result['validation'].to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
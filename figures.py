@@ -0,0 +1,390 @@
+"""
+Plotly figure builders shared by the dashboard and the offline pipeline
+
+Builders return go.Figure objects and never touch Streamlit, so figures can
+be built off the script thread or exported as JSON ahead of time.
+"""
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+from sensitivity import PARAMETER_LABELS
+
+LAUNCH_PHASES = [
+    dict(Task="Phase 1", Start='2024-03-01', Finish='2024-03-14',
+         Description="10% rollout to iPhone casual creators", Lift="12.7%", Audience="10M users"),
+    dict(Task="Phase 2", Start='2024-03-15', Finish='2024-03-28',
+         Description="50% rollout to iPhone users", Lift="≥8% maintained", Audience="50M users"),
+    dict(Task="Phase 3", Start='2024-04-01', Finish='2024-04-30',
+         Description="100% rollout to casual creators", Lift="≥8% maintained", Audience="225M users"),
+    dict(Task="Phase 4", Start='2024-05-01', Finish='2024-05-31',
+         Description="Optimize & expand to Android", Lift="≥8% target", Audience="Full Android"),
+]
+
+
+def ab_forest_figure(contrasts):
+    """Forest plot of relative lift by segment, one facet per variant-vs-baseline contrast
+
+    Takes the long contrast table from analysis_functions.compare_variants
+    (or long_ab_results for two-arm ab_results files).
+    """
+    names = list(dict.fromkeys(zip(contrasts['variant'], contrasts['baseline'])))
+    fig = make_subplots(rows=1, cols=len(names), shared_yaxes=True, horizontal_spacing=0.04,
+                        subplot_titles=[f"{variant} vs {baseline}" for variant, baseline in names])
+    has_ci = {'ci_low', 'ci_high'} <= set(contrasts.columns)
+    p_column = 'p_adjusted' if 'p_adjusted' in contrasts else 'p_value'
+
+    for col, (variant, baseline) in enumerate(names, start=1):
+        rows = contrasts[(contrasts['variant'] == variant) & (contrasts['baseline'] == baseline)]
+        # Color by significance
+        colors = ['#4CAF50' if x else '#f44336' for x in rows['significant']]
+        error_x = dict(
+            type='data',
+            array=(rows['ci_high'] - rows['relative_lift']) * 100,
+            arrayminus=(rows['relative_lift'] - rows['ci_low']) * 100,
+            thickness=1.5,
+            width=5,
+            color='gray'
+        ) if has_ci else None
+        fig.add_trace(go.Scatter(
+            x=rows['relative_lift'] * 100,  # Convert to percentage
+            y=rows['segment'],
+            mode='markers',
+            marker=dict(
+                size=20,
+                color=colors,
+                line=dict(width=2, color='DarkSlateGrey')
+            ),
+            error_x=error_x,
+            customdata=rows[p_column],
+            hovertemplate="<b>%{y}</b><br>Lift: %{x:.1f}%<br>p-value: %{customdata:.4f}<extra></extra>"
+        ), row=1, col=col)
+        fig.update_xaxes(title_text="Relative Lift (%)", row=1, col=col)
+
+    # Add vertical lines
+    fig.add_vline(x=0, line_width=1, line_dash="dash", line_color="gray", row='all', col='all')
+    fig.add_vline(x=10, line_width=1, line_dash="dot", line_color="green", row='all', col='all',
+                  annotation_text="10% Target", annotation_position="top right")
+
+    fig.update_layout(
+        height=400,
+        showlegend=False,
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        font=dict(size=12)
+    )
+    fig.update_yaxes(title_text="Segment", row=1, col=1)
+
+    fig.update_xaxes(
+        gridcolor='lightgray',
+        zerolinecolor='gray'
+    )
+
+    fig.update_yaxes(
+        gridcolor='lightgray'
+    )
+
+    return fig
+
+
+def funnel_figure(funnel_data):
+    """Funnel conversion and drop-off side by side"""
+    fig = make_subplots(
+        rows=1, cols=2,
+        subplot_titles=('Funnel Conversion Rates', 'Drop-off Analysis'),
+        specs=[[{'type': 'funnel'}, {'type': 'bar'}]]
+    )
+
+    # Funnel plot
+    fig.add_trace(
+        go.Funnel(
+            name='Creation Flow',
+            y=funnel_data['funnel_step'],
+            x=funnel_data['sessions_reached'],
+            textinfo="value+percent initial",
+            opacity=0.7,
+            connector=dict(line=dict(color='royalblue', width=3)),
+            marker=dict(
+                color=['#1E88E5', '#2196F3', '#42A5F5', '#64B5F6',
+                       '#90CAF9', '#BBDEFB', '#E3F2FD']
+            )
+        ),
+        row=1, col=1
+    )
+
+    # Drop-off bar chart
+    fig.add_trace(
+        go.Bar(
+            x=funnel_data['funnel_step'],
+            y=funnel_data['dropoff_rate'] * 100,
+            marker_color='#f44336',
+            text=funnel_data['dropoff_rate'].apply(lambda x: f"{x:.1%}"),
+            textposition='auto'
+        ),
+        row=1, col=2
+    )
+
+    fig.update_layout(
+        height=500,
+        showlegend=False,
+        plot_bgcolor='white',
+        paper_bgcolor='white'
+    )
+
+    fig.update_xaxes(title_text="Sessions", row=1, col=1)
+    fig.update_xaxes(title_text="Funnel Step", row=1, col=2)
+    fig.update_yaxes(title_text="Drop-off Rate (%)", row=1, col=2)
+
+    return fig
+
+
+def section_figures(data):
+    """The dashboard figures that depend on loaded data only (no widgets), by name"""
+    contrasts = data['ab_contrasts']
+    return {
+        'ab_forest': ab_forest_figure(contrasts[contrasts['segment'] != 'overall']),
+        'funnel': funnel_figure(data['funnel_overall']),
+    }
+
+
+def impact_indicator_figure(value, reference, title, number):
+    """Number-and-delta indicator card for one projected impact (number: Plotly number format)"""
+    fig = go.Figure(go.Indicator(
+        mode="number+delta",
+        value=value,
+        number=number,
+        delta={'reference': reference, 'relative': True, 'valueformat': '.1%'},
+        title={"text": title},
+        domain={'row': 0, 'column': 0}
+    ))
+    fig.update_layout(
+        height=200,
+        paper_bgcolor='pink',
+        font=dict(size=18)
+    )
+    return fig
+
+
+def tornado_figure(surface, assumptions):
+    """Swing in monthly revenue from each assumption's low to high value"""
+    tornado, baseline = surface.tornado(assumptions)
+
+    fig = go.Figure()
+    for side, color in [('low', '#f44336'), ('high', '#4CAF50')]:
+        fig.add_trace(go.Bar(
+            y=tornado['parameter'],
+            x=tornado[f'output_{side}'] - baseline,
+            base=baseline,
+            orientation='h',
+            name=side.title(),
+            marker_color=color,
+            customdata=tornado[side],
+            hovertemplate="%{y} = %{customdata}<br>Revenue: $%{x:,.0f}<extra></extra>"
+        ))
+    fig.add_vline(x=baseline, line_width=1, line_dash="dash", line_color="gray")
+
+    fig.update_layout(
+        title="Monthly Revenue Tornado",
+        height=400,
+        barmode='overlay',
+        xaxis_title="Monthly Revenue ($)",
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        legend=dict(orientation='h', y=-0.2)
+    )
+    return fig
+
+
+def revenue_heatmap_figure(surface, assumptions):
+    """Revenue over adoption x CPM at the current monetization and creator share"""
+    xs, ys, z = surface.heatmap('adoption_rate', 'cpm', assumptions)
+
+    fig = go.Figure(go.Heatmap(
+        x=xs * 100,
+        y=ys,
+        z=z / 1e6,
+        colorscale='Blues',
+        colorbar=dict(title="$M / month"),
+        hovertemplate="Adoption: %{x:.0f}%<br>CPM: $%{y:.0f}<br>Revenue: $%{z:.2f}M<extra></extra>"
+    ))
+    fig.add_trace(go.Scatter(
+        x=[assumptions['adoption_rate'] * 100],
+        y=[assumptions['cpm']],
+        mode='markers',
+        marker=dict(size=14, color='#FF9800', line=dict(width=2, color='white')),
+        hoverinfo='skip'
+    ))
+
+    fig.update_layout(
+        title="Monthly Revenue by Adoption and CPM",
+        height=400,
+        showlegend=False,
+        xaxis_title=PARAMETER_LABELS['adoption_rate'] + " (%)",
+        yaxis_title=PARAMETER_LABELS['cpm'],
+        plot_bgcolor='white',
+        paper_bgcolor='white'
+    )
+    return fig
+
+
+def launch_timeline_figure(phases=LAUNCH_PHASES, alerts=None):
+    """Gantt chart of the rollout phases, with anomaly alerts overlaid on the phase they fall in"""
+    fig = px.timeline(
+        pd.DataFrame(phases),
+        x_start="Start",
+        x_end="Finish",
+        y="Task",
+        color="Task",
+        color_discrete_sequence=['#1E88E5', '#2196F3', '#42A5F5', '#64B5F6'],
+        hover_data=["Description", "Lift", "Audience"]
+    )
+
+    fig.update_layout(
+        height=300,
+        showlegend=False,
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        xaxis_title="Timeline",
+        yaxis_title="",
+        font=dict(size=12)
+    )
+    fig.update_yaxes(autorange="reversed")
+    
+    if alerts is not None and len(alerts):
+        frame = pd.DataFrame(phases)
+        hours = pd.to_datetime(alerts['hour']).to_numpy()[:, None]
+        # (alerts x phases) membership; an alert goes on the first phase whose dates contain it
+        within = (hours >= pd.to_datetime(frame['Start']).to_numpy()) & \
+                 (hours < (pd.to_datetime(frame['Finish']) + pd.Timedelta(days=1)).to_numpy())
+        inside = within.any(axis=1)
+        fig.add_trace(go.Scatter(
+            x=hours[inside, 0],
+            y=frame['Task'].to_numpy()[within.argmax(axis=1)][inside],
+            mode='markers',
+            name='Anomaly alert',
+            marker=dict(symbol='x', size=10, color='#f44336'),
+            text=(alerts['metric'] + ": " + alerts['variant'] + " · " + alerts['segment'])[inside],
+            hovertemplate="%{x|%b %d %H:00}<br>%{text}<extra>Alert</extra>"
+        ))
+    return fig
+
+
+def uplift_deciles_figure(deciles):
+    """Predicted vs observed uplift by predicted-uplift decile"""
+    labels = [f"D{d}" for d in deciles['decile']]
+    fig = go.Figure()
+    fig.add_trace(go.Bar(x=labels, y=deciles['observed_uplift'] * 100, name='Observed uplift',
+                         marker_color='#1E88E5'))
+    fig.add_trace(go.Scatter(x=labels, y=deciles['predicted_uplift'] * 100, name='Predicted uplift',
+                             mode='lines+markers', line=dict(color='#FF9800', width=3)))
+    fig.update_layout(
+        height=400,
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        xaxis_title="Predicted-uplift decile (D1 = highest)",
+        yaxis_title="Creation success uplift (pp)",
+        legend=dict(orientation='h', y=1.1)
+    )
+    return fig
+
+
+def retention_heatmap_figure(curves, variants=('control', 'treatment')):
+    """Cohort x day-since-first-activity retention heatmaps, one per variant"""
+    fig = make_subplots(rows=1, cols=len(variants), subplot_titles=[v.title() for v in variants],
+                        shared_yaxes=True)
+    for i, variant in enumerate(variants):
+        grid = curves[curves['variant'] == variant].pivot(index='cohort', columns='day', values='retention')
+        fig.add_trace(go.Heatmap(
+            z=grid.to_numpy() * 100,
+            x=grid.columns,
+            y=grid.index.strftime('%b %d'),
+            coloraxis='coloraxis',
+            hovertemplate="Cohort %{y}, day %{x}: %{z:.1f}%<extra></extra>"
+        ), row=1, col=i + 1)
+    fig.update_layout(
+        height=450,
+        coloraxis=dict(colorscale='Blues', colorbar=dict(title="Active %")),
+        plot_bgcolor='white',
+        paper_bgcolor='white'
+    )
+    fig.update_xaxes(title_text="Days since first activity")
+    fig.update_yaxes(title_text="Cohort (first active day)", autorange="reversed", row=1, col=1)
+    return fig
+
+
+def hourly_rates_figure(hourly, alerts=None):
+    """Hourly creation success and crash rate per variant, with anomaly alerts marked
+
+    hourly has hour, variant, sessions, success_rate and crash_rate columns
+    (live.LiveCounters.hourly_table or anomaly.hourly_overall); alerts is
+    anomaly.detect_anomalies output.
+    """
+    rows = {'success_rate': 1, 'crash_rate': 2}
+    fig = make_subplots(rows=2, cols=1, shared_xaxes=True, vertical_spacing=0.08,
+                        subplot_titles=["Creation success rate", "Crashes per session"])
+    colors = ['#666', '#1E88E5', '#4CAF50', '#FF9800']
+    for i, (variant, group) in enumerate(hourly.groupby('variant', sort=False)):
+        for column, row in rows.items():
+            fig.add_trace(go.Scatter(
+                x=group['hour'],
+                y=group[column] * 100,
+                mode='lines+markers',
+                name=variant,
+                legendgroup=variant,
+                showlegend=row == 1,
+                line=dict(color=colors[i % len(colors)]),
+                customdata=group['sessions'],
+                hovertemplate="%{x|%b %d %H:00}: %{y:.2f}% of %{customdata} sessions<extra>" + variant + "</extra>"
+            ), row=row, col=1)
+    
+    if alerts is not None and len(alerts):
+        for metric, group in alerts.groupby('metric'):
+            fig.add_trace(go.Scatter(
+                x=group['hour'],
+                y=group['observed_rate'] * 100,
+                mode='markers',
+                name='Alert',
+                legendgroup='alert',
+                showlegend=metric == alerts['metric'].iloc[0],
+                marker=dict(symbol='x', size=11, color='#f44336'),
+                text=group['variant'] + " · " + group['segment'],
+                customdata=group['expected_rate'] * 100,
+                hovertemplate="%{text}<br>%{y:.2f}% vs %{customdata:.2f}% expected<extra>Alert</extra>"
+            ), row=rows[metric], col=1)
+    
+    fig.update_layout(
+        height=450,
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        legend=dict(orientation='h', y=1.12)
+    )
+    fig.update_yaxes(ticksuffix="%")
+    return fig
+
+
+def live_funnel_figure(funnel):
+    """Conversion from the first step per variant, from live.LiveCounters.funnel_table"""
+    fig = go.Figure()
+    colors = ['#BBDEFB', '#1E88E5', '#4CAF50', '#FF9800']
+    for i, (variant, rows) in enumerate(funnel.groupby('variant', sort=False)):
+        fig.add_trace(go.Bar(
+            x=rows['funnel_step'],
+            y=rows['conversion_rate'] * 100,
+            name=variant,
+            marker_color=colors[i % len(colors)],
+            customdata=rows['sessions_reached'],
+            hovertemplate="%{x}: %{y:.1f}% (%{customdata:,} sessions)<extra>" + variant + "</extra>"
+        ))
+    fig.update_layout(
+        height=400,
+        barmode='group',
+        xaxis_title="Funnel Step",
+        yaxis_title="Sessions Reaching Step (%)",
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        legend=dict(orientation='h', y=1.1)
+    )
+    return fig
@@ -0,0 +1,134 @@
+"""
+Ordered, time-windowed funnel path matching
+
+A session "reaches" step k only if it fired step k after reaching step k-1,
+within that step's time window. Matching works on events sorted by
+(session, time), by position in that order: an event of step k is reached
+when the latest reached event of step k-1 at or before it is in the same
+session and within the window. The latest predecessor is the closest one,
+so repeated events (a second tab open just before create) never hide a
+valid in-order path. Each step is one vectorized searchsorted over event
+positions, so the cost is a handful of passes over the events rather than
+a loop over sessions.
+"""
+
+import numpy as np
+import pandas as pd
+
+from data_generation import FUNNEL_STEPS
+
+DEFAULT_WINDOW = pd.Timedelta(minutes=30)
+PATH_END = '(session end)'
+
+
+def _prepare(events):
+    """Session codes, millisecond timestamps and event names, sorted by (session, time)"""
+    codes = pd.factorize(events['session_id'], sort=True)[0].astype(np.int64)
+    ms = events['timestamp'].to_numpy(dtype='datetime64[ms]').view(np.int64)
+    ms = ms - ms.min() if len(ms) else ms
+
+    order = np.lexsort((ms, codes))
+    names = events['event_name'].astype(str).to_numpy()[order]
+    return codes[order], ms[order], names
+
+
+def _windows(steps, windows):
+    """Per-step window in milliseconds; step 0 has no window"""
+    if windows is None or isinstance(windows, (pd.Timedelta, str, int, float)):
+        default = DEFAULT_WINDOW if windows is None else pd.Timedelta(windows)
+        windows = {step: default for step in steps[1:]}
+    return [np.int64(pd.Timedelta(windows.get(step, DEFAULT_WINDOW)).value // 1_000_000) for step in steps[1:]]
+
+
+def match_ordered_funnel(events, steps=FUNNEL_STEPS, windows=None):
+    """Time at which each session matched each ordered step
+
+    Returns (session_ids, match_ms): match_ms has one column per step holding
+    the time of the session's earliest in-order event of that step, in
+    milliseconds since the earliest event, or -1 where it was not reached.
+    `windows` may be a single timedelta or a {step: timedelta} dict giving the
+    maximum delay allowed since the previous matched step.
+    """
+    session_ids = np.sort(events['session_id'].unique())
+    codes, ms, names = _prepare(events)
+    match = _match_prepared((codes, ms, names), steps, windows)
+    return session_ids, np.where(match >= 0, ms[np.maximum(match, 0)] if len(ms) else -1, -1)
+
+
+def _match_prepared(prepared, steps, windows):
+    """Sorted-order position of each session's first in-order event of each step, or -1"""
+    codes, ms, names = prepared
+    n_sessions = int(codes.max()) + 1 if len(codes) else 0
+    match = np.full((n_sessions, len(steps)), -1, dtype=np.int64)
+    if not len(codes):
+        return match
+
+    # Last position with the same (session, time), so events at the same instant count as in order
+    run_ends = np.flatnonzero(np.r_[(codes[1:] != codes[:-1]) | (ms[1:] != ms[:-1]), True])
+    tie_end = run_ends[np.searchsorted(run_ends, np.arange(len(codes)))]
+
+    reached = np.flatnonzero(names == steps[0])
+    for k, window in enumerate([None] + _windows(steps, windows)):
+        if k > 0:
+            # Latest reached event of the previous step at or before each candidate
+            candidates = np.flatnonzero(names == steps[k])
+            prev = reached[np.maximum(np.searchsorted(reached, tie_end[candidates], side='right') - 1, 0)]
+            ok = (prev <= tie_end[candidates]) & (codes[prev] == codes[candidates])
+            reached = candidates[ok & (ms[candidates] - ms[prev] <= window)]
+        if not len(reached):
+            break
+        sessions, first = np.unique(codes[reached], return_index=True)
+        match[sessions, k] = reached[first]
+
+    return match
+
+
+def ordered_funnel(events, steps=FUNNEL_STEPS, windows=None):
+    """Sessions reaching each step in order within its window, next to the ever-fired count"""
+    session_ids, match = match_ordered_funnel(events, steps, windows)
+    ordered = (match >= 0).sum(axis=0)
+
+    fired = events[events['event_name'].isin(steps)].drop_duplicates(['session_id', 'event_name'])
+    ever = fired['event_name'].astype(str).value_counts().reindex(steps, fill_value=0).to_numpy()
+
+    return pd.DataFrame({
+        'funnel_step': steps,
+        'sessions_reached_ordered': ordered,
+        'sessions_reached_any': ever,
+        'ordered_conversion_rate': ordered / max(ordered[0], 1),
+        'any_conversion_rate': ever / max(ever[0], 1),
+    })
+
+
+def divergent_paths(events, from_step='edit_tool_opened', next_step='reels_posted',
+                    steps=FUNNEL_STEPS, windows=None, depth=3, top=10):
+    """Most common event paths taken after `from_step` by sessions that never reach `next_step` in order"""
+    prepared = _prepare(events)
+    codes, ms, names = prepared
+    match = _match_prepared(prepared, steps, windows)
+
+    k = steps.index(from_step)
+    stalled = np.flatnonzero((match[:, k] >= 0) & (match[:, steps.index(next_step)] < 0))
+    if len(stalled) == 0:
+        return pd.DataFrame(columns=['path', 'sessions', 'share'])
+
+    # Position of the matched from_step event, then the next `depth` events of the same session
+    start = match[stalled, k]
+    following = start[:, None] + np.arange(1, depth + 1)
+    valid = following < len(codes)
+    following = np.minimum(following, len(codes) - 1)
+    valid &= codes[following] == stalled[:, None]
+
+    labels = np.where(valid, names[following], PATH_END)
+    # Nothing follows the first session end
+    ended = np.cumsum(~valid, axis=1) > 1
+    labels = np.where(ended, '', labels)
+
+    # Count distinct label rows first; only the top paths are turned into strings
+    counts = pd.DataFrame(labels).value_counts().head(top)
+    report = pd.DataFrame({
+        'path': [' → '.join([from_step] + [p for p in path if p]) for path in counts.index],
+        'sessions': counts.to_numpy(),
+        'share': counts.to_numpy() / len(stalled),
+    })
+    return report
@@ -0,0 +1,133 @@
+"""
+Guardrail metrics with delta-method ratio variances
+
+Every guardrail is a ratio of per-user sums (e.g. crashes / sessions). With
+users as the randomization unit, the variance of a ratio of sums follows
+from the delta method and five sums of per-user statistics
+(analysis_functions.ratio_variance):
+
+    sum X, sum N, sum X^2, sum N^2, sum XN
+    var(R) ~= (S_XX - 2 R S_XN + R^2 S_NN) / S_N^2
+
+All guardrails and all segments are evaluated in one groupby over the
+per-user table followed by array arithmetic.
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from analysis_functions import SEGMENT_COLUMNS, ratio_variance
+from data_generation import CRASH_EVENT
+from sessionization import STEP_BITS, summarize_sessions
+
+# name -> (label, numerator, denominator, check)
+# check: 'min_lift' (relative lift >= phase threshold and significant),
+#        'max_rate' (treatment rate upper bound < phase threshold),
+#        'non_inferior' (relative change lower bound > NON_INFERIORITY_MARGIN),
+#        None (reported only)
+GUARDRAILS = {
+    'creation_success': ('Creation success (posts / session)', 'posts', 'sessions', 'min_lift'),
+    'crash_rate': ('Crashes / session', 'crashes', 'sessions', 'max_rate'),
+    'session_duration': ('Session duration (s / session)', 'duration_s', 'sessions', 'non_inferior'),
+    'edit_tools': ('Edit tool opens / session', 'edit_tools', 'sessions', None),
+}
+NON_INFERIORITY_MARGIN = -0.05
+
+# Success Metrics by rollout phase (shown in the Launch Strategy section)
+PHASE_THRESHOLDS = pd.DataFrame({
+    'phase': ['Phase 1', 'Phase 2', 'Phase 3', 'Phase 4'],
+    'min_lift': [0.12, 0.08, 0.08, 0.08],
+    'min_adoption': [0.40, 0.50, 0.50, 0.50],
+    'min_watch_seconds': [28, 28, 28, 28],
+    'max_crash_rate': [0.001, 0.001, 0.001, 0.001],
+}).set_index('phase')
+
+GUARDRAIL_COLUMNS = ['segment', 'guardrail', 'label', 'control', 'treatment', 'relative_change',
+                     'ci_low', 'ci_high', 'p_value', 'threshold', 'status']
+
+
+def user_metric_sums(events, users):
+    """Per-user numerator / denominator sums from sessionized events"""
+    sessions = summarize_sessions(events)
+    sessions = pd.DataFrame({
+        'user_id': sessions['user_id'].to_numpy(),
+        'sessions': 1,
+        'posts': (sessions['steps_mask'] & STEP_BITS['reels_posted']).to_numpy() > 0,
+        'duration_s': (sessions['session_end'] - sessions['session_start']).dt.total_seconds().to_numpy(),
+    })
+    name = events['event_name']
+    sessions = pd.concat([sessions, pd.DataFrame({
+        'user_id': events['user_id'].to_numpy(),
+        'edit_tools': (name == 'edit_tool_opened').to_numpy(),
+        'crashes': (name == CRASH_EVENT).to_numpy(),
+    })], ignore_index=True)
+    per_user = sessions.fillna(0).astype({'sessions': np.int64, 'posts': np.int64, 'edit_tools': np.int64,
+                                          'crashes': np.int64}).groupby('user_id').sum()
+    attributes = users.set_index('user_id')[['variant'] + SEGMENT_COLUMNS]
+    return per_user.join(attributes, how='inner').reset_index()
+
+
+def _ratio_stats(sums, numerator, denominator):
+    """Ratio and its delta-method variance from summed sufficient statistics"""
+    return ratio_variance(sums[f'{numerator}_sum'], sums[f'{denominator}_sum'], sums[f'{numerator}_sq'],
+                          sums[f'{denominator}_sq'], sums[f'{numerator}_x_{denominator}'])
+
+
+def evaluate_guardrails(user_sums, phase='Phase 1', guardrails=GUARDRAILS, segments=SEGMENT_COLUMNS, alpha=0.05):
+    """Every guardrail for overall and every segment, checked against a phase's thresholds"""
+    columns = sorted({c for _, num, den, _ in guardrails.values() for c in (num, den)})
+    pairs = sorted({(num, den) for _, num, den, _ in guardrails.values()})
+
+    values = user_sums[columns].astype(float)
+    stat_columns = {}
+    for c in columns:
+        stat_columns[f'{c}_sum'] = values[c].to_numpy()
+        stat_columns[f'{c}_sq'] = values[c].to_numpy() ** 2
+    for num, den in pairs:
+        stat_columns[f'{num}_x_{den}'] = (values[num] * values[den]).to_numpy()
+    per_user = pd.DataFrame(stat_columns)
+
+    variant = user_sums['variant'].astype(str).to_numpy()
+    frames = [per_user.assign(segment='overall', variant=variant)]
+    frames += [per_user.assign(segment=user_sums[col].astype(str).to_numpy(), variant=variant) for col in segments]
+    sums = pd.concat(frames, ignore_index=True).groupby(['segment', 'variant'], sort=False).sum()
+    control = sums.xs('control', level='variant')
+    treatment = sums.xs('treatment', level='variant').reindex(control.index)
+
+    thresholds = PHASE_THRESHOLDS.loc[phase]
+    z = stats.norm.ppf(1 - alpha / 2)
+    results = []
+    for name, (label, num, den, check) in guardrails.items():
+        r_c, var_c = _ratio_stats(control, num, den)
+        r_t, var_t = _ratio_stats(treatment, num, den)
+        diff_se = np.sqrt(var_t + var_c)
+        p_value = 2 * stats.norm.sf(np.abs(r_t - r_c) / diff_se.where(diff_se > 0))
+        relative = r_t / r_c - 1
+        relative_se = np.sqrt(var_t / r_c ** 2 + r_t ** 2 * var_c / r_c ** 4)
+        ci_low, ci_high = relative - z * relative_se, relative + z * relative_se
+
+        if check == 'min_lift':
+            threshold = thresholds['min_lift']
+            passed = (relative >= threshold) & (p_value < alpha)
+            shown = f"lift ≥ {threshold:.0%}"
+        elif check == 'max_rate':
+            threshold = thresholds['max_crash_rate']
+            passed = (r_t + z * np.sqrt(var_t)) < threshold
+            shown = f"< {threshold:.1%}"
+        elif check == 'non_inferior':
+            passed = ci_low > NON_INFERIORITY_MARGIN
+            shown = f"change > {NON_INFERIORITY_MARGIN:.0%}"
+        else:
+            passed = None
+            shown = "monitor"
+
+        status = pd.Series('info', index=control.index) if passed is None else \
+            pd.Series(np.where(passed, 'pass', 'fail'), index=control.index)
+        results.append(pd.DataFrame({
+            'segment': control.index, 'guardrail': name, 'label': label,
+            'control': r_c.to_numpy(), 'treatment': r_t.to_numpy(), 'relative_change': relative.to_numpy(),
+            'ci_low': ci_low.to_numpy(), 'ci_high': ci_high.to_numpy(), 'p_value': p_value,
+            'threshold': shown, 'status': status.to_numpy(),
+        }))
+    return pd.concat(results, ignore_index=True)[GUARDRAIL_COLUMNS]
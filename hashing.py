@@ -0,0 +1,53 @@
+"""
+Vectorized 64-bit hashing of user ids
+"""
+
+import numpy as np
+import pandas as pd
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+
+
+def splitmix64(x):
+    """SplitMix64 finalizer applied element-wise to a uint64 array"""
+    x = np.asarray(x, dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        z = x + _GOLDEN
+        z = (z ^ (z >> np.uint64(30))) * _MIX1
+        z = (z ^ (z >> np.uint64(27))) * _MIX2
+    return z ^ (z >> np.uint64(31))
+
+
+def salt_to_uint64(salt):
+    """Turn an arbitrary salt (string or int) into a uint64 seed"""
+    if isinstance(salt, (int, np.integer)):
+        return np.uint64(int(salt) & 0xFFFFFFFFFFFFFFFF)
+    return pd.util.hash_array(np.array([str(salt)], dtype=object))[0]
+
+
+def hash_ids(ids, salt=0):
+    """Hash integer or string ids to well-mixed uint64 values
+
+    Integer ids are hashed with SplitMix64; anything else goes through
+    pandas' vectorized object hashing first.
+    """
+    ids = np.asarray(ids)
+    if ids.dtype.kind in 'iu':
+        base = ids.astype(np.uint64, copy=False)
+    else:
+        base = pd.util.hash_array(ids.astype(object))
+    return splitmix64(base ^ splitmix64(salt_to_uint64(salt)))
+
+
+def bit_length(x):
+    """Exact bit length of each element of a uint64 array (0 for 0)"""
+    x = np.asarray(x, dtype=np.uint64).copy()
+    n = np.zeros(x.shape, dtype=np.uint8)
+    for shift in (32, 16, 8, 4, 2, 1):
+        s = np.uint64(shift)
+        big = (x >> s) > 0
+        n[big] += shift
+        x[big] >>= s
+    return n + (x > 0)
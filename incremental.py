@@ -0,0 +1,200 @@
+"""
+Incremental daily refresh of the funnel and A/B aggregates
+Run: python etl.py data/generated/events_sample.csv data/processed/events --partition-date timestamp
+     python incremental.py [data/processed/events] [--rebuild]
+
+Rebuilding every aggregate from the full event history makes each daily
+refresh slower than the last. Instead, each day partition written by etl.py
+(event_date=YYYY-MM-DD/) is reduced once to mergeable partials, saved as
+results/daily/day=YYYY-MM-DD.npz and added into results/daily/state.npz:
+
+    - funnel: sessions that reached each step, overall and per creator
+      cohort (analysis_functions.funnel_step_counts)
+    - A/B: per-user session and successful-post totals with the user's
+      variant and segments (analysis_functions.user_totals). They are the
+      sufficient statistics of the user-clustered tests and of the casual /
+      power creator lifts behind the business-impact model; totals add up
+      across days, and the squares and cross products of ratio_variance are
+      taken only after merging
+
+A refresh reads only the partitions not merged yet and sessionizes them
+with the Sessionizer carry state saved by the previous refresh, so sessions
+spanning midnight are not split. It then rewrites the funnel and A/B result
+files (pipeline.write_stats, the same writer as the stats stage) and runs
+the impact, sensitivity, snapshot and figure stages, which read only those
+files. Its cost is the new day's events plus one pass over the per-user
+state, independent of the number of days already merged, and its results
+equal the batch pipeline's over the same events.
+
+Partitions must arrive in date order: one dated on or before the last
+merged day (late data) needs --rebuild, which replays every partition.
+"""
+
+import argparse
+import glob
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from analysis_functions import SEGMENT_COLUMNS, funnel_step_counts, user_totals
+from etl import read_partitions
+from pipeline import AB_CONTRASTS, AB_RESULTS, FUNNEL_COHORT, FUNNEL_OVERALL, default_stages, run_pipeline, write_stats
+from sessionization import Sessionizer, session_table
+
+EVENT_PARTITIONS = 'data/processed/events'
+USERS_PATH = 'data/generated/users.csv'
+DAILY_DIR = 'results/daily'
+STATE_FILE = 'state.npz'
+METRICS = ['successful_post']
+STATS_OUTPUTS = {'funnel_overall': FUNNEL_OVERALL, 'funnel_cohort': FUNNEL_COHORT, 'ab_results': AB_RESULTS,
+                 'ab_contrasts': AB_CONTRASTS}
+# pipeline.py stages that read only the stats outputs
+DOWNSTREAM_STAGES = ['impact', 'sensitivity', 'snapshot', 'viz']
+
+PARTIALS = ['funnel', 'cohort_funnel', 'totals']
+
+
+def day_partials(sessions):
+    """Mergeable funnel counts and per-user totals of a session table (see session_table)"""
+    cohort_funnel = funnel_step_counts(sessions, by='creator_cohort')
+    return {
+        'funnel': funnel_step_counts(sessions),
+        'cohort_funnel': cohort_funnel.rename_axis('creator_cohort').reset_index(),
+        'totals': user_totals(sessions, METRICS),
+    }
+
+
+def merge_partials(a, b):
+    """Sum of two sets of partials: step counts by cohort, totals by user"""
+    if a is None:
+        return b
+    cohorts = pd.concat([a['cohort_funnel'], b['cohort_funnel']], ignore_index=True)
+    totals = pd.concat([a['totals'], b['totals']], ignore_index=True)
+    attributes = ['variant'] + SEGMENT_COLUMNS
+    return {
+        'funnel': a['funnel'] + b['funnel'],
+        'cohort_funnel': cohorts.groupby('creator_cohort', sort=True).sum().reset_index(),
+        'totals': totals.groupby('user_id', sort=True).agg(
+            {**{c: 'first' for c in attributes}, **{c: 'sum' for c in ['n'] + METRICS}}).reset_index(),
+    }
+
+
+def save_npz(path, partials, carry=None):
+    """Write partials (and a Sessionizer state) column by column, without pickling"""
+    arrays = {}
+    for name, frame in partials.items():
+        for column in frame.columns:
+            values = frame[column].to_numpy()
+            arrays[f'{name}__{column}'] = values.astype(str) if values.dtype == object else values
+    for key, value in (carry or {}).items():
+        arrays[f'carry__{key}'] = value
+    tmp = path + '.tmp.npz'
+    np.savez(tmp, **arrays)
+    os.replace(tmp, path)
+
+
+def load_npz(path):
+    """Partials and Sessionizer state (empty if none) saved by save_npz"""
+    columns = {name: {} for name in PARTIALS + ['carry']}
+    with np.load(path, allow_pickle=False) as f:
+        for key in f.files:
+            name, column = key.split('__', 1)
+            columns[name][column] = f[key]
+    carry = columns.pop('carry')
+    return {name: pd.DataFrame(values) for name, values in columns.items()}, carry
+
+
+class DailyAggregates:
+    """Merged daily partials, the days they cover and the Sessionizer carry state"""
+
+    def __init__(self, days=(), partials=None, sessionizer=None):
+        self.days = list(days)
+        self.partials = partials
+        self.sessionizer = sessionizer or Sessionizer()
+
+    @classmethod
+    def load(cls, path):
+        partials, carry = load_npz(path)
+        days = [str(day) for day in carry.pop('days')]
+        return cls(days, partials, Sessionizer.from_state(carry))
+
+    def save(self, path):
+        carry = {**self.sessionizer.state(), 'days': np.asarray(self.days, dtype=str)}
+        save_npz(path, self.partials, carry)
+
+    def add_day(self, day, partials):
+        self.partials = merge_partials(self.partials, partials)
+        self.days.append(day)
+
+    def view(self, users):
+        """Merged partials plus the sessions still open at the end of the last day"""
+        pending = self.sessionizer.pending
+        if not len(pending):
+            return self.partials
+        return merge_partials(self.partials, day_partials(session_table(pending, users)))
+
+
+def partition_days(partitions_dir=EVENT_PARTITIONS):
+    """Dates of the etl.py day partitions, in order"""
+    paths = glob.glob(os.path.join(partitions_dir, 'event_date=*'))
+    return sorted(os.path.basename(path).split('=', 1)[1] for path in paths)
+
+
+def refresh(partitions_dir=EVENT_PARTITIONS, out_dir=DAILY_DIR, users_path=USERS_PATH, rebuild=False,
+            downstream=True, log=print):
+    """Merge every day partition not merged yet and rewrite the result files; returns the days merged"""
+    state_path = os.path.join(out_dir, STATE_FILE)
+    aggregates = DailyAggregates()
+    if os.path.exists(state_path) and not rebuild:
+        aggregates = DailyAggregates.load(state_path)
+
+    days = [day for day in partition_days(partitions_dir) if day not in aggregates.days]
+    late = [day for day in days if aggregates.days and day <= aggregates.days[-1]]
+    if late:
+        raise ValueError(f"partitions {', '.join(late)} are not after the last merged day "
+                         f"{aggregates.days[-1]}; rerun with --rebuild")
+    if not days and aggregates.partials is None:
+        raise FileNotFoundError(f"no event_date= partitions in {partitions_dir}")
+
+    users = pd.read_csv(users_path)
+    os.makedirs(out_dir, exist_ok=True)
+    for day in days:
+        started = time.perf_counter()
+        # Parts are in byte order, i.e. time order for a time-ordered log
+        closed = [aggregates.sessionizer.process(part)
+                  for part in read_partitions(os.path.join(partitions_dir, f'event_date={day}'))]
+        sessions = session_table(pd.concat(closed, ignore_index=True), users)
+        partials = day_partials(sessions)
+        save_npz(os.path.join(out_dir, f'day={day}.npz'), partials)
+        aggregates.add_day(day, partials)
+        aggregates.save(state_path)
+        log(f"{day}: {len(sessions):,} sessions closed, {len(partials['totals']):,} users "
+            f"({time.perf_counter() - started:.2f}s)")
+
+    view = aggregates.view(users)
+    write_stats(STATS_OUTPUTS, view['funnel'], view['cohort_funnel'].set_index('creator_cohort').rename_axis(None),
+                view['totals'])
+    log(f"{len(aggregates.days)} day(s) merged, {len(view['totals']):,} users")
+    if downstream:
+        run_pipeline([stage for stage in default_stages() if stage.name in DOWNSTREAM_STAGES], log=log)
+    return days
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge new daily event partitions into the result aggregates")
+    parser.add_argument('partitions', nargs='?', default=EVENT_PARTITIONS,
+                        help="etl.py output partitioned by event_date")
+    parser.add_argument('--users', default=USERS_PATH)
+    parser.add_argument('--out', default=DAILY_DIR, help="Directory for daily partials and the merged state")
+    parser.add_argument('--rebuild', action='store_true', help="Discard the merged state and replay every partition")
+    parser.add_argument('--no-downstream', action='store_true',
+                        help="Only rewrite the funnel and A/B files, not the pipeline stages that read them")
+    args = parser.parse_args()
+
+    refresh(args.partitions, args.out, args.users, args.rebuild, not args.no_downstream)
+
+
+if __name__ == "__main__":
+    main()
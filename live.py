@@ -0,0 +1,326 @@
+"""
+Live experiment monitoring from an append-only event log
+Run: python live.py replay data/generated/events_sample.csv --rate 2000
+     python live.py tail
+
+`replay` stands in for the production event stream: it copies the rows of
+an event CSV into data/live/events.log at a fixed rate. The dashboard's Live
+Monitoring section (and `tail`) follows that log. Every poll reads only the
+bytes appended since the previous one, at most MAX_POLL_BYTES, and
+sessionizes them with the carry state of sessionization.Sessionizer. The
+sessions that have closed are then folded into running counters:
+
+    - funnel: sessions that fired each step, per variant
+    - A/B: per-variant sums over users of sessions and posts and of their
+      squares and cross product. Each poll updates them from the deltas of
+      the users it touched, so the user-clustered creation-success test
+      (analysis_functions.ratio_variance) costs O(variants) to evaluate
+    - hourly: events, sessions, posts and crashes per (hour, variant), for
+      the trailing HOURLY_WINDOW only
+    - anomalies: each hour, once complete (the latest event is a session
+      gap past its end, so its sessions have closed), goes through the
+      persistent per-metric CUSUM of anomaly.LiveAnomalies, so a regression
+      alerts about half an hour after the end of the hour it starts in
+
+A poll therefore costs O(new events + users touched), and a refresh reads
+the counters in O(variants x steps + window), independent of history.
+"""
+
+import argparse
+import io
+import itertools
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from analysis_functions import ratio_variance
+from anomaly import LiveAnomalies
+from data_generation import CRASH_EVENT, FUNNEL_STEPS
+from sessionization import SESSION_GAP, STEP_BITS, Sessionizer
+
+LIVE_LOG_PATH = os.environ.get('DASHBOARD_LIVE_LOG', 'data/live/events.log')
+USERS_PATH = 'data/generated/users.csv'
+DEFAULT_RATE = 2000  # events per second
+REPLAY_TICK = 0.2  # seconds between appends
+MAX_POLL_BYTES = 4 * 2 ** 20
+HOURLY_WINDOW = pd.Timedelta(hours=48)
+
+HOURLY_COLUMNS = ['events', 'sessions', 'posts', 'crashes']
+# Per-variant user sums: users with a closed session, then the ratio_variance inputs
+SUM_ROWS = ['users', 'n', 'y', 'nn', 'yy', 'yn']
+
+
+def replay(source, log_path=LIVE_LOG_PATH, rate=DEFAULT_RATE, limit=None):
+    """Append the rows of an event CSV to a fresh log at `rate` events per second; returns rows written"""
+    os.makedirs(os.path.dirname(log_path) or '.', exist_ok=True)
+    per_tick = max(int(rate * REPLAY_TICK), 1)
+    written = 0
+    started = time.monotonic()
+    tmp = f'{log_path}.{os.getpid()}.tmp'
+    with open(source) as src, open(tmp, 'w') as log:
+        log.write(src.readline())
+        log.flush()
+        # A new file renamed into place, so tailers see a new file identity rather than a rewritten log
+        os.replace(tmp, log_path)
+        rows = src if limit is None else itertools.islice(src, limit)
+        while True:
+            batch = list(itertools.islice(rows, per_tick))
+            if not batch:
+                return written
+            log.writelines(batch)
+            log.flush()
+            written += len(batch)
+            # Sleep to the schedule, not a fixed tick, so slow writes do not lower the rate
+            time.sleep(max(started + written / rate - time.monotonic(), 0))
+
+
+class LogTailer:
+    """Reads complete CSV lines appended to a log since the previous read"""
+
+    def __init__(self, path, max_bytes=MAX_POLL_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.offset = 0
+        self.header = None
+        self.identity = None  # (device, inode) of the file being read
+
+    def replaced(self):
+        """True if the log is no longer the file being read (a new replay) or was cut below the read position"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        moved = self.identity is not None and (stat.st_dev, stat.st_ino) != self.identity
+        return moved or stat.st_size < self.offset
+
+    def read(self):
+        """Event frame of the new complete lines, or None if there are none"""
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            if self.identity is None:
+                self.identity = (stat.st_dev, stat.st_ino)
+            elif (stat.st_dev, stat.st_ino) != self.identity:
+                return None  # replaced since replaced() was checked; the next poll resets
+            f.seek(self.offset)
+            block = f.read(self.max_bytes)
+        # A partially written last line is left for the next read
+        end = block.rfind(b'\n') + 1
+        if end == 0:
+            return None
+        block = block[:end]
+        self.offset += end
+        if self.header is None:
+            split = block.index(b'\n') + 1
+            self.header, block = block[:split], block[split:]
+        if not block:
+            return None
+        return pd.read_csv(io.BytesIO(self.header + block), parse_dates=['timestamp'])
+
+
+class LiveCounters:
+    """Running funnel, A/B and hourly counters over a stream of event chunks"""
+
+    def __init__(self, users, control='control'):
+        variants = users['variant'].astype(str)
+        self.variants = [control] + sorted(set(variants) - {control})
+        self.user_index = pd.Index(users['user_id'].to_numpy())
+        self.user_variant = pd.Categorical(variants, categories=self.variants).codes.astype(np.int64)
+        self.sessionizer = Sessionizer()
+        self.anomalies = LiveAnomalies(self.variants)
+
+        self.user_sessions = np.zeros(len(self.user_index), dtype=np.int64)
+        self.user_posts = np.zeros(len(self.user_index), dtype=np.int64)
+        self.sums = np.zeros((len(SUM_ROWS), len(self.variants)))
+        self.funnel = np.zeros((len(self.variants), len(FUNNEL_STEPS)), dtype=np.int64)
+        self.hours = {}  # hour -> (variants x HOURLY_COLUMNS) counts
+        self.events = 0
+        self.closed_sessions = 0
+        self.latest = None
+
+    def _variant_codes(self, user_ids):
+        rows = self.user_index.get_indexer(np.asarray(user_ids))
+        return rows, np.where(rows >= 0, self.user_variant[np.maximum(rows, 0)], -1)
+
+    def _add_hourly(self, times, codes, column, weights=None):
+        known = codes >= 0
+        frame = pd.DataFrame({'hour': times[known].dt.floor('h').to_numpy(), 'variant': codes[known],
+                              'count': 1 if weights is None else weights[known]})
+        horizon = self.latest - HOURLY_WINDOW
+        for (hour, variant), count in frame.groupby(['hour', 'variant'])['count'].sum().items():
+            if hour >= horizon:
+                counts = self.hours.setdefault(
+                    hour, np.zeros((len(self.variants), len(HOURLY_COLUMNS)), dtype=np.int64))
+                counts[variant, column] += int(count)
+
+    def update(self, events):
+        """Fold one time-ordered chunk of raw events (user_id, event_name, timestamp) into the counters"""
+        if events is None or events.empty:
+            return self
+        self.events += len(events)
+        self.latest = max(self.latest or events['timestamp'].max(), events['timestamp'].max())
+        _, codes = self._variant_codes(events['user_id'])
+        self._add_hourly(events['timestamp'], codes, 0)
+        self._add_hourly(events['timestamp'], codes, 3, (events['event_name'] == CRASH_EVENT).to_numpy())
+
+        closed = self.sessionizer.process(events[['user_id', 'event_name', 'timestamp']])
+        if len(closed):
+            self._add_sessions(closed)
+        horizon = self.latest - HOURLY_WINDOW
+        for hour in [h for h in self.hours if h < horizon]:
+            del self.hours[hour]
+        self.anomalies.update(self.hours, HOURLY_COLUMNS, self.latest - SESSION_GAP - pd.Timedelta(hours=1), horizon)
+        return self
+
+    def _add_sessions(self, sessions):
+        self.closed_sessions += len(sessions)
+        rows, codes = self._variant_codes(sessions['user_id'])
+        masks = sessions['steps_mask'].to_numpy(dtype=np.uint8)
+        posts = (masks & STEP_BITS['reels_posted']) > 0
+        starts = pd.to_datetime(sessions['session_start'])
+        self._add_hourly(starts, codes, 1)
+        self._add_hourly(starts, codes, 2, posts.astype(np.int64))
+
+        known = codes >= 0
+        rows, codes, masks, posts = rows[known], codes[known], masks[known], posts[known]
+        reached = np.stack([(masks & STEP_BITS[step]) > 0 for step in FUNNEL_STEPS], axis=1)
+        np.add.at(self.funnel, codes, reached.astype(np.int64))
+
+        # Per-user deltas update the sums of squares without revisiting older sessions
+        touched, inverse = np.unique(rows, return_inverse=True)
+        dn = np.bincount(inverse, minlength=len(touched))
+        dy = np.bincount(inverse, weights=posts, minlength=len(touched)).astype(np.int64)
+        n0, y0 = self.user_sessions[touched], self.user_posts[touched]
+        n1, y1 = n0 + dn, y0 + dy
+        deltas = [n0 == 0, dn, dy, n1 ** 2 - n0 ** 2, y1 ** 2 - y0 ** 2, n1 * y1 - n0 * y0]
+        variant = self.user_variant[touched]
+        for i, delta in enumerate(deltas):
+            self.sums[i] += np.bincount(variant, weights=delta, minlength=len(self.variants))
+        self.user_sessions[touched], self.user_posts[touched] = n1, y1
+
+    def funnel_table(self):
+        """Sessions reaching each step (ever fired) and conversion from the first step, per variant"""
+        counts = self.funnel
+        with np.errstate(invalid='ignore', divide='ignore'):
+            conversion = counts / counts[:, :1]
+        return pd.DataFrame({
+            'variant': np.repeat(self.variants, len(FUNNEL_STEPS)),
+            'funnel_step': np.tile(FUNNEL_STEPS, len(self.variants)),
+            'sessions_reached': counts.ravel(),
+            'conversion_rate': conversion.ravel(),
+        })
+
+    def ab_table(self, alpha=0.05):
+        """Creation success per variant and its relative lift over control (user-clustered, Bonferroni CIs)"""
+        users, n, y, nn, yy, yn = self.sums
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean, var = ratio_variance(y, n, yy, nn, yn)
+            relative = mean / mean[0] - 1
+            relative_se = np.sqrt(var / mean[0] ** 2 + mean ** 2 * var[0] / mean[0] ** 4)
+            p_value = 2 * stats.norm.sf(np.abs(mean - mean[0]) / np.sqrt(var + var[0]))
+        z = stats.norm.ppf(1 - alpha / (2 * max(len(self.variants) - 1, 1)))
+        table = pd.DataFrame({
+            'variant': self.variants,
+            'users': users.astype(np.int64),
+            'sessions': n.astype(np.int64),
+            'creation_success': mean,
+            'relative_lift': relative,
+            'ci_low': relative - z * relative_se,
+            'ci_high': relative + z * relative_se,
+            'p_value': p_value,
+        })
+        table.loc[0, ['relative_lift', 'ci_low', 'ci_high', 'p_value']] = np.nan
+        return table
+
+    def hourly_table(self):
+        """Hourly counts and rates per variant over the trailing window"""
+        hours = sorted(self.hours)
+        if not hours:
+            return pd.DataFrame(columns=['hour', 'variant'] + HOURLY_COLUMNS + ['success_rate', 'crash_rate'])
+        counts = np.stack([self.hours[h] for h in hours])
+        table = pd.DataFrame(counts.reshape(-1, len(HOURLY_COLUMNS)), columns=HOURLY_COLUMNS)
+        table.insert(0, 'hour', np.repeat(hours, len(self.variants)))
+        table.insert(1, 'variant', np.tile(self.variants, len(hours)))
+        sessions = table['sessions'].where(table['sessions'] > 0)
+        table['success_rate'] = table['posts'] / sessions
+        table['crash_rate'] = table['crashes'] / sessions
+        return table
+
+    def status(self):
+        return {'events': self.events, 'closed_sessions': self.closed_sessions,
+                'open_sessions': len(self.sessionizer.pending), 'latest_event': self.latest}
+
+
+class LiveMonitor:
+    """A log tailer feeding live counters; shared by every dashboard session, so polls are serialized"""
+
+    def __init__(self, log_path=LIVE_LOG_PATH, users_path=USERS_PATH):
+        self.log_path = log_path
+        self.users = pd.read_csv(users_path, usecols=['user_id', 'variant'])
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.tailer = LogTailer(self.log_path)
+        self.counters = LiveCounters(self.users)
+
+    def poll(self):
+        """Consume what was appended since the last poll (at most MAX_POLL_BYTES); returns events read"""
+        with self._lock:
+            if self.tailer.replaced():
+                self._reset()
+            events = self.tailer.read()
+            self.counters.update(events)
+            return 0 if events is None else len(events)
+
+    @property
+    def backlog_bytes(self):
+        """Bytes appended to the log that have not been consumed yet"""
+        if not os.path.exists(self.log_path):
+            return 0
+        return max(os.path.getsize(self.log_path) - self.tailer.offset, 0)
+
+    def view(self):
+        """Counter tables for one refresh"""
+        with self._lock:
+            return {'status': self.counters.status(), 'ab': self.counters.ab_table(),
+                    'funnel': self.counters.funnel_table(), 'hourly': self.counters.hourly_table(),
+                    'alerts': self.counters.anomalies.table()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay events into a live log, or follow one")
+    sub = parser.add_subparsers(dest='command', required=True)
+    replay_args = sub.add_parser('replay', help="append events from a CSV to the live log at a fixed rate")
+    replay_args.add_argument('source', nargs='?', default='data/generated/events_sample.csv')
+    replay_args.add_argument('--log', default=LIVE_LOG_PATH)
+    replay_args.add_argument('--rate', type=float, default=DEFAULT_RATE, help="events per second")
+    replay_args.add_argument('--limit', type=int, default=None, help="stop after this many events")
+    tail_args = sub.add_parser('tail', help="follow the live log and print the A/B counters")
+    tail_args.add_argument('--log', default=LIVE_LOG_PATH)
+    tail_args.add_argument('--users', default=USERS_PATH)
+    tail_args.add_argument('--interval', type=float, default=2.0)
+    args = parser.parse_args()
+
+    if args.command == 'replay':
+        print(f"Replaying {args.source} into {args.log} at {args.rate:,.0f} events/s")
+        print(f"Wrote {replay(args.source, args.log, args.rate, args.limit):,} events")
+        return
+
+    monitor = LiveMonitor(args.log, args.users)
+    while True:
+        monitor.poll()
+        view = monitor.view()
+        print(f"{view['status']['events']:,} events, {view['status']['closed_sessions']:,} closed sessions, "
+              f"latest {view['status']['latest_event']}")
+        print(view['ab'].to_string(index=False))
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
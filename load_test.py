@@ -0,0 +1,111 @@
+"""
+Headless concurrent-viewer load test for the dashboard
+Run: python load_test.py --sessions 24 --reruns 10
+
+Each simulated viewer is a Streamlit AppTest session running in its own
+thread, all inside one process so they share the cached data exactly as
+sessions on a real server do. Every viewer opens the app, then repeatedly
+switches section and moves an assumption slider; each rerun is timed.
+"""
+
+import argparse
+import os
+import random
+import resource
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from streamlit.testing.v1 import AppTest
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'streamlit_app.py')
+
+SECTIONS = ["Executive Summary", "A/B Test Results", "Funnel Analysis",
+            "Business Impact", "Launch Strategy", "Methodology", "Data Validation", "Run Comparison"]
+SLIDERS = {
+    'adoption_rate': [0.4, 0.5, 0.6, 0.7, 0.8],
+    'monetization_rate': [0.25, 0.3, 0.35, 0.4, 0.45],
+    'cpm': [10, 15, 20, 25, 30],
+}
+
+
+def resident_memory_mb():
+    """Current resident set size of this process in MB"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+    except (OSError, ValueError):
+        # Not Linux: fall back to the peak RSS (KB on Linux, bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1e6 if peak > 1e9 else peak / 1e3
+
+
+def simulate_viewer(viewer_id, reruns, timeout, start_barrier):
+    """One viewer session; returns the latency in seconds of every rerun"""
+    rng = random.Random(viewer_id)
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    start_barrier.wait()
+
+    latencies = []
+    started = time.perf_counter()
+    at.run()
+    latencies.append(time.perf_counter() - started)
+
+    for i in range(reruns):
+        # The assumption sliders only exist in the Business Impact section
+        if i % 2 == 0 or at.radio(key='section').value != "Business Impact":
+            at.radio(key='section').set_value(rng.choice(SECTIONS))
+        else:
+            key = rng.choice(list(SLIDERS))
+            at.slider(key=key).set_value(rng.choice(SLIDERS[key]))
+        started = time.perf_counter()
+        at.run()
+        latencies.append(time.perf_counter() - started)
+
+    if at.exception:
+        raise RuntimeError(f"viewer {viewer_id}: {at.exception[0].message}")
+    return latencies
+
+
+def run_load_test(sessions=24, reruns=10, timeout=120):
+    """Simulate `sessions` concurrent viewers and summarize rerun latency and memory"""
+    baseline_mb = resident_memory_mb()
+    barrier = threading.Barrier(sessions)
+
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        futures = [pool.submit(simulate_viewer, i, reruns, timeout, barrier) for i in range(sessions)]
+        per_viewer = [f.result() for f in futures]
+
+    first = np.array([lat[0] for lat in per_viewer])
+    reruns_only = np.concatenate([lat[1:] for lat in per_viewer]) if reruns else np.empty(0)
+    all_runs = np.concatenate(per_viewer)
+
+    return {
+        'sessions': sessions,
+        'runs': len(all_runs),
+        'first_load_p50_s': float(np.percentile(first, 50)),
+        'first_load_p95_s': float(np.percentile(first, 95)),
+        'rerun_p50_s': float(np.percentile(reruns_only, 50)) if len(reruns_only) else float('nan'),
+        'rerun_p95_s': float(np.percentile(reruns_only, 95)) if len(reruns_only) else float('nan'),
+        'baseline_rss_mb': baseline_mb,
+        'final_rss_mb': resident_memory_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=24, help="Concurrent viewer sessions")
+    parser.add_argument('--reruns', type=int, default=10, help="Interactions per viewer after first load")
+    parser.add_argument('--timeout', type=float, default=120, help="Per-run timeout in seconds")
+    args = parser.parse_args()
+
+    report = run_load_test(args.sessions, args.reruns, args.timeout)
+    print(f"{report['sessions']} concurrent sessions, {report['runs']} runs")
+    print(f"First load  p50 {report['first_load_p50_s'] * 1000:8.0f} ms   p95 {report['first_load_p95_s'] * 1000:8.0f} ms")
+    print(f"Rerun       p50 {report['rerun_p50_s'] * 1000:8.0f} ms   p95 {report['rerun_p95_s'] * 1000:8.0f} ms")
+    print(f"Resident memory {report['baseline_rss_mb']:.0f} MB -> {report['final_rss_mb']:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
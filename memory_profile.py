@@ -0,0 +1,205 @@
+"""
+Memory profiling and per-dataset size budgets for the dashboard
+Run: DASHBOARD_MEMORY_PROFILE=1 streamlit run streamlit_app.py
+
+Profiling (off by default, tracemalloc slows allocation-heavy code) records
+for load_data and every section renderer the peak traced allocation while
+it ran and what it left allocated afterwards. tracemalloc is process-wide,
+so profiled blocks are serialized: with concurrent viewers the profiling
+mode trades throughput for per-block numbers that are not mixed up.
+
+Budgets are always enforced when data is loaded: a frame whose deep memory
+usage exceeds its budget is downcast (narrower numeric dtypes, low-cardinality
+strings to categories) and a warning goes to the validation report, stating
+whether downcasting brought it back under budget. Raw events are checked
+chunk by chunk as they are read (ChunkBudget), so an oversized event log is
+never held at full width. The other frames are checked by enforce_budgets()
+once load_data has built them: that trims the memory they retain, not the
+peak reached while building them.
+Override budgets with DASHBOARD_DATA_BUDGETS_MB='{"events": 128}'.
+"""
+
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from validation import memory_budget_warning
+
+PROFILE_ENV = 'DASHBOARD_MEMORY_PROFILE'
+BUDGETS_ENV = 'DASHBOARD_DATA_BUDGETS_MB'
+
+DEFAULT_BUDGET_MB = 256
+DATA_BUDGETS_MB = {'events': 512, 'guardrail_stats': 64}
+CATEGORY_MAX_RATIO = 0.5  # convert strings to category when unique values are at most this share of rows
+
+PROFILE_COLUMNS = ['block', 'calls', 'last_peak_mb', 'max_peak_mb', 'retained_mb', 'seconds']
+
+
+def profiling_enabled():
+    return os.environ.get(PROFILE_ENV, '').lower() not in ('', '0', 'false', 'no')
+
+
+def load_budgets():
+    """Per-dataset budgets in MB, defaults updated from the environment"""
+    budgets = dict(DATA_BUDGETS_MB)
+    budgets.update(json.loads(os.environ.get(BUDGETS_ENV) or '{}'))
+    return budgets
+
+
+class MemoryProfiler:
+    """Peak and retained tracemalloc allocations per named block"""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.records = {}
+        self._lock = threading.Lock()
+        if enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def measure(self, name):
+        """Record the block's peak and retained allocations (no-op when disabled; do not nest)"""
+        if not self.enabled:
+            yield
+            return
+        with self._lock:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            started = time.perf_counter()
+            try:
+                yield
+            finally:
+                current, peak = tracemalloc.get_traced_memory()
+                record = self.records.setdefault(name, {'calls': 0, 'max_peak_mb': 0.0})
+                record['calls'] += 1
+                record['last_peak_mb'] = (peak - before) / 1e6
+                record['max_peak_mb'] = max(record['max_peak_mb'], record['last_peak_mb'])
+                record['retained_mb'] = (current - before) / 1e6
+                record['seconds'] = time.perf_counter() - started
+
+    def report(self):
+        """One row per profiled block, largest peak first"""
+        rows = [dict(record, block=name) for name, record in self.records.items()]
+        if not rows:
+            return pd.DataFrame(columns=PROFILE_COLUMNS)
+        return pd.DataFrame(rows)[PROFILE_COLUMNS].sort_values('max_peak_mb', ascending=False)
+
+
+profiler = MemoryProfiler(profiling_enabled())
+
+
+def _frames(data, prefix=''):
+    for key, value in data.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, pd.DataFrame):
+            yield name, value
+        elif hasattr(value, 'items'):
+            yield from _frames(value, f'{name}.')
+
+
+def frame_sizes(data, budgets=None):
+    """Every DataFrame in a (nested) data dict with its deep memory usage, largest first"""
+    budgets = load_budgets() if budgets is None else budgets
+    rows = [{'dataset': name, 'rows': len(frame), 'columns': frame.shape[1],
+             'deep_mb': _deep_mb(frame),
+             'budget_mb': budgets.get(name, DEFAULT_BUDGET_MB)}
+            for name, frame in _frames(data)]
+    sizes = pd.DataFrame(rows, columns=['dataset', 'rows', 'columns', 'deep_mb', 'budget_mb'])
+    return sizes.sort_values('deep_mb', ascending=False).reset_index(drop=True)
+
+
+def downcast_frame(frame, category_max_ratio=CATEGORY_MAX_RATIO):
+    """Copy of a frame with the narrowest lossless integer dtypes, float32 floats and categorical strings"""
+    columns = {}
+    for column in frame.columns:
+        values = frame[column]
+        if pd.api.types.is_bool_dtype(values) or isinstance(values.dtype, pd.CategoricalDtype):
+            continue
+        if pd.api.types.is_integer_dtype(values):
+            columns[column] = pd.to_numeric(values, downcast='integer')
+        elif pd.api.types.is_float_dtype(values):
+            columns[column] = values.astype(np.float32)
+        elif pd.api.types.is_string_dtype(values) and len(values) \
+                and values.nunique() <= category_max_ratio * len(values):
+            columns[column] = values.astype('category')
+    return frame.assign(**columns) if columns else frame
+
+
+def _deep_mb(frame):
+    return frame.memory_usage(deep=True).sum() / 1e6
+
+
+def concat_chunks(chunks):
+    """pd.concat of downcast chunks, keeping categorical columns categorical across chunks"""
+    for column in chunks[0].columns:
+        if not any(isinstance(chunk[column].dtype, pd.CategoricalDtype) for chunk in chunks):
+            continue
+        categories = pd.Index(pd.unique(np.concatenate([
+            chunk[column].cat.categories.to_numpy(dtype=object)
+            if isinstance(chunk[column].dtype, pd.CategoricalDtype) else chunk[column].unique().astype(object)
+            for chunk in chunks])))
+        chunks = [chunk.assign(**{column: pd.Categorical(chunk[column], categories=categories)}) for chunk in chunks]
+    return pd.concat(chunks, ignore_index=True)
+
+
+class ChunkBudget:
+    """Memory budget check for a frame read in chunks
+
+    Chunks are kept as they arrive; once their total deep memory usage
+    passes the dataset's budget, the chunks kept so far and every later one
+    are downcast, so the frame is never assembled at full width.
+    """
+
+    def __init__(self, dataset, budgets=None):
+        budgets = load_budgets() if budgets is None else budgets
+        self.dataset = dataset
+        self.budget = budgets.get(dataset, DEFAULT_BUDGET_MB)
+        self.used = 0.0
+        self.downcasting = False
+        self.chunks = []
+        self.violations = []
+
+    def add(self, chunk):
+        self.used += _deep_mb(chunk)
+        if not self.downcasting and self.used > self.budget:
+            self.downcasting = True
+            self.chunks = [downcast_frame(kept) for kept in self.chunks]
+        self.chunks.append(downcast_frame(chunk) if self.downcasting else chunk)
+
+    def frame(self):
+        """The concatenated chunks; a budget warning is recorded if they were downcast"""
+        frame = concat_chunks(self.chunks) if self.downcasting else pd.concat(self.chunks, ignore_index=True)
+        self.chunks = []
+        if self.downcasting:
+            self.violations.append(memory_budget_warning(self.dataset, self.used, self.budget, _deep_mb(frame)))
+        return frame
+
+
+def enforce_budgets(data, budgets=None):
+    """Downcast frames over budget in place in `data`; returns validation warnings
+
+    This runs on frames that are already built, so it only cuts the memory
+    they retain; see ChunkBudget for checking a frame while it is read.
+    """
+    budgets = load_budgets() if budgets is None else budgets
+    violations = []
+    for name, frame in list(_frames(data)):
+        budget = budgets.get(name, DEFAULT_BUDGET_MB)
+        used = _deep_mb(frame)
+        if used <= budget:
+            continue
+        slim = downcast_frame(frame)
+        after = _deep_mb(slim)
+        # Only top-level frames are replaced; nested ones are reported
+        if name in data:
+            data[name] = slim
+        else:
+            after = used
+        violations.append(memory_budget_warning(name, used, budget, after))
+    return violations
@@ -0,0 +1,171 @@
+"""
+Local JSON / Arrow metrics API
+Run: python metrics_api.py --port 8765
+
+Serves ab_results, funnel_overall and business_impact from the same
+in-memory snapshot the dashboard renders. Every payload is serialized once
+per snapshot and tagged with a content-hash ETag, so polling clients that
+send If-None-Match get a bodiless 304 until the numbers actually change.
+
+    GET /metrics                       -> index of resources and their ETags
+    GET /metrics/<name>                -> JSON (records for tables)
+    GET /metrics/<name>?format=arrow   -> Arrow IPC stream (tables only)
+"""
+
+import argparse
+import hashlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+RESOURCES = ['ab_results', 'funnel_overall', 'business_impact']
+ARROW_MEDIA_TYPE = 'application/vnd.apache.arrow.stream'
+DEFAULT_PORT = 8765
+
+
+def _plain(value):
+    """Recursively convert mappings and numpy scalars for json.dumps"""
+    if hasattr(value, 'items'):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return value
+
+
+def _to_json(value):
+    if isinstance(value, pd.DataFrame):
+        return value.to_json(orient='records', double_precision=15).encode()
+    return json.dumps(_plain(value)).encode()
+
+
+def _to_arrow(value):
+    import pyarrow as pa  # optional dependency
+
+    table = pa.Table.from_pandas(value, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _etag(body):
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+class MetricsSnapshot:
+    """Serialized payloads and ETags for one immutable data snapshot"""
+
+    def __init__(self, data):
+        self.data = data
+        self._payloads = {}
+        self._lock = threading.Lock()
+
+    def payload(self, name, fmt='json'):
+        """(body, etag, media type) for a resource, serialized at most once"""
+        key = (name, fmt)
+        with self._lock:
+            if key not in self._payloads:
+                value = self.data[name]
+                if fmt == 'arrow':
+                    if not isinstance(value, pd.DataFrame):
+                        raise ValueError(f"{name} is not a table")
+                    body, media_type = _to_arrow(value), ARROW_MEDIA_TYPE
+                else:
+                    body, media_type = _to_json(value), 'application/json'
+                self._payloads[key] = (body, _etag(body), media_type)
+            return self._payloads[key]
+
+    def index(self):
+        return {name: self.payload(name)[1] for name in RESOURCES if self.data.get(name) is not None}
+
+
+def make_handler(snapshot):
+    """Request handler class bound to a snapshot"""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status, body=b'', media_type='application/json', etag=None):
+            self.send_response(status)
+            if etag:
+                self.send_header('ETag', etag)
+                self.send_header('Cache-Control', 'no-cache')
+            if status != 304:
+                self.send_header('Content-Type', media_type)
+                self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            if status != 304:
+                self.wfile.write(body)
+
+        def _error(self, status, message):
+            self._send(status, json.dumps({'error': message}).encode())
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            parts = [p for p in url.path.split('/') if p]
+
+            if parts == ['metrics']:
+                self._send(200, json.dumps(snapshot.index()).encode())
+                return
+            if len(parts) != 2 or parts[0] != 'metrics' or parts[1] not in RESOURCES:
+                self._error(404, f"unknown resource {url.path}")
+                return
+
+            name = parts[1]
+            if snapshot.data.get(name) is None:
+                self._error(404, f"{name} is not available in this snapshot")
+                return
+
+            fmt = parse_qs(url.query).get('format', [''])[0]
+            if not fmt:
+                fmt = 'arrow' if ARROW_MEDIA_TYPE in self.headers.get('Accept', '') else 'json'
+            try:
+                body, etag, media_type = snapshot.payload(name, fmt)
+            except ImportError:
+                self._error(406, "Arrow output requires pyarrow")
+                return
+            except ValueError as e:
+                self._error(406, str(e))
+                return
+
+            if etag in [t.strip() for t in self.headers.get('If-None-Match', '').split(',')]:
+                self._send(304, etag=etag)
+            else:
+                self._send(200, body, media_type, etag)
+
+    return MetricsHandler
+
+
+def serve_in_background(data, host='127.0.0.1', port=DEFAULT_PORT):
+    """Start the API on a daemon thread; returns the server (None if the port is taken)"""
+    try:
+        server = ThreadingHTTPServer((host, port), make_handler(MetricsSnapshot(data)))
+    except OSError:
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-api', daemon=True).start()
+    return server
+
+
+def main():
+    from data_store import freeze_data, load_data
+
+    parser = argparse.ArgumentParser(description="Serve dashboard metrics as JSON / Arrow")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(MetricsSnapshot(freeze_data(load_data()))))
+    print(f"Serving metrics on http://{args.host}:{args.port}/metrics")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
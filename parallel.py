@@ -0,0 +1,36 @@
+"""
+Bounded thread pool for preparing a section's data and figures
+
+A section with several charts used to build them one after another on the
+script thread. prepare() runs the independent builders (figures.py builders
+and read-only data preparation, never Streamlit calls) on one process-wide
+pool and joins them before the section renders, so the section takes about
+as long as its slowest chart. numpy, pandas and the sketch/surface lookups
+release the GIL for most of their work; Plotly figure construction is
+mostly Python, so those overlap less.
+
+The pool is shared by every viewer session, which bounds the extra threads
+per server process. Set DASHBOARD_PREP_WORKERS=1 to prepare sequentially.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
+
+WORKERS_ENV = 'DASHBOARD_PREP_WORKERS'
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+
+_workers = int(os.environ.get(WORKERS_ENV) or DEFAULT_WORKERS)
+_executor = ThreadPoolExecutor(max_workers=_workers, thread_name_prefix='section-prep') if _workers > 1 else None
+
+
+def prepare(tasks):
+    """Run independent zero-argument callables concurrently; returns {name: result} once all have finished
+
+    Tasks must not touch Streamlit or call prepare() themselves (a full pool
+    would wait on itself). The first task error is raised after all finish.
+    """
+    if _executor is None or len(tasks) < 2:
+        return {name: task() for name, task in tasks.items()}
+    futures = {name: _executor.submit(task) for name, task in tasks.items()}
+    wait(futures.values())
+    return {name: future.result() for name, future in futures.items()}
@@ -0,0 +1,368 @@
+"""
+Content-hash cached analysis pipeline
+Run: python pipeline.py [--set impact.cpm=25] [--force stats] [--workers 4]
+
+Data Generation -> ETL Processing -> Statistical Analysis -> Business
+Modeling -> Visualization, as stages with declared input and output files.
+A stage's cache key hashes its parameters, the source of its function and
+of every project module it imports (directly or through other project
+modules) and the contents of its input files; when the key matches the last
+run and the outputs are untouched, the stage is skipped. Because keys hash
+input *contents*, a stage that reruns but writes identical outputs does not
+invalidate anything downstream. Stages whose inputs are ready run in
+parallel in a process pool.
+"""
+
+import argparse
+import ast
+import hashlib
+import importlib.util
+import inspect
+import json
+import os
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pandas as pd
+
+# fresh: optional check of a stage's outputs beyond the cache key (fresh(outputs) -> bool)
+Stage = namedtuple('Stage', ['name', 'func', 'inputs', 'outputs', 'params', 'code', 'fresh'], defaults=[None])
+
+CACHE_PATH = '.pipeline_cache.json'
+
+USERS = 'data/generated/users.csv'
+EVENTS = 'data/generated/events_sample.csv'
+SESSIONS = 'data/processed/sessions.csv'
+SKETCHES = 'results/creator_sketches.npz'
+FUNNEL_OVERALL = 'results/funnel_metrics_overall.csv'
+FUNNEL_COHORT = 'results/funnel_metrics_by_cohort.csv'
+AB_RESULTS = 'results/ab_test_results.csv'
+AB_CONTRASTS = 'results/ab_contrasts.csv'
+BUSINESS_IMPACT = 'results/business_impact.json'
+SENSITIVITY = 'results/sensitivity_surface.npz'
+UPLIFT_MODEL = 'results/uplift_model.npz'
+UPLIFT_DECILES = 'results/uplift_deciles.csv'
+SNAPSHOT_LATEST = 'results/snapshots/LATEST'
+WARM_SNAPSHOT = 'results/warm_snapshot.bin'
+FIGURES = {'funnel': 'results/figures/funnel.json', 'ab_forest': 'results/figures/ab_forest.json'}
+
+DEFAULT_PARAMS = {
+    'generate': {'n_users': 20000, 'seed': 42, 'variants': ['control', 'treatment']},
+    'sessionize': {'gap_minutes': 30, 'chunksize': 1_000_000},
+    'sketches': {'precision': 12},
+    'stats': {},
+    'impact': {'adoption_rate': 0.6, 'monetization_rate': 0.35, 'cpm': 20, 'creator_share': 0.25},
+    'sensitivity': {},
+    'uplift': {'epochs': 10},
+    'snapshot': {},
+    'viz': {},
+    'warm': {},
+}
+
+
+# Stage functions: module level so they can run in worker processes
+
+def stage_generate(inputs, outputs, n_users, seed, variants):
+    from data_generation import generate_events, generate_users
+
+    users = generate_users(n_users, seed, variants)
+    generate_events(users, seed=seed).to_csv(outputs['events'], index=False)
+    users.to_csv(outputs['users'], index=False)
+
+
+def stage_sessionize(inputs, outputs, gap_minutes, chunksize):
+    from sessionization import build_session_table, iter_event_chunks
+
+    sessions = build_session_table(iter_event_chunks(inputs['events'], chunksize),
+                                   pd.read_csv(inputs['users']), gap=pd.Timedelta(minutes=gap_minutes))
+    sessions.to_csv(outputs['sessions'], index=False)
+
+
+def stage_sketches(inputs, outputs, precision):
+    from creator_sketches import build_creator_sketches
+
+    events = pd.read_csv(inputs['events'], parse_dates=['timestamp'])
+    build_creator_sketches(events, pd.read_csv(inputs['users']), precision).save(outputs['sketches'])
+
+
+def stage_stats(inputs, outputs):
+    from analysis_functions import funnel_step_counts, user_totals
+
+    sessions = pd.read_csv(inputs['sessions'])
+    write_stats(outputs, funnel_step_counts(sessions), funnel_step_counts(sessions, by='creator_cohort'),
+                user_totals(sessions, ['successful_post']))
+
+
+def write_stats(outputs, funnel_counts, cohort_counts, totals):
+    """Funnel and A/B result files from mergeable aggregates (shared with incremental.py)"""
+    from analysis_functions import compare_totals, funnel_conversion, wide_ab_results
+
+    funnel_conversion(funnel_counts).to_csv(outputs['funnel_overall'], index=False)
+    funnel_conversion(cohort_counts, by='creator_cohort').to_csv(outputs['funnel_cohort'], index=False)
+    contrasts = compare_totals(totals, pairwise=True)
+    contrasts.to_csv(outputs['ab_contrasts'], index=False)
+    main_contrast = (contrasts['variant'] == 'treatment') & (contrasts['baseline'] == 'control')
+    wide_ab_results(contrasts[main_contrast]).to_csv(outputs['ab_results'], index=False)
+
+
+def stage_impact(inputs, outputs, **assumptions):
+    from analysis_functions import absolute_lifts, calculate_business_impact
+
+    impact = calculate_business_impact(**assumptions, **absolute_lifts(pd.read_csv(inputs['ab_results'])))
+    impact = {period: {k: round(float(v), 1) for k, v in values.items()} for period, values in impact.items()}
+    with open(outputs['business_impact'], 'w') as f:
+        json.dump(impact, f, indent=2)
+
+
+def stage_sensitivity(inputs, outputs):
+    from analysis_functions import absolute_lifts
+    from sensitivity import build_sensitivity_surface
+
+    lifts = absolute_lifts(pd.read_csv(inputs['ab_results']))
+    build_sensitivity_surface(**lifts).save(outputs['sensitivity'])
+
+
+def stage_uplift(inputs, outputs, epochs):
+    from uplift import build_uplift
+
+    model, deciles = build_uplift(pd.read_csv(inputs['sessions']), epochs)
+    model.save(outputs['model'])
+    deciles.to_csv(outputs['deciles'], index=False)
+
+
+def stage_snapshot(inputs, outputs):
+    from snapshots import SnapshotStore, read_results
+
+    store = SnapshotStore(os.path.dirname(outputs['latest']))
+    version = store.commit(read_results(inputs), label='pipeline')
+    with open(outputs['latest'], 'w') as f:
+        f.write(f'{version}\n')
+
+
+def stage_viz(inputs, outputs):
+    from figures import section_figures
+
+    figures = section_figures({'ab_contrasts': pd.read_csv(inputs['ab_contrasts']),
+                               'funnel_overall': pd.read_csv(inputs['funnel_overall'])})
+    for name, fig in figures.items():
+        with open(outputs[name], 'w') as f:
+            f.write(fig.to_json())
+
+
+def stage_warm(inputs, outputs):
+    from warm_snapshot import build_warm_snapshot
+
+    build_warm_snapshot(outputs['snapshot'])
+
+
+def warm_fresh(outputs):
+    from warm_snapshot import snapshot_is_fresh
+
+    return snapshot_is_fresh(outputs['snapshot'])
+
+
+def default_stages(params=None):
+    """The dashboard's analysis pipeline, with parameter overrides applied"""
+    merged = {name: dict(values) for name, values in DEFAULT_PARAMS.items()}
+    for name, values in (params or {}).items():
+        merged[name].update(values)
+
+    return [
+        Stage('generate', stage_generate, {}, {'users': USERS, 'events': EVENTS},
+              merged['generate'], ['data_generation']),
+        Stage('sessionize', stage_sessionize, {'users': USERS, 'events': EVENTS}, {'sessions': SESSIONS},
+              merged['sessionize'], ['sessionization']),
+        Stage('sketches', stage_sketches, {'users': USERS, 'events': EVENTS}, {'sketches': SKETCHES},
+              merged['sketches'], ['creator_sketches', 'hashing']),
+        Stage('stats', stage_stats, {'sessions': SESSIONS},
+              {'funnel_overall': FUNNEL_OVERALL, 'funnel_cohort': FUNNEL_COHORT, 'ab_results': AB_RESULTS,
+               'ab_contrasts': AB_CONTRASTS},
+              merged['stats'], ['analysis_functions']),
+        Stage('impact', stage_impact, {'ab_results': AB_RESULTS}, {'business_impact': BUSINESS_IMPACT},
+              merged['impact'], ['analysis_functions']),
+        Stage('sensitivity', stage_sensitivity, {'ab_results': AB_RESULTS}, {'sensitivity': SENSITIVITY},
+              merged['sensitivity'], ['analysis_functions', 'sensitivity']),
+        Stage('uplift', stage_uplift, {'sessions': SESSIONS}, {'model': UPLIFT_MODEL, 'deciles': UPLIFT_DECILES},
+              merged['uplift'], ['uplift']),
+        Stage('snapshot', stage_snapshot,
+              {'ab_results': AB_RESULTS, 'funnel_overall': FUNNEL_OVERALL, 'funnel_cohort': FUNNEL_COHORT,
+               'business_impact': BUSINESS_IMPACT},
+              {'latest': SNAPSHOT_LATEST}, merged['snapshot'], ['snapshots']),
+        Stage('viz', stage_viz, {'ab_contrasts': AB_CONTRASTS, 'funnel_overall': FUNNEL_OVERALL}, FIGURES,
+              merged['viz'], ['figures']),
+        # Everything the dashboard loads at startup, for a cold start without recomputation
+        Stage('warm', stage_warm,
+              {'users': USERS, 'events': EVENTS, 'sketches': SKETCHES, 'ab_results': AB_RESULTS,
+               'ab_contrasts': AB_CONTRASTS, 'funnel_overall': FUNNEL_OVERALL, 'funnel_cohort': FUNNEL_COHORT,
+               'business_impact': BUSINESS_IMPACT, 'sensitivity': SENSITIVITY, 'deciles': UPLIFT_DECILES},
+              {'snapshot': WARM_SNAPSHOT}, merged['warm'], ['warm_snapshot', 'data_store'],
+              # The rule the app applies at startup, so the stage reruns whenever the app would reject the file
+              warm_fresh),
+    ]
+
+
+def _run_stage(stage):
+    for path in stage.outputs.values():
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    stage.func(stage.inputs, stage.outputs, **stage.params)
+
+
+class ContentHasher:
+    """SHA-256 of files, memoized on (size, mtime) so unchanged large files are not re-read"""
+
+    def __init__(self, memo=None):
+        self.memo = memo if memo is not None else {}
+
+    def __call__(self, path):
+        stat = os.stat(path)
+        signature = [stat.st_size, stat.st_mtime_ns]
+        cached = self.memo.get(path)
+        if cached and cached['signature'] == signature:
+            return cached['sha256']
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        self.memo[path] = {'signature': signature, 'sha256': digest.hexdigest()}
+        return digest.hexdigest()
+
+
+def _imported_names(source):
+    names = set()
+    for node in ast.walk(ast.parse(source)):
+        if isinstance(node, ast.Import):
+            names.update(alias.name.split('.')[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            names.add(node.module.split('.')[0])
+    return names
+
+
+def project_modules(names):
+    """Source paths of the named project modules and every project module they import, transitively
+
+    Project modules are the ones next to this file; third-party imports are
+    not followed.
+    """
+    root = os.path.dirname(os.path.abspath(__file__))
+    paths, pending = {}, set(names)
+    while pending:
+        name = pending.pop()
+        spec = importlib.util.find_spec(name) if name not in paths else None
+        if spec is None or not spec.has_location or os.path.dirname(os.path.abspath(spec.origin)) != root:
+            continue
+        paths[name] = spec.origin
+        with open(spec.origin) as f:
+            pending |= _imported_names(f.read()) - paths.keys()
+    return dict(sorted(paths.items()))
+
+
+def stage_key(stage, hasher):
+    """Cache key from parameters, stage and module source and input contents
+
+    Modules are the stage's declared code plus whatever its function
+    imports, followed through project imports, so editing a module a stage
+    only uses indirectly still invalidates it.
+    """
+    source = inspect.getsource(stage.func)
+    digest = hashlib.sha256()
+    digest.update(json.dumps([stage.name, stage.params], sort_keys=True, default=str).encode())
+    digest.update(source.encode())
+    for path in project_modules(set(stage.code) | _imported_names(source)).values():
+        digest.update(hasher(path).encode())
+    for role, path in sorted(stage.inputs.items()):
+        digest.update(f'{role}={hasher(path)}'.encode())
+    return digest.hexdigest()
+
+
+def _up_to_date(stage, key, manifest, hasher):
+    record = manifest['stages'].get(stage.name)
+    if not record or record['key'] != key:
+        return False
+    if stage.fresh is not None and not stage.fresh(stage.outputs):
+        return False
+    return all(os.path.exists(path) and hasher(path) == record['outputs'].get(path)
+               for path in stage.outputs.values())
+
+
+def run_pipeline(stages, force=(), max_workers=None, cache_path=CACHE_PATH, log=print):
+    """Run stages in dependency order, skipping cached ones; returns {stage: 'cached' | 'ran'}"""
+    producers = {path: s.name for s in stages for path in s.outputs.values()}
+    deps = {s.name: {producers[p] for p in s.inputs.values() if p in producers} for s in stages}
+    by_name = {s.name: s for s in stages}
+
+    manifest = {'stages': {}, 'files': {}}
+    if os.path.exists(cache_path):
+        with open(cache_path) as f:
+            manifest = json.load(f)
+    hasher = ContentHasher(manifest['files'])
+
+    def save_manifest():
+        tmp = cache_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(tmp, cache_path)
+
+    status, keys, running = {}, {}, {}
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        while len(status) < len(stages):
+            # Schedule every stage whose upstream stages are finished
+            for name, stage in by_name.items():
+                if name in status or name in running.values() or not deps[name] <= status.keys():
+                    continue
+                keys[name] = stage_key(stage, hasher)
+                if name not in force and _up_to_date(stage, keys[name], manifest, hasher):
+                    status[name] = 'cached'
+                    log(f"[cached] {name}")
+                else:
+                    log(f"[run]    {name}")
+                    running[pool.submit(_run_stage, stage)] = name
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                future.result()
+                stage = by_name[name]
+                manifest['stages'][name] = {
+                    'key': keys[name],
+                    'outputs': {path: hasher(path) for path in stage.outputs.values()},
+                }
+                status[name] = 'ran'
+                save_manifest()
+                log(f"[done]   {name}")
+
+    save_manifest()
+    return status
+
+
+def _parse_overrides(pairs):
+    params = {}
+    for pair in pairs:
+        target, value = pair.split('=', 1)
+        stage, key = target.split('.', 1)
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError:
+            pass
+        params.setdefault(stage, {})[key] = value
+    return params
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the cached analysis pipeline")
+    parser.add_argument('--set', action='append', default=[], metavar='STAGE.PARAM=VALUE',
+                        help="Override a stage parameter, e.g. impact.cpm=25")
+    parser.add_argument('--force', action='append', default=[], metavar='STAGE',
+                        help="Rerun a stage even if its cache key matches")
+    parser.add_argument('--workers', type=int, default=None, help="Parallel stage workers")
+    args = parser.parse_args()
+
+    status = run_pipeline(default_stages(_parse_overrides(args.set)), set(args.force), args.workers)
+    ran = [name for name, s in status.items() if s == 'ran']
+    print(f"{len(ran)} stage(s) ran, {len(status) - len(ran)} cached")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Sparse cohort retention by variant
+Run: python retention.py data/generated/events_sample.csv data/generated/users.csv
+
+Activity is a sparse user x day indicator matrix A, and cohort membership a
+sparse one-hot matrix C (user x (variant, first-active day)). The retention
+counts are then the small dense product C.T @ A: row (variant, cohort),
+column day. Only nonzeros are ever stored, so a user-by-day table is never
+materialized.
+
+Days can be added incrementally: a new day contributes one sparse column,
+and only that column of C.T @ A is computed. A late day (earlier than one
+already added) can move users to an earlier cohort, so it triggers a full
+recompute from the stored activity.
+"""
+
+import sys
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+VARIANTS = ['control', 'treatment']
+RETENTION_DAYS = [1, 7, 30]
+
+
+class CohortRetention:
+    """Incrementally updated cohort x day activity counts per variant"""
+
+    def __init__(self, start, variants=VARIANTS):
+        self.start = pd.Timestamp(start).normalize()
+        self.variants = list(variants)
+        self.user_index = pd.Index([], dtype=np.int64)
+        self.user_variant = np.empty(0, dtype=np.int8)
+        self.user_cohort = np.empty(0, dtype=np.int32)
+        self.days = {}  # day offset -> sorted row indices of users active that day
+        self.counts = np.zeros((len(self.variants), 0, 0), dtype=np.int64)
+
+    @property
+    def n_days(self):
+        return self.counts.shape[2]
+
+    def activity(self):
+        """Sparse (users x days) activity indicator matrix"""
+        cols = [np.full(len(rows), day, dtype=np.int32) for day, rows in self.days.items()]
+        rows = [rows for rows in self.days.values()]
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+        cols = np.concatenate(cols) if cols else np.empty(0, dtype=np.int32)
+        return sparse.csc_matrix((np.ones(len(rows), dtype=np.int32), (rows, cols)),
+                                 shape=(len(self.user_index), self.n_days))
+
+    def _membership(self):
+        """Sparse one-hot (users x variant*n_days + cohort) matrix"""
+        n = len(self.user_index)
+        cols = self.user_variant.astype(np.int64) * self.n_days + self.user_cohort
+        return sparse.csr_matrix((np.ones(n, dtype=np.int32), (np.arange(n), cols)),
+                                 shape=(n, len(self.variants) * self.n_days))
+
+    def _grow(self, n_days):
+        if n_days > self.n_days:
+            grown = np.zeros((len(self.variants), n_days, n_days), dtype=np.int64)
+            grown[:, :self.n_days, :self.n_days] = self.counts
+            self.counts = grown
+
+    def add_day(self, day, user_ids, variants):
+        """Record the users active on one day (offset from start)
+
+        Users without a known variant (e.g. missing from the user table) are
+        left out; validation.check_unknown_users reports them.
+        """
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        user_ids, first = np.unique(user_ids, return_index=True)
+        variant_codes = pd.Categorical(np.asarray(variants)[first], categories=self.variants).codes
+        known = variant_codes >= 0
+        user_ids, variant_codes = user_ids[known], variant_codes[known]
+
+        rows = self.user_index.get_indexer(user_ids)
+        new = rows < 0
+        if new.any():
+            rows[new] = np.arange(len(self.user_index), len(self.user_index) + new.sum())
+            self.user_index = self.user_index.append(pd.Index(user_ids[new]))
+            self.user_variant = np.r_[self.user_variant, variant_codes[new].astype(np.int8)]
+            self.user_cohort = np.r_[self.user_cohort, np.full(new.sum(), day, dtype=np.int32)]
+
+        late = day < self.n_days - 1 or (self.user_cohort[rows] > day).any()
+        previous = self.days.get(day, np.empty(0, dtype=np.int64))
+        self.days[day] = np.union1d(previous, rows)
+        self.user_cohort[rows] = np.minimum(self.user_cohort[rows], day)
+        self._grow(day + 1)
+
+        if late:
+            self._recompute()
+        else:
+            column = np.zeros(len(self.user_index), dtype=np.int32)
+            column[self.days[day]] = 1
+            self.counts[:, :, day] = (self._membership().T @ column).reshape(len(self.variants), self.n_days)
+
+    def _recompute(self):
+        product = (self._membership().T @ self.activity()).toarray()
+        self.counts = product.reshape(len(self.variants), self.n_days, self.n_days).astype(np.int64)
+
+    def update(self, events, users):
+        """Add every day present in an event chunk (user_id, timestamp) joined to user variants"""
+        variant = users.set_index('user_id')['variant']
+        day = ((events['timestamp'] - self.start) // pd.Timedelta(days=1)).to_numpy()
+        user_ids = events['user_id'].to_numpy()
+        variants = variant.reindex(user_ids).to_numpy()
+        for d in np.unique(day[day >= 0]):
+            mask = day == d
+            self.add_day(int(d), user_ids[mask], variants[mask])
+        return self
+
+    def cohort_sizes(self):
+        """(variants x cohorts) number of users first active on each day"""
+        return self.counts[:, np.arange(self.n_days), np.arange(self.n_days)]
+
+    def curves(self, max_age=30):
+        """Long table of retention by variant, cohort and days since first activity"""
+        ages = np.arange(min(max_age, self.n_days - 1) + 1)
+        cohorts = np.arange(self.n_days)
+        target = cohorts[:, None] + ages[None, :]
+        observed = target < self.n_days
+        sizes = self.cohort_sizes()
+
+        frames = []
+        for v, name in enumerate(self.variants):
+            active = np.where(observed, self.counts[v, cohorts[:, None], np.minimum(target, self.n_days - 1)], 0)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                rate = np.where(observed & (sizes[v][:, None] > 0), active / sizes[v][:, None], np.nan)
+            frames.append(pd.DataFrame({
+                'variant': name,
+                'cohort': np.repeat(self.start + pd.to_timedelta(cohorts, unit='D'), len(ages)),
+                'cohort_size': np.repeat(sizes[v], len(ages)),
+                'day': np.tile(ages, len(cohorts)),
+                'retention': rate.ravel(),
+            }))
+        return pd.concat(frames, ignore_index=True)
+
+    def summary(self, days=RETENTION_DAYS):
+        """Day-N retention per variant, pooled over cohorts old enough to observe day N"""
+        sizes = self.cohort_sizes()
+        rows = []
+        for v, name in enumerate(self.variants):
+            row = {'variant': name}
+            for n in days:
+                cohorts = np.arange(max(self.n_days - n, 0))
+                eligible = sizes[v][cohorts].sum()
+                active = self.counts[v, cohorts, cohorts + n].sum()
+                row[f'd{n}_retention'] = active / eligible if eligible else np.nan
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+
+def build_retention(events, users, start=None):
+    """Cohort retention from an in-memory event table, fed day by day"""
+    start = events['timestamp'].min() if start is None else start
+    retention = CohortRetention(start, sorted(users['variant'].astype(str).unique()))
+    return retention.update(events[['user_id', 'timestamp']], users)
+
+
+if __name__ == "__main__":
+    events = pd.read_csv(sys.argv[1], usecols=['user_id', 'timestamp'], parse_dates=['timestamp'])
+    users = pd.read_csv(sys.argv[2])
+    retention = build_retention(events, users)
+    print(retention.summary().to_string(index=False))
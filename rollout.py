@@ -0,0 +1,156 @@
+"""
+Deterministic salted-hash bucketing for experiments and phased rollout
+Run: python rollout.py data/generated/users.csv --phase 2 --out exposed_phase2.csv
+
+Every user id hashes (SplitMix64, see hashing.py) to one of N_BUCKETS
+buckets under a per-purpose salt. Assignment is a pure function of
+(id, salt), so any phase's exposure set can be reproduced offline from the
+user table alone, in vectorized batches. Different salts give independent
+assignments, so rollout exposure is not correlated with the A/B split.
+
+Phases are cumulative: a phase exposes the users its rule selects plus
+everyone exposed in earlier phases, so nobody loses the feature mid-rollout.
+Because a rule exposes buckets below a threshold, raising the percentage
+only ever adds users.
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from analysis_functions import srm_chi_square
+from hashing import hash_ids
+
+N_BUCKETS = 10_000  # 0.01% granularity
+EXPERIMENT_SALT = 'quick_edit_ab'
+ROLLOUT_SALT = 'quick_edit_rollout'
+SRM_ALPHA = 0.001
+BATCH_SIZE = 10_000_000
+
+# Mirrors the Phased Launch Strategy timeline
+ROLLOUT_PHASES = [
+    {'phase': 'Phase 1', 'description': '10% rollout to iPhone casual creators', 'percent': 10,
+     'device_type': ['iPhone'], 'creator_cohort': ['casual_creator']},
+    {'phase': 'Phase 2', 'description': '50% rollout to iPhone users', 'percent': 50,
+     'device_type': ['iPhone'], 'creator_cohort': None},
+    {'phase': 'Phase 3', 'description': '100% rollout to casual creators', 'percent': 100,
+     'device_type': None, 'creator_cohort': ['casual_creator']},
+    {'phase': 'Phase 4', 'description': 'Expand to Android (all users)', 'percent': 100,
+     'device_type': None, 'creator_cohort': None},
+]
+
+
+def assign_buckets(ids, salt, n_buckets=N_BUCKETS, batch_size=BATCH_SIZE, out=None):
+    """Bucket in [0, n_buckets) for every id, hashed in batches of `batch_size`"""
+    ids = np.asarray(ids)
+    if out is None:
+        out = np.empty(len(ids), dtype=np.uint32)
+    for start in range(0, len(ids), batch_size):
+        block = ids[start:start + batch_size]
+        out[start:start + len(block)] = hash_ids(block, salt) % np.uint64(n_buckets)
+    return out
+
+
+def assign_variants(ids, variants=('control', 'treatment'), weights=None, salt=EXPERIMENT_SALT,
+                    n_buckets=N_BUCKETS):
+    """Experiment arm per id, splitting the bucket range by weight"""
+    weights = np.full(len(variants), 1 / len(variants)) if weights is None else np.asarray(weights, dtype=float)
+    edges = np.round(np.cumsum(weights / weights.sum()) * n_buckets).astype(np.int64)
+    codes = np.searchsorted(edges, assign_buckets(ids, salt, n_buckets), side='right')
+    return np.asarray(variants)[codes]
+
+
+def _rule_mask(users, rule, buckets, n_buckets):
+    mask = buckets < rule['percent'] * n_buckets // 100
+    for column in ('device_type', 'creator_cohort'):
+        if rule.get(column) is not None:
+            mask &= users[column].isin(rule[column]).to_numpy()
+    return mask
+
+
+def phase_exposure(users, phase, phases=ROLLOUT_PHASES, salt=ROLLOUT_SALT, n_buckets=N_BUCKETS):
+    """Boolean exposure mask for `users` at a phase (index into `phases`, cumulative)"""
+    buckets = assign_buckets(users['user_id'].to_numpy(), salt, n_buckets)
+    exposed = np.zeros(len(users), dtype=bool)
+    for rule in phases[:phase + 1]:
+        exposed |= _rule_mask(users, rule, buckets, n_buckets)
+    return exposed
+
+
+def iter_exposure_set(user_chunks, phase, phases=ROLLOUT_PHASES, salt=ROLLOUT_SALT):
+    """Yield the exposed user ids chunk by chunk (e.g. from pd.read_csv(..., chunksize=...))"""
+    for chunk in user_chunks:
+        yield chunk['user_id'].to_numpy()[phase_exposure(chunk, phase, phases, salt)]
+
+
+def bucket_uniformity(buckets, n_buckets=N_BUCKETS, groups=100):
+    """Chi-square p-value that buckets are uniform, over `groups` equal bucket ranges"""
+    counts = np.bincount(buckets.astype(np.int64) * groups // n_buckets, minlength=groups)
+    return float(srm_chi_square(counts, np.ones(groups))[1][0])
+
+
+def rollout_report(users, phases=ROLLOUT_PHASES, salt=ROLLOUT_SALT, n_buckets=N_BUCKETS, alpha=SRM_ALPHA):
+    """Per-phase exposure with a sample-ratio check of each rule against its target percentage
+
+    All phase rules are tested in one batched chi-square: each row compares the
+    exposed / not exposed counts among the rule's eligible users with the
+    expected percent / (100 - percent) split.
+    """
+    buckets = assign_buckets(users['user_id'].to_numpy(), salt, n_buckets)
+    eligible, selected, cumulative = [], [], []
+    exposed = np.zeros(len(users), dtype=bool)
+    for rule in phases:
+        everyone = dict(rule, percent=100)
+        in_segment = _rule_mask(users, everyone, buckets, n_buckets)
+        chosen = _rule_mask(users, rule, buckets, n_buckets)
+        exposed |= chosen
+        eligible.append(in_segment.sum())
+        selected.append(chosen.sum())
+        cumulative.append(exposed.sum())
+
+    eligible, selected = np.array(eligible), np.array(selected)
+    expected = np.array([rule['percent'] for rule in phases]) / 100
+    observed = np.column_stack([selected, eligible - selected])
+    # A 0% or 100% rule is exact by construction; only partial rules can mismatch
+    partial = (expected > 0) & (expected < 1)
+    p_value = np.ones(len(phases))
+    if partial.any():
+        shares = np.column_stack([expected, 1 - expected])
+        p_value[partial] = srm_chi_square(observed[partial], shares[partial])[1]
+
+    report = pd.DataFrame({
+        'phase': [rule['phase'] for rule in phases],
+        'description': [rule['description'] for rule in phases],
+        'eligible_users': eligible,
+        'target_share': expected,
+        'observed_share': np.divide(selected, eligible, out=np.zeros(len(phases)), where=eligible > 0),
+        'exposed_users': np.array(cumulative),
+        'srm_p_value': p_value,
+    })
+    report['balanced'] = report['srm_p_value'] >= alpha
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reproduce a rollout phase's exposure set from a user table")
+    parser.add_argument('users_csv')
+    parser.add_argument('--phase', type=int, required=True, help="1-based phase number")
+    parser.add_argument('--out', help="Write exposed user ids here (default: print the count)")
+    parser.add_argument('--chunksize', type=int, default=5_000_000)
+    args = parser.parse_args()
+    if not 1 <= args.phase <= len(ROLLOUT_PHASES):
+        parser.error(f"--phase must be between 1 and {len(ROLLOUT_PHASES)}")
+
+    chunks = pd.read_csv(args.users_csv, usecols=['user_id', 'device_type', 'creator_cohort'],
+                         chunksize=args.chunksize)
+    total = 0
+    for i, ids in enumerate(iter_exposure_set(chunks, args.phase - 1)):
+        total += len(ids)
+        if args.out:
+            pd.DataFrame({'user_id': ids}).to_csv(args.out, mode='w' if i == 0 else 'a', header=i == 0, index=False)
+    print(f"{ROLLOUT_PHASES[args.phase - 1]['phase']}: {total:,} exposed users")
+
+
+if __name__ == "__main__":
+    main()
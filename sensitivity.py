@@ -0,0 +1,138 @@
+"""
+Precomputed business-impact sensitivity surface
+Run: python sensitivity.py  (writes results/sensitivity_surface.npz)
+
+Monthly revenue and additional reels are evaluated once, offline, over a
+grid of adoption x monetization x CPM x creator share. The dashboard then
+answers any slider combination, tornado bar or heatmap cell by multilinear
+interpolation into that tensor instead of re-running the model.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+from scipy.interpolate import RegularGridInterpolator
+
+from analysis_functions import calculate_business_impact
+
+SURFACE_PATH = 'results/sensitivity_surface.npz'
+
+PARAMETERS = ['adoption_rate', 'monetization_rate', 'cpm', 'creator_share']
+PARAMETER_LABELS = {
+    'adoption_rate': 'Feature Adoption',
+    'monetization_rate': 'Reels Monetized',
+    'cpm': 'Avg CPM ($)',
+    'creator_share': 'Creator Share of DAU',
+}
+DEFAULT_GRID = {
+    'adoption_rate': np.linspace(0.0, 1.0, 11),
+    'monetization_rate': np.linspace(0.0, 1.0, 11),
+    'cpm': np.arange(5.0, 55.0, 5.0),
+    'creator_share': np.linspace(0.10, 0.40, 7),
+}
+OUTPUTS = ['monthly_revenue', 'monthly_reels']
+
+# Low / high values used for the tornado chart
+DEFAULT_RANGES = {
+    'adoption_rate': (0.5, 0.7),
+    'monetization_rate': (0.30, 0.40),
+    'cpm': (15.0, 50.0),
+    'creator_share': (0.20, 0.30),
+}
+
+
+class SensitivitySurface:
+    """Gridded model outputs with multilinear interpolation"""
+
+    def __init__(self, axes, values):
+        self.axes = axes
+        self.values = values
+        self._interpolators = {
+            name: RegularGridInterpolator([axes[p] for p in PARAMETERS], values[name])
+            for name in OUTPUTS
+        }
+
+    def _points(self, **assumptions):
+        columns = [np.clip(np.asarray(assumptions[p], dtype=float), self.axes[p][0], self.axes[p][-1])
+                   for p in PARAMETERS]
+        return np.stack(np.broadcast_arrays(*columns), axis=-1)
+
+    def interpolate(self, **assumptions):
+        """Interpolated outputs for scalar or array-valued assumptions"""
+        points = self._points(**assumptions)
+        return {name: self._interpolators[name](points).reshape(points.shape[:-1]) for name in OUTPUTS}
+
+    def business_impact(self, **assumptions):
+        """Monthly impact at one assumption point, in the business_impact dict layout"""
+        values = self.interpolate(**assumptions)
+        return {
+            'monthly': {
+                'additional_revenue': float(values['monthly_revenue']),
+                'additional_reels': float(values['monthly_reels'])
+            }
+        }
+
+    def tornado(self, base, ranges=DEFAULT_RANGES, output='monthly_revenue'):
+        """Output at each parameter's low and high value, others held at base"""
+        params = list(ranges)
+        points = {p: np.full(2 * len(params), base[p], dtype=float) for p in PARAMETERS}
+        for i, p in enumerate(params):
+            points[p][2 * i:2 * i + 2] = ranges[p]
+        values = self.interpolate(**points)[output].reshape(-1, 2)
+        baseline = float(self.interpolate(**base)[output])
+
+        frame = pd.DataFrame({
+            'parameter': [PARAMETER_LABELS[p] for p in params],
+            'low': [ranges[p][0] for p in params],
+            'high': [ranges[p][1] for p in params],
+            'output_low': values[:, 0],
+            'output_high': values[:, 1],
+        })
+        frame['swing'] = (frame['output_high'] - frame['output_low']).abs()
+        return frame.sort_values('swing').reset_index(drop=True), baseline
+
+    def heatmap(self, x, y, base, output='monthly_revenue', resolution=41):
+        """Output over a dense x-by-y mesh, other parameters held at base"""
+        xs = np.linspace(self.axes[x][0], self.axes[x][-1], resolution)
+        ys = np.linspace(self.axes[y][0], self.axes[y][-1], resolution)
+        mesh_x, mesh_y = np.meshgrid(xs, ys)
+        points = {p: base[p] for p in PARAMETERS}
+        points[x], points[y] = mesh_x, mesh_y
+        return xs, ys, self.interpolate(**points)[output]
+
+    def save(self, path=SURFACE_PATH):
+        np.savez(path, **{f'axis_{p}': self.axes[p] for p in PARAMETERS}, **self.values)
+
+    @classmethod
+    def load(cls, path=SURFACE_PATH):
+        with np.load(path) as f:
+            return cls({p: f[f'axis_{p}'] for p in PARAMETERS}, {name: f[name] for name in OUTPUTS})
+
+
+def build_sensitivity_surface(grid=DEFAULT_GRID, **model_kwargs):
+    """Evaluate the business model over the full assumption grid
+
+    Extra keyword arguments (e.g. measured lifts) are passed to the model.
+    """
+    mesh = np.meshgrid(*[grid[p] for p in PARAMETERS], indexing='ij')
+    impact = calculate_business_impact(**dict(zip(PARAMETERS, mesh)), **model_kwargs)
+    values = {
+        'monthly_revenue': impact['monthly']['additional_revenue'],
+        'monthly_reels': impact['monthly']['additional_reels'],
+    }
+    return SensitivitySurface({p: np.asarray(grid[p], dtype=float) for p in PARAMETERS}, values)
+
+
+def load_sensitivity_surface(path=SURFACE_PATH):
+    """Load the precomputed surface, building it if it has not been written yet"""
+    if os.path.exists(path):
+        return SensitivitySurface.load(path)
+    return build_sensitivity_surface()
+
+
+if __name__ == "__main__":
+    os.makedirs(os.path.dirname(SURFACE_PATH), exist_ok=True)
+    surface = build_sensitivity_surface()
+    surface.save()
+    print(f"Wrote {surface.values['monthly_revenue'].size:,}-point sensitivity surface to {SURFACE_PATH}")
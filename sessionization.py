@@ -0,0 +1,221 @@
+"""
+Vectorized sessionization of raw creation-flow events
+Run: python sessionization.py data/generated/events_sample.csv data/generated/users.csv data/processed/sessions.csv
+
+Events are split into sessions per user wherever the gap between two
+consecutive events exceeds SESSION_GAP. Input is consumed chunk by chunk:
+chunks are expected in timestamp order (as an append-only event log is),
+while rows inside a chunk may be in any order. A small per-user carry state
+(last timestamp, open session id) lets sessions span chunk boundaries, and
+users idle for longer than the gap are dropped from it, so state stays
+bounded by the number of recently active users.
+"""
+
+import sys
+
+import numpy as np
+import pandas as pd
+
+from data_generation import FUNNEL_STEPS
+
+SESSION_GAP = pd.Timedelta(minutes=30)
+
+# Bit k of steps_mask is set when the session fired FUNNEL_STEPS[k]
+STEP_BITS = {step: np.uint8(1 << k) for k, step in enumerate(FUNNEL_STEPS)}
+
+SESSION_COLUMNS = ['session_id', 'user_id', 'session_start', 'session_end', 'n_events', 'steps_mask']
+SESSION_DTYPES = {'session_id': np.int64, 'user_id': np.int64, 'session_start': 'datetime64[ns]',
+                  'session_end': 'datetime64[ns]', 'n_events': np.int64, 'steps_mask': np.uint8}
+
+
+def _or_reduce_masks(session_ids, masks):
+    """Bitwise OR of uint8 masks per session id, without a Python loop"""
+    bits = np.unpackbits(masks.astype(np.uint8)[:, None], axis=1)
+    merged = pd.DataFrame(bits).groupby(session_ids, sort=True).max()
+    return np.packbits(merged.to_numpy().astype(np.uint8), axis=1).ravel()
+
+
+def summarize_sessions(events):
+    """Aggregate events carrying a session_id into one row per session"""
+    bits = events['event_name'].map(STEP_BITS).fillna(0).astype(np.uint8).to_numpy()
+    grouped = events.groupby('session_id', sort=True)
+    summary = grouped.agg(
+        user_id=('user_id', 'first'),
+        session_start=('timestamp', 'min'),
+        session_end=('timestamp', 'max'),
+        n_events=('timestamp', 'size'),
+    )
+    summary['steps_mask'] = _or_reduce_masks(events['session_id'].to_numpy(), bits)
+    return summary.reset_index()[SESSION_COLUMNS]
+
+
+def merge_session_partials(partials):
+    """Combine partial session aggregates that share a session_id"""
+    partials = pd.concat(partials, ignore_index=True)
+    grouped = partials.groupby('session_id', sort=True)
+    merged = grouped.agg(
+        user_id=('user_id', 'first'),
+        session_start=('session_start', 'min'),
+        session_end=('session_end', 'max'),
+        n_events=('n_events', 'sum'),
+    )
+    merged['steps_mask'] = _or_reduce_masks(partials['session_id'].to_numpy(), partials['steps_mask'].to_numpy())
+    return merged.reset_index()[SESSION_COLUMNS]
+
+
+class Sessionizer:
+    """Assigns session ids chunk by chunk, carrying open sessions across chunks"""
+
+    def __init__(self, gap=SESSION_GAP):
+        self.gap = np.int64(pd.Timedelta(gap).value)
+        self.next_id = 0
+        # Carry state, sorted by user: last event time and open session id
+        self.state_users = np.empty(0, dtype=np.int64)
+        self.state_ts = np.empty(0, dtype=np.int64)
+        self.state_sid = np.empty(0, dtype=np.int64)
+        self.pending = pd.DataFrame(columns=SESSION_COLUMNS)
+
+    def assign(self, chunk):
+        """Return the chunk sorted by (user, time) with a session_id column"""
+        users = chunk['user_id'].to_numpy(dtype=np.int64)
+        ts = chunk['timestamp'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+        order = np.lexsort((ts, users))
+        users, ts = users[order], ts[order]
+        n = len(users)
+        if n == 0:
+            return chunk.iloc[order].assign(session_id=np.empty(0, dtype=np.int64))
+
+        # A new session starts at each user's first row and after every long gap
+        user_start = np.r_[True, users[1:] != users[:-1]]
+        starts = np.flatnonzero(user_start)
+        lengths = np.diff(np.r_[starts, n])
+        new = user_start | (np.r_[0, np.diff(ts)] > self.gap)
+
+        # First row of a user may instead continue the session open from earlier chunks
+        pos, known, carried_ts, carried_sid = self._lookup(users[starts])
+        continues = known & (ts[starts] - carried_ts <= self.gap)
+        new[starts[continues]] = False
+
+        # Rows before a user's first new session in this chunk keep the carried id
+        running = np.cumsum(new)
+        before_user = np.repeat(running[starts] - new[starts], lengths)
+        sid = np.where(running - before_user == 0, np.repeat(carried_sid, lengths), self.next_id + running - 1)
+        self.next_id += int(running[-1])
+
+        self._update_state(users, ts, sid, starts, lengths, known, pos)
+
+        out = chunk.iloc[order].reset_index(drop=True)
+        out['session_id'] = sid
+        return out
+
+    def _lookup(self, users):
+        """Carry-state position, presence, last timestamp and open session id per user"""
+        if len(self.state_users) == 0:
+            none = np.zeros(len(users), dtype=np.int64)
+            return none, none.astype(bool), none, none - 1
+        pos = np.minimum(np.searchsorted(self.state_users, users), len(self.state_users) - 1)
+        known = self.state_users[pos] == users
+        return pos, known, self.state_ts[pos], np.where(known, self.state_sid[pos], -1)
+
+    def _update_state(self, users, ts, sid, starts, lengths, known, pos):
+        ends = starts + lengths - 1
+        keep = np.ones(len(self.state_users), dtype=bool)
+        keep[pos[known]] = False
+
+        all_users = np.r_[self.state_users[keep], users[ends]]
+        all_ts = np.r_[self.state_ts[keep], ts[ends]]
+        all_sid = np.r_[self.state_sid[keep], sid[ends]]
+
+        # Users idle for longer than the gap can never extend their session again
+        active = all_ts >= ts.max() - self.gap
+        order = np.argsort(all_users[active], kind='stable')
+        self.state_users = all_users[active][order]
+        self.state_ts = all_ts[active][order]
+        self.state_sid = all_sid[active][order]
+
+    def process(self, chunk):
+        """Sessionize a chunk and return the sessions that are now closed"""
+        events = self.assign(chunk)
+        partial = summarize_sessions(events) if len(events) else events.iloc[:0]
+        sessions = merge_session_partials([self.pending, partial]) if len(self.pending) else partial
+
+        is_open = np.isin(sessions['session_id'].to_numpy(), self.state_sid)
+        self.pending = sessions[is_open].reset_index(drop=True)
+        return sessions[~is_open].reset_index(drop=True)
+
+    def state(self):
+        """Carry state as plain arrays, so a later process can resume the stream (see from_state)"""
+        pending = self.pending.astype(SESSION_DTYPES)
+        return {'gap': self.gap, 'next_id': np.int64(self.next_id), 'users': self.state_users,
+                'ts': self.state_ts, 'sid': self.state_sid,
+                **{f'pending_{c}': pending[c].to_numpy() for c in SESSION_COLUMNS}}
+
+    @classmethod
+    def from_state(cls, state):
+        sessionizer = cls(pd.Timedelta(int(state['gap'])))
+        sessionizer.next_id = int(state['next_id'])
+        sessionizer.state_users = np.asarray(state['users'], dtype=np.int64)
+        sessionizer.state_ts = np.asarray(state['ts'], dtype=np.int64)
+        sessionizer.state_sid = np.asarray(state['sid'], dtype=np.int64)
+        sessionizer.pending = pd.DataFrame({c: state[f'pending_{c}'] for c in SESSION_COLUMNS})
+        return sessionizer
+
+    def flush(self):
+        """Return every session still open and reset the carry state"""
+        remaining = self.pending
+        self.pending = pd.DataFrame(columns=SESSION_COLUMNS)
+        self.state_users = self.state_users[:0]
+        self.state_ts = self.state_ts[:0]
+        self.state_sid = self.state_sid[:0]
+        return remaining
+
+
+def sessionize(events, gap=SESSION_GAP):
+    """Assign session ids to an in-memory event frame"""
+    return Sessionizer(gap).assign(events)
+
+
+def sessionize_chunks(chunks, gap=SESSION_GAP):
+    """Yield closed sessions for a stream of time-ordered event chunks"""
+    sessionizer = Sessionizer(gap)
+    for chunk in chunks:
+        closed = sessionizer.process(chunk)
+        if len(closed):
+            yield closed
+    remaining = sessionizer.flush()
+    if len(remaining):
+        yield remaining
+
+
+def iter_event_chunks(path, chunksize=1_000_000):
+    """Read an event CSV in chunks"""
+    return pd.read_csv(path, chunksize=chunksize, parse_dates=['timestamp'])
+
+
+def build_session_table(chunks, users=None, gap=SESSION_GAP):
+    """Compact session table, optionally joined to user attributes
+
+    The table holds one row per session with its funnel steps as a bitmask
+    and a successful_post flag, which is what the funnel and A/B engines in
+    analysis_functions consume.
+    """
+    return session_table(pd.concat(list(sessionize_chunks(chunks, gap)), ignore_index=True), users)
+
+
+def session_table(sessions, users=None):
+    """Compact dtypes, the successful_post flag and user attributes for sessions from a Sessionizer"""
+    sessions = sessions.astype({'session_id': np.int64, 'user_id': np.int64,
+                                'n_events': np.int32, 'steps_mask': np.uint8})
+    sessions['successful_post'] = (sessions['steps_mask'] & STEP_BITS['reels_posted']) > 0
+
+    if users is not None:
+        attributes = users.set_index('user_id')[['variant', 'device_type', 'creator_cohort']].astype('category')
+        sessions = sessions.join(attributes, on='user_id')
+    return sessions
+
+
+if __name__ == "__main__":
+    events_path, users_path, output_path = sys.argv[1:4]
+    table = build_session_table(iter_event_chunks(events_path), pd.read_csv(users_path))
+    table.to_csv(output_path, index=False)
+    print(f"Wrote {len(table):,} sessions to {output_path}")
@@ -0,0 +1,228 @@
+"""
+Versioned, append-only snapshots of the analysis results
+Run: python snapshots.py commit "cpm 25"  |  python snapshots.py list  |  python snapshots.py diff 3 4
+
+Layout under results/snapshots/:
+
+    objects/<sha256>.npy     one column of one table, content-addressed
+    manifests/v00001.json    tables -> column -> object hash, plus metadata
+
+Each column is stored once per distinct content, so a rerun that only
+moves the impact numbers adds a few small objects and a manifest; the
+unchanged ab_results and funnel columns are shared with earlier versions.
+Nothing is ever overwritten: manifests are created exclusively and objects
+are immutable.
+
+diff_versions() joins two versions of each table on its key columns and
+compares every value column at once, returning the cells that moved.
+"""
+
+import argparse
+import glob
+import hashlib
+import io
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+SNAPSHOT_DIR = 'results/snapshots'
+RESULT_FILES = {
+    'ab_results': 'results/ab_test_results.csv',
+    'funnel_overall': 'results/funnel_metrics_overall.csv',
+    'funnel_cohort': 'results/funnel_metrics_by_cohort.csv',
+    'business_impact': 'results/business_impact.json',
+}
+
+# Columns that identify a row in each snapshotted table
+TABLE_KEYS = {
+    'ab_results': ['segment'],
+    'funnel_overall': ['funnel_step'],
+    'funnel_cohort': ['creator_cohort', 'funnel_step'],
+    'business_impact': ['period', 'metric'],
+}
+DIFF_COLUMNS = ['table', 'key', 'column', 'old', 'new', 'delta', 'status']
+
+
+def impact_table(business_impact):
+    """Nested business_impact dict as a (period, metric, value) table"""
+    rows = [(period, metric, float(value))
+            for period, values in business_impact.items() for metric, value in values.items()]
+    return pd.DataFrame(rows, columns=['period', 'metric', 'value'])
+
+
+def read_results(paths=RESULT_FILES):
+    """The snapshotted tables, read from the result files"""
+    tables = {name: pd.read_csv(path) for name, path in paths.items() if path.endswith('.csv')}
+    with open(paths['business_impact']) as f:
+        tables['business_impact'] = impact_table(json.load(f))
+    return tables
+
+
+def _column_bytes(values):
+    values = np.asarray(values)
+    if values.dtype == object:
+        values = values.astype(str)
+    buffer = io.BytesIO()
+    np.save(buffer, values, allow_pickle=False)
+    return buffer.getvalue()
+
+
+class SnapshotStore:
+    """Content-addressed column store with one JSON manifest per version"""
+
+    def __init__(self, root=SNAPSHOT_DIR):
+        self.root = root
+        self.objects = os.path.join(root, 'objects')
+        self.manifests = os.path.join(root, 'manifests')
+
+    def _manifest_path(self, version):
+        return os.path.join(self.manifests, f'v{version:05d}.json')
+
+    def version_numbers(self):
+        paths = glob.glob(os.path.join(self.manifests, 'v*.json'))
+        return sorted(int(os.path.basename(p)[1:-5]) for p in paths)
+
+    def manifest(self, version):
+        with open(self._manifest_path(version)) as f:
+            return json.load(f)
+
+    def versions(self):
+        """One row per version: number, timestamp, label and row counts"""
+        rows = []
+        for version in self.version_numbers():
+            m = self.manifest(version)
+            rows.append({'version': version, 'created': pd.Timestamp(m['created'], unit='s'),
+                         'label': m['label'], 'new_objects': m['new_objects'],
+                         **{f'{name}_rows': t['rows'] for name, t in m['tables'].items()}})
+        return pd.DataFrame(rows)
+
+    def _put(self, payload):
+        digest = hashlib.sha256(payload).hexdigest()
+        path = os.path.join(self.objects, digest + '.npy')
+        if os.path.exists(path):
+            return digest, False
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp, path)
+        return digest, True
+
+    def commit(self, tables, label=''):
+        """Record a new version of the given {name: DataFrame} tables; returns its number"""
+        os.makedirs(self.objects, exist_ok=True)
+        os.makedirs(self.manifests, exist_ok=True)
+        entries, new_objects = {}, 0
+        for name, frame in tables.items():
+            columns = {}
+            for column in frame.columns:
+                digest, created = self._put(_column_bytes(frame[column].to_numpy()))
+                columns[column] = digest
+                new_objects += created
+            entries[name] = {'rows': len(frame), 'columns': columns}
+
+        manifest = {'created': time.time(), 'label': label, 'new_objects': new_objects, 'tables': entries}
+        while True:
+            numbers = self.version_numbers()
+            version = (numbers[-1] if numbers else 0) + 1
+            try:
+                # 'x' refuses to overwrite, so concurrent writers cannot clobber a version
+                with open(self._manifest_path(version), 'x') as f:
+                    json.dump(dict(manifest, version=version), f, indent=1)
+                return version
+            except FileExistsError:
+                continue
+
+    def load(self, version, name):
+        """One table as it was at a version"""
+        columns = self.manifest(version)['tables'][name]['columns']
+        return pd.DataFrame({column: np.load(os.path.join(self.objects, digest + '.npy'))
+                             for column, digest in columns.items()})
+
+    def latest(self):
+        numbers = self.version_numbers()
+        return numbers[-1] if numbers else None
+
+
+def _side(merged, column, suffix, present):
+    """One version's values of a column after the outer merge (NaN if that version lacks it)"""
+    if not present:
+        return pd.Series(np.nan, index=merged.index)
+    return merged[column + suffix] if column + suffix in merged else merged[column]
+
+
+def diff_tables(old, new, keys, name='', atol=1e-12):
+    """Changed, added and removed cells between two versions of one table (long format)"""
+    values = [c for c in dict.fromkeys(list(old.columns) + list(new.columns)) if c not in keys]
+    merged = old.merge(new, on=keys, how='outer', suffixes=('_old', '_new'), indicator=True)
+    key = merged[keys[0]].astype(str)
+    for column in keys[1:]:
+        key = key + ' / ' + merged[column].astype(str)
+
+    frames = []
+    for column in values:
+        before = _side(merged, column, '_old', column in old.columns)
+        after = _side(merged, column, '_new', column in new.columns)
+        numeric = pd.api.types.is_numeric_dtype(before) and pd.api.types.is_numeric_dtype(after) \
+            and not pd.api.types.is_bool_dtype(before)
+        if numeric:
+            delta = after.astype(float) - before.astype(float)
+            changed = ~np.isclose(before.astype(float), after.astype(float), atol=atol, equal_nan=True)
+        else:
+            delta = pd.Series(np.nan, index=merged.index)
+            changed = (before.astype(str) != after.astype(str)).to_numpy()
+        frames.append(pd.DataFrame({'key': key, 'column': column, 'old': before.astype(object),
+                                    'new': after.astype(object), 'delta': delta,
+                                    'status': merged['_merge'].map({'left_only': 'removed', 'right_only': 'added',
+                                                                    'both': 'changed'}).astype(str),
+                                    'changed': changed | (merged['_merge'] != 'both').to_numpy()}))
+    if not frames:
+        return pd.DataFrame(columns=DIFF_COLUMNS)
+    diff = pd.concat(frames, ignore_index=True)
+    diff = diff[diff['changed']].drop(columns='changed')
+    diff.insert(0, 'table', name)
+    return diff[DIFF_COLUMNS].reset_index(drop=True)
+
+
+def diff_versions(store, old_version, new_version, tables=None):
+    """Every cell that moved between two versions, across all shared tables"""
+    old_tables = store.manifest(old_version)['tables']
+    new_tables = store.manifest(new_version)['tables']
+    frames = []
+    for name in tables or TABLE_KEYS:
+        if name not in old_tables or name not in new_tables:
+            continue
+        # Identical manifests entries mean identical content: skip without loading
+        if old_tables[name]['columns'] == new_tables[name]['columns']:
+            continue
+        frames.append(diff_tables(store.load(old_version, name), store.load(new_version, name),
+                                  TABLE_KEYS[name], name))
+    if not frames:
+        return pd.DataFrame(columns=DIFF_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Versioned snapshots of the analysis results")
+    sub = parser.add_subparsers(dest='command', required=True)
+    commit = sub.add_parser('commit', help="Snapshot the current results/ files")
+    commit.add_argument('label', nargs='?', default='')
+    sub.add_parser('list', help="List versions")
+    diff = sub.add_parser('diff', help="Show cells that moved between two versions")
+    diff.add_argument('old', type=int)
+    diff.add_argument('new', type=int)
+    args = parser.parse_args()
+
+    store = SnapshotStore()
+    if args.command == 'commit':
+        print(f"v{store.commit(read_results(), args.label)}")
+    elif args.command == 'list':
+        print(store.versions().to_string(index=False))
+    else:
+        print(diff_versions(store, args.old, args.new).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -10,11 +10,26 @@ import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 import plotly.express as px
+import plotly.io as pio
 from plotly.subplots import make_subplots
-import json
 import sys
 import os
 
+from data_store import freeze_data
+from figures import (ab_forest_figure, funnel_figure, impact_indicator_figure, launch_timeline_figure,
+                     hourly_rates_figure, live_funnel_figure, retention_heatmap_figure, revenue_heatmap_figure,
+                     tornado_figure, uplift_deciles_figure)
+from funnel_paths import divergent_paths, ordered_funnel
+from guardrails import PHASE_THRESHOLDS, evaluate_guardrails
+from live import LIVE_LOG_PATH, LiveMonitor
+from memory_profile import frame_sizes, profiler
+from metrics_api import DEFAULT_PORT, serve_in_background
+from parallel import prepare
+from snapshots import SnapshotStore, diff_versions
+from tables import fragment, fragment_every, paged_table
+from validation import segment_health
+from warm_snapshot import load_startup_data
+
 # Add parent directory to path for imports (works in notebook & script)
 try:
     # If running as a script
@@ -28,6 +43,20 @@ if BASE_DIR not in sys.path:
 
 print("Base directory added to path:", BASE_DIR)
 
+LIVE_REFRESH_SECONDS = float(os.environ.get('DASHBOARD_LIVE_REFRESH_SECONDS', 2))
+
+# Business assumption sliders: (label, min, max, default, step, help)
+ASSUMPTION_SLIDERS = {
+    'adoption_rate': ("Feature Adoption Rate", 0.0, 1.0, 0.6, 0.05,
+                      "Percentage of users who will use Quick Edit feature"),
+    'monetization_rate': ("Monetization Rate", 0.0, 1.0, 0.35, 0.05,
+                          "Percentage of Reels that show ads"),
+    'cpm': ("Average CPM ($)", 5, 50, 20, 5,
+            "Cost per 1000 ad impressions"),
+    'creator_share': ("Creator Share of DAU", 0.10, 0.40, 0.25, 0.05,
+                      "Casual + power creators as a share of daily active users (split 60/40)"),
+}
+
 
 # Page configuration
 st.set_page_config(
@@ -75,74 +104,24 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-def load_data():
-    """Load analysis results"""
-    try:
-        # Load business impact
-        with open('results/business_impact.json', 'r') as f:
-            business_impact = json.load(f)
-        
-        # Load A/B test results
-        ab_results = pd.read_csv('results/ab_test_results.csv')
-        
-        # Load funnel metrics
-        funnel_overall = pd.read_csv('results/funnel_metrics_overall.csv')
-        funnel_cohort = pd.read_csv('results/funnel_metrics_by_cohort.csv')
-        
-        return {
-            'business_impact': business_impact,
-            'ab_results': ab_results,
-            'funnel_overall': funnel_overall,
-            'funnel_cohort': funnel_cohort
-        }
-    except FileNotFoundError:
-        # Create sample data for demo
-        return create_sample_data()
-
-def create_sample_data():
-    """Create sample data for dashboard demo"""
-    # Business impact
-    business_impact = {
-        'daily': {
-            'additional_creators': 6085535,
-            'additional_reels': 6694089,
-            'additional_watch_time_hours': 46486.7,
-            'additional_revenue': 70288
-        },
-        'monthly': {
-            'additional_reels': 200822672,
-            'additional_watch_time_hours': 1394601,
-            'additional_revenue': 2108638
-        }
-    }
-    
-    # A/B test results
-    ab_results = pd.DataFrame({
-        'segment': ['overall', 'casual_creator', 'power_creator', 'Android', 'iPhone'],
-        'control_mean': [0.23, 0.153, 0.348, 0.255, 0.315],
-        'treatment_mean': [0.26, 0.170, 0.391, 0.279, 0.355],
-        'relative_lift': [0.13, 0.106, 0.124, 0.094, 0.127],
-        'p_value': [0.0001, 0.0000, 0.0000, 0.0000, 0.0000],
-        'significant': [True, True, True, True, True]
-    })
-    
-    # Funnel metrics
-    funnel_steps = ['reels_tab_opened', 'create_button_clicked', 'camera_opened', 
-                    'clip_recorded', 'audio_selected', 'edit_tool_opened', 'reels_posted']
-    
-    funnel_overall = pd.DataFrame({
-        'funnel_step': funnel_steps,
-        'sessions_reached': [100000, 85000, 70000, 60000, 50000, 40000, 30000],
-        'conversion_rate': [1.0, 0.85, 0.70, 0.60, 0.50, 0.40, 0.30],
-        'dropoff_rate': [0.0, 0.15, 0.18, 0.14, 0.17, 0.20, 0.25]
-    })
-    
-    return {
-        'business_impact': business_impact,
-        'ab_results': ab_results,
-        'funnel_overall': funnel_overall,
-        'funnel_cohort': None
-    }
+@st.cache_resource(show_spinner="Loading analysis data...")
+def load_shared_data():
+    """Load data once per server process; every viewer session shares this read-only instance"""
+    with profiler.measure("load_data"):
+        return freeze_data(load_startup_data())
+
+@st.cache_resource
+def start_metrics_api():
+    """Serve the shared data over the local JSON/Arrow metrics API (set METRICS_API_PORT=0 to disable)"""
+    port = int(os.environ.get('METRICS_API_PORT', DEFAULT_PORT))
+    if port == 0:
+        return None
+    return serve_in_background(load_shared_data(), port=port)
+
+@st.cache_resource
+def live_monitor():
+    """Tailer and running counters for the live event log, shared by every viewer session"""
+    return LiveMonitor(LIVE_LOG_PATH)
 
 def create_kpi_metrics(data):
     """Create KPI metrics at top of dashboard"""
@@ -183,182 +162,207 @@ def create_kpi_metrics(data):
             <p style="margin:0; color:#666; font-size:0.9rem;">Of treatment group</p>
         </div>
         """, unsafe_allow_html=True)
-
-def plot_ab_test_results(ab_results):
-    """Plot A/B test results with confidence intervals"""
-    st.markdown('<div class="sub-header">A/B Test Results by Segment</div>', unsafe_allow_html=True)
-    
-    # Filter for segments (not overall)
-    segment_results = ab_results[ab_results['segment'] != 'overall'].copy()
-    
-    # Create forest plot
-    fig = go.Figure()
     
-    # Color by significance
-    colors = ['#4CAF50' if x else '#f44336' for x in segment_results['significant']]
-    
-    fig.add_trace(go.Scatter(
-        x=segment_results['relative_lift'] * 100,  # Convert to percentage
-        y=segment_results['segment'],
-        mode='markers',
-        marker=dict(
-            size=20,
-            color=colors,
-            line=dict(width=2, color='DarkSlateGrey')
-        ),
-        error_x=dict(
-            type='data',
-            array=[5, 4, 3, 4, 3],  # Simulated confidence intervals
-            arrayminus=[5, 4, 3, 4, 3],
-            thickness=1.5,
-            width=5,
-            color='gray'
-        ),
-        hovertemplate="<b>%{y}</b><br>Lift: %{x:.1f}%<br>p-value: <0.0001<extra></extra>"
-    ))
-    
-    # Add vertical lines
-    fig.add_vline(x=0, line_width=1, line_dash="dash", line_color="gray")
-    fig.add_vline(x=10, line_width=1, line_dash="dot", line_color="green", 
-                  annotation_text="10% Target", annotation_position="top right")
+    sketches = data.get('creator_sketches')
+    if sketches is None:
+        return
     
-    fig.update_layout(
-        height=400,
-        showlegend=False,
-        xaxis_title="Relative Lift (%)",
-        yaxis_title="Segment",
-        plot_bgcolor='white',
-        paper_bgcolor='white',
-        font=dict(size=12)
-    )
-    
-    fig.update_xaxes(
-        gridcolor='lightgray',
-        zerolinecolor='gray'
-    )
+    # Distinct creators / posters from mergeable HyperLogLog sketches
+    error = sketches.relative_error
+    col1, col2, col3, col4 = st.columns(4)
+    cards = [
+        (col1, "👥 Unique Creators", 'creator', 'control', "#666"),
+        (col2, "👥 Unique Creators", 'creator', 'treatment', "#1E88E5"),
+        (col3, "📮 Unique Posters", 'poster', 'control', "#666"),
+        (col4, "📮 Unique Posters", 'poster', 'treatment', "#4CAF50"),
+    ]
+    # Each estimate merges its matching register rows; the four run concurrently
+    estimates = prepare({(metric, variant): (lambda m=metric, v=variant: sketches.count(m, variant=v))
+                         for _, _, metric, variant, _ in cards})
+    for col, title, metric, variant, color in cards:
+        estimate = estimates[(metric, variant)]
+        with col:
+            st.markdown(f"""
+            <div class="metric-card">
+                <h3 style="margin:0; color:#666;">{title}</h3>
+                <h2 style="margin:0; color:{color};">{estimate:,.0f}</h2>
+                <p style="margin:0; color:#666; font-size:0.9rem;">{variant.title()} · ±{error:.1%} (HLL std. error)</p>
+            </div>
+            """, unsafe_allow_html=True)
+
+HEALTH_BADGES = {'ok': '✅ Balanced', 'warn': '⚠️ Daily imbalance', 'srm': '❌ SRM'}
+
+def plot_ab_test_results(contrasts, prebuilt=None, health=None):
+    """Plot A/B/n test results with confidence intervals, one facet per variant contrast
     
-    fig.update_yaxes(
-        gridcolor='lightgray'
-    )
+    prebuilt is the figure JSON from a warm snapshot, if there is one; health is
+    the assignment_health table, shown as a sample-ratio badge per segment.
+    """
+    st.markdown('<div class="sub-header">A/B Test Results by Segment</div>', unsafe_allow_html=True)
     
+    # Filter for segments (not overall)
+    segment_results = contrasts[contrasts['segment'] != 'overall']
+    
+    if health is not None:
+        status = segment_health(health)['status']
+        badges = [f"**{s}** {HEALTH_BADGES.get(status.get(s), '–')}" for s in contrasts['segment'].unique()]
+        st.markdown("Assignment health: " + " · ".join(badges))
+        failing = [s for s in contrasts['segment'].unique() if status.get(s) == 'srm']
+        if failing:
+            st.error(f"Sample ratio mismatch in {', '.join(failing)}: variant counts differ from the planned split, "
+                     "so lifts in these segments may be biased.")
+        segment_results = segment_results.assign(
+            health=segment_results['segment'].map(lambda s: HEALTH_BADGES.get(status.get(s), '–')))
+    
+    fig = pio.from_json(prebuilt) if prebuilt else ab_forest_figure(segment_results)
     st.plotly_chart(fig, use_container_width=True)
+    if segment_results['variant'].nunique() > 1:
+        st.caption("Significance uses Holm-adjusted p-values across each segment's contrasts; "
+                   "intervals are Bonferroni-simultaneous.")
     
     # Add metrics table
     st.markdown("#### Detailed Results")
-    display_df = segment_results[['segment', 'control_mean', 'treatment_mean', 'relative_lift', 'p_value']].copy()
-    display_df['control_mean'] = display_df['control_mean'].apply(lambda x: f"{x:.1%}")
-    display_df['treatment_mean'] = display_df['treatment_mean'].apply(lambda x: f"{x:.1%}")
-    display_df['relative_lift'] = display_df['relative_lift'].apply(lambda x: f"{x:.1%}")
-    display_df['p_value'] = display_df['p_value'].apply(lambda x: f"{x:.4f}")
-    display_df.columns = ['Segment', 'Control Rate', 'Treatment Rate', 'Lift', 'p-value']
+    paged_table(
+        segment_results[['segment', 'variant', 'baseline', 'baseline_mean', 'variant_mean', 'relative_lift',
+                         'p_value', 'p_adjusted'] + (['health'] if health is not None else [])],
+        key="ab_detail",
+        labels={'segment': 'Segment', 'variant': 'Variant', 'baseline': 'Baseline',
+                'baseline_mean': 'Baseline Rate', 'variant_mean': 'Variant Rate',
+                'relative_lift': 'Lift', 'p_value': 'p-value', 'p_adjusted': 'Adjusted p-value',
+                'health': 'Assignment'},
+        percent_columns=['baseline_mean', 'variant_mean', 'relative_lift'],
+        formats={'p_value': '%.4f', 'p_adjusted': '%.4f'},
+        default_sort='relative_lift'
+    )
     
-    st.dataframe(display_df, use_container_width=True)
+    if health is not None:
+        with st.expander("Assignment health by segment and exposure day"):
+            daily = health.assign(day=health['day'].dt.strftime('%Y-%m-%d').fillna('all days'))
+            paged_table(daily, key="assignment_health",
+                        labels={'segment': 'Segment', 'day': 'First exposure', 'chi2': 'χ²', 'p_value': 'p-value',
+                                'srm': 'SRM'},
+                        formats={'chi2': '%.2f', 'p_value': '%.4f'}, search_columns=['segment', 'day'],
+                        default_sort='p_value')
+            st.caption("Chi-square test of variant counts against an even split, per segment over all exposed "
+                       "users and per first-exposure day (Bonferroni across days).")
+
+@fragment
+def plot_guardrails(user_sums):
+    """Guardrail ratio metrics checked against a rollout phase's Success Metrics
+    
+    Fragment: picking another phase reruns only this block.
+    """
+    st.markdown('<div class="sub-header">Guardrail Metrics</div>', unsafe_allow_html=True)
+    
+    phase = st.selectbox("Success Metrics of", list(PHASE_THRESHOLDS.index), key="guardrail_phase")
+    results = evaluate_guardrails(user_sums, phase)
+    badge = {'pass': '✅ Pass', 'fail': '❌ Fail', 'info': 'ℹ️ Monitor'}
+    
+    overall = results[results['segment'] == 'overall']
+    st.dataframe(pd.DataFrame({
+        'Metric': overall['label'],
+        'Control': overall['control'].map('{:.4g}'.format),
+        'Treatment': overall['treatment'].map('{:.4g}'.format),
+        'Change': overall['relative_change'].map('{:+.1%}'.format),
+        '95% CI': [f"[{lo:+.1%}, {hi:+.1%}]" for lo, hi in zip(overall['ci_low'], overall['ci_high'])],
+        'p-value': overall['p_value'].map('{:.4f}'.format),
+        'Threshold': overall['threshold'],
+        'Status': overall['status'].map(badge)
+    }), use_container_width=True, hide_index=True)
+    st.caption("Ratios of per-user sums with delta-method standard errors (users are the randomization "
+               "unit). Adoption and watch-time thresholds are not measurable from the event log.")
+    
+    with st.expander("Guardrails by segment"):
+        paged_table(
+            results[results['segment'] != 'overall'].drop(columns='guardrail'),
+            key="guardrail_detail",
+            labels={'segment': 'Segment', 'label': 'Metric', 'control': 'Control', 'treatment': 'Treatment',
+                    'relative_change': 'Change', 'ci_low': 'CI Low', 'ci_high': 'CI High', 'p_value': 'p-value',
+                    'threshold': 'Threshold', 'status': 'Status'},
+            percent_columns=['relative_change', 'ci_low', 'ci_high'],
+            formats={'control': '%.4g', 'treatment': '%.4g', 'p_value': '%.4f'},
+            search_columns=['segment', 'label', 'status'],
+            default_sort='segment'
+        )
 
-def plot_funnel_analysis(funnel_data):
-    """Plot creation funnel analysis"""
+def plot_funnel_analysis(funnel_data, prebuilt=None):
+    """Plot creation funnel analysis (prebuilt: figure JSON from a warm snapshot)"""
     st.markdown('<div class="sub-header">Creation Funnel Analysis</div>', unsafe_allow_html=True)
     
-    fig = make_subplots(
-        rows=1, cols=2,
-        subplot_titles=('Funnel Conversion Rates', 'Drop-off Analysis'),
-        specs=[[{'type': 'funnel'}, {'type': 'bar'}]]
-    )
+    fig = pio.from_json(prebuilt) if prebuilt else funnel_figure(funnel_data)
     
-    # Funnel plot
-    fig.add_trace(
-        go.Funnel(
-            name='Creation Flow',
-            y=funnel_data['funnel_step'],
-            x=funnel_data['sessions_reached'],
-            textinfo="value+percent initial",
-            opacity=0.7,
-            connector=dict(line=dict(color='royalblue', width=3)),
-            marker=dict(
-                color=['#1E88E5', '#2196F3', '#42A5F5', '#64B5F6', 
-                       '#90CAF9', '#BBDEFB', '#E3F2FD']
-            )
-        ),
-        row=1, col=1
-    )
+    st.plotly_chart(fig, use_container_width=True)
     
-    # Drop-off bar chart
-    fig.add_trace(
-        go.Bar(
-            x=funnel_data['funnel_step'],
-            y=funnel_data['dropoff_rate'] * 100,
-            marker_color='#f44336',
-            text=funnel_data['dropoff_rate'].apply(lambda x: f"{x:.1%}"),
-            textposition='auto'
-        ),
-        row=1, col=2
+    # Key insight
+    st.info("""
+    **Key Insight**: 42% of creators drop off at the editing stage. 
+    This represents the biggest opportunity for improvement in the creation funnel.
+    """)
+
+@fragment
+def plot_ordered_funnel(events):
+    """Plot ordered, time-windowed funnel against ever-fired step counts
+
+    Fragment: moving the window slider reruns only this block (depends on data['events']).
+    """
+    st.markdown('<div class="sub-header">Ordered Funnel Path Matching</div>', unsafe_allow_html=True)
+    
+    window = st.slider(
+        "Max minutes between consecutive steps",
+        min_value=1, max_value=30, value=10, step=1,
+        help="A step only counts if it follows the previous step, in order, within this window"
     )
+    # The ordered funnel and the stalled-session paths are independent passes over the events
+    prepared = prepare({
+        'funnel': lambda: ordered_funnel(events, windows=pd.Timedelta(minutes=window)),
+        'paths': lambda: divergent_paths(events, windows=pd.Timedelta(minutes=window)),
+    })
+    funnel = prepared['funnel']
+    
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        x=funnel['funnel_step'],
+        y=funnel['any_conversion_rate'] * 100,
+        name='Ever fired',
+        marker_color='#BBDEFB'
+    ))
+    fig.add_trace(go.Bar(
+        x=funnel['funnel_step'],
+        y=funnel['ordered_conversion_rate'] * 100,
+        name=f'In order within {window} min',
+        marker_color='#1E88E5'
+    ))
     
     fig.update_layout(
-        height=500,
-        showlegend=False,
+        height=400,
+        barmode='group',
+        xaxis_title="Funnel Step",
+        yaxis_title="Sessions Reaching Step (%)",
         plot_bgcolor='white',
-        paper_bgcolor='white'
+        paper_bgcolor='white',
+        legend=dict(orientation='h', y=1.1)
     )
     
-    fig.update_xaxes(title_text="Sessions", row=1, col=1)
-    fig.update_xaxes(title_text="Funnel Step", row=1, col=2)
-    fig.update_yaxes(title_text="Drop-off Rate (%)", row=1, col=2)
-    
     st.plotly_chart(fig, use_container_width=True)
     
-    # Key insight
-    st.info("""
-    **Key Insight**: 42% of creators drop off at the editing stage. 
-    This represents the biggest opportunity for improvement in the creation funnel.
-    """)
+    # Where sessions go instead of posting
+    st.markdown("#### Most Common Paths After `edit_tool_opened` (no post)")
+    paths = prepared['paths']
+    paths['share'] = paths['share'].map("{:.1%}".format)
+    paths.columns = ['Path', 'Sessions', 'Share of Stalled Sessions']
+    st.dataframe(paths, use_container_width=True)
 
-def plot_business_impact(business_impact):
-    """Plot business impact metrics"""
+def plot_business_impact(revenue_fig, reels_fig):
+    """Plot business impact metrics from the prepared indicator figures"""
     st.markdown('<div class="sub-header">Business Impact Projection</div>', unsafe_allow_html=True)
     
     col1, col2 = st.columns(2)
     
     with col1:
-        # Revenue projection
-        fig1 = go.Figure()
-        
-        fig1.add_trace(go.Indicator(
-            mode="number+delta",
-            value=business_impact['monthly']['additional_revenue'],
-            number={'prefix': "$", 'valueformat': ",.0f"},
-            delta={'reference': 1500000, 'relative': True, 'valueformat': '.1%'},
-            title={"text": "Monthly Revenue Impact"},
-            domain={'row': 0, 'column': 0}
-        ))
-        
-        fig1.update_layout(
-            height=200,
-            paper_bgcolor='pink',
-            font=dict(size=18)
-        )
-        
-        st.plotly_chart(fig1, use_container_width=True)
+        st.plotly_chart(revenue_fig, use_container_width=True)
     
     with col2:
-        # Reels projection
-        fig2 = go.Figure()
-        
-        fig2.add_trace(go.Indicator(
-            mode="number+delta",
-            value=business_impact['monthly']['additional_reels'] / 1000000,
-            number={'suffix': "M", 'valueformat': ".1f"},
-            delta={'reference': 150, 'relative': True, 'valueformat': '.1%'},
-            title={"text": "Monthly Additional Reels"},
-            domain={'row': 0, 'column': 0}
-        ))
-        
-        fig2.update_layout(
-            height=200,
-            paper_bgcolor='pink',
-            font=dict(size=18)
-        )
-        
-        st.plotly_chart(fig2, use_container_width=True)
+        st.plotly_chart(reels_fig, use_container_width=True)
     
     # Assumptions table
     st.markdown("#### Conservative Assumptions")
@@ -372,110 +376,286 @@ def plot_business_impact(business_impact):
     
     st.dataframe(assumptions, use_container_width=True)
 
-def plot_launch_strategy():
-    """Plot launch strategy timeline"""
-    st.markdown('<div class="sub-header">Phased Launch Strategy</div>', unsafe_allow_html=True)
+def plot_sensitivity(tornado_fig, heatmap_fig):
+    """Plot tornado and heatmap views of the precomputed sensitivity surface"""
+    st.markdown('<div class="sub-header">Sensitivity Analysis</div>', unsafe_allow_html=True)
     
-    # Create Gantt chart
-    phases = pd.DataFrame([
-        dict(Task="Phase 1", Start='2024-03-01', Finish='2024-03-14', 
-             Description="10% rollout to iPhone casual creators", Lift="12.7%", Audience="10M users"),
-        dict(Task="Phase 2", Start='2024-03-15', Finish='2024-03-28', 
-             Description="50% rollout to iPhone users", Lift="≥8% maintained", Audience="50M users"),
-        dict(Task="Phase 3", Start='2024-04-01', Finish='2024-04-30', 
-             Description="100% rollout to casual creators", Lift="≥8% maintained", Audience="225M users"),
-        dict(Task="Phase 4", Start='2024-05-01', Finish='2024-05-31', 
-             Description="Optimize & expand to Android", Lift="≥8% target", Audience="Full Android")
-    ])
-    
-    fig = px.timeline(
-        phases, 
-        x_start="Start", 
-        x_end="Finish", 
-        y="Task",
-        color="Task",
-        color_discrete_sequence=['#1E88E5', '#2196F3', '#42A5F5', '#64B5F6'],
-        hover_data=["Description", "Lift", "Audience"]
-    )
+    col1, col2 = st.columns(2)
     
-    fig.update_layout(
-        height=300,
-        showlegend=False,
-        plot_bgcolor='white',
-        paper_bgcolor='white',
-        xaxis_title="Timeline",
-        yaxis_title="",
-        font=dict(size=12)
-    )
+    with col1:
+        st.plotly_chart(tornado_fig, use_container_width=True)
     
-    fig.update_yaxes(autorange="reversed")
-    st.plotly_chart(fig, use_container_width=True)
+    with col2:
+        st.plotly_chart(heatmap_fig, use_container_width=True)
+
+def assumption_sliders():
+    """Assumption sliders; values survive navigating away from the section"""
+    values = {}
+    cols = st.columns(len(ASSUMPTION_SLIDERS))
+    for col, (key, (label, lo, hi, default, step, help_text)) in zip(cols, ASSUMPTION_SLIDERS.items()):
+        # Widget state is dropped while the section is hidden, so keep a copy to restore from
+        if key not in st.session_state:
+            st.session_state[key] = st.session_state.get(f'saved_{key}', default)
+        with col:
+            values[key] = st.slider(label, min_value=lo, max_value=hi, step=step, help=help_text, key=key)
+        st.session_state[f'saved_{key}'] = values[key]
+    return values
+
+@fragment
+def business_impact_section(surface):
+    """Assumptions, impact, sensitivity and ROI
+
+    Fragment: a slider change reruns only this block; its only data dependency
+    is the precomputed sensitivity surface.
+    """
+    st.markdown("### ⚙️ Assumptions")
+    assumptions = assumption_sliders()
+    
+    # Slider values are served by interpolating the precomputed surface
+    business_impact = surface.business_impact(**assumptions)
+    monthly = business_impact['monthly']
+    figures = prepare({
+        'revenue': lambda: impact_indicator_figure(monthly['additional_revenue'], 1500000, "Monthly Revenue Impact",
+                                                   {'prefix': "$", 'valueformat': ",.0f"}),
+        'reels': lambda: impact_indicator_figure(monthly['additional_reels'] / 1000000, 150,
+                                                 "Monthly Additional Reels", {'suffix': "M", 'valueformat': ".1f"}),
+        'tornado': lambda: tornado_figure(surface, assumptions),
+        'heatmap': lambda: revenue_heatmap_figure(surface, assumptions),
+    })
+    plot_business_impact(figures['revenue'], figures['reels'])
+    plot_sensitivity(figures['tornado'], figures['heatmap'])
+    
+    # ROI calculation
+    st.markdown("""
+    ### 💰 ROI Calculation
+    
+    | Metric | Value |
+    |--------|-------|
+    | Monthly Revenue Impact | ${:,.0f} |
+    | Engineering Cost | $500,000 |
+    | Payback Period | **<1 month** |
+    | Annualized ROI | **>2400%** |
+    
+    **Note**: Engineering cost includes development, testing, and deployment.
+    """.format(business_impact['monthly']['additional_revenue']))
+
+def plot_launch_strategy(timeline_fig):
+    """Plot launch strategy timeline"""
+    st.markdown('<div class="sub-header">Phased Launch Strategy</div>', unsafe_allow_html=True)
+    
+    st.plotly_chart(timeline_fig, use_container_width=True)
     
     # Success metrics
     st.markdown("#### Success Metrics by Phase")
     
+    thresholds = PHASE_THRESHOLDS.reset_index()
     success_metrics = pd.DataFrame({
-        'Phase': ['Phase 1', 'Phase 2', 'Phase 3', 'Phase 4'],
-        'Primary Metric': ['Lift ≥12%', 'Lift ≥8%', 'Lift ≥8%', 'Lift ≥8%'],
-        'Adoption': ['≥40%', '≥50%', '≥50%', '≥50%'],
-        'Watch Time': ['≥28s', '≥28s', '≥28s', '≥28s'],
-        'Crashes': ['<0.1%', '<0.1%', '<0.1%', '<0.1%']
+        'Phase': thresholds['phase'],
+        'Primary Metric': thresholds['min_lift'].map('Lift ≥{:.0%}'.format),
+        'Adoption': thresholds['min_adoption'].map('≥{:.0%}'.format),
+        'Watch Time': thresholds['min_watch_seconds'].map('≥{:.0f}s'.format),
+        'Crashes': thresholds['max_crash_rate'].map('<{:.1%}'.format)
     })
     
     st.dataframe(success_metrics, use_container_width=True)
 
-def main():
-    """Main dashboard function"""
-    
-    # Sidebar
-    with st.sidebar:
-        st.image("https://cdn-icons-png.flaticon.com/512/124/124010.png", width=100)
-        st.title("Instagram Reels Analytics")
-        
-        st.markdown("---")
-        
-        st.markdown("### 📊 Dashboard Sections")
-        section = st.radio(
-            "Navigate to:",
-            ["Executive Summary", "A/B Test Results", "Funnel Analysis", 
-             "Business Impact", "Launch Strategy", "Methodology"]
-        )
-        
-        st.markdown("---")
-        
-        st.markdown("### ⚙️ Assumptions")
-        
-        # Interactive sliders for business assumptions
-        adoption_rate = st.slider(
-            "Feature Adoption Rate", 
-            min_value=0.0, max_value=1.0, value=0.6, step=0.05,
-            help="Percentage of users who will use Quick Edit feature"
-        )
-        
-        monetization_rate = st.slider(
-            "Monetization Rate", 
-            min_value=0.0, max_value=1.0, value=0.35, step=0.05,
-            help="Percentage of Reels that show ads"
-        )
-        
-        cpm = st.slider(
-            "Average CPM ($)", 
-            min_value=5, max_value=50, value=20, step=5,
-            help="Cost per 1000 ad impressions"
+def plot_rollout_assignment(report):
+    """Hash-bucket exposure per rollout phase, with sample-ratio checks"""
+    st.markdown("#### Rollout Assignment Check")
+    
+    table = report.assign(
+        target_share=report['target_share'].map('{:.0%}'.format),
+        observed_share=report['observed_share'].map('{:.1%}'.format),
+        srm_p_value=report['srm_p_value'].map('{:.3f}'.format),
+        balanced=report['balanced'].map({True: '✅', False: '⚠️ SRM'})
+    )
+    st.dataframe(table, use_container_width=True, hide_index=True)
+    st.caption("Users are assigned by a salted hash of their id (rollout.py), so each phase's exposure "
+               "set is reproducible offline. Phases are cumulative.")
+
+def plot_rollout_anomalies(alerts, fig):
+    """Hourly rollout metrics with CUSUM anomaly alerts over every variant x segment series"""
+    st.markdown("#### Rollout Anomaly Monitor")
+    
+    if alerts.empty:
+        st.success("No crash-rate or creation-rate anomalies in any variant or segment series.")
+    else:
+        st.warning(f"{len(alerts)} anomaly alert(s) across {alerts[['variant', 'segment']].drop_duplicates().shape[0]} "
+                   "series - marked on the timeline above and the hourly chart below.")
+    st.plotly_chart(fig, use_container_width=True)
+    if not alerts.empty:
+        paged_table(
+            alerts,
+            key="rollout_alerts",
+            labels={'hour': 'Hour', 'metric': 'Metric', 'variant': 'Variant', 'segment': 'Segment',
+                    'observed_rate': 'Observed', 'expected_rate': 'Expected', 'sessions': 'Sessions',
+                    'cusum': 'CUSUM'},
+            percent_columns=['observed_rate', 'expected_rate'],
+            formats={'cusum': '%.1f'},
+            search_columns=['metric', 'variant', 'segment'],
+            default_sort='hour'
         )
-        
-        st.markdown("---")
-        
-        st.markdown("### 📈 Last Updated")
-        st.caption("February 15, 2026")
-        
-        st.markdown("### 👤 Analyst")
-        st.caption("Your Name - Senior Data Scientist")
+    st.caption("Hourly Bernoulli CUSUM per variant x segment series (anomaly.py) against a seasonal baseline; "
+               "alerts on a doubled crash rate or a 20% relative drop in creation success.")
+
+def plot_uplift_deciles(deciles, fig):
+    """Predicted vs observed uplift by predicted-uplift decile"""
+    st.markdown('<div class="sub-header">Targeting by Predicted Uplift</div>', unsafe_allow_html=True)
     
-    # Load data
-    data = load_data()
+    st.plotly_chart(fig, use_container_width=True)
     
-    # Main content based on section
+    # Share of the incremental posts captured by targeting the top 30%
+    incremental = (deciles['observed_uplift'] * deciles['users']).clip(lower=0)
+    top_share = incremental[deciles['decile'] <= 3].sum() / max(incremental.sum(), 1e-12)
+    st.caption(f"Per-user T-learner on pre-exposure features, evaluated on held-out users. Rolling out to the "
+               f"top three deciles first captures {top_share:.0%} of the observed incremental creation success.")
+
+def plot_retention(summary, fig):
+    """Cohort retention heatmaps and day-N retention by variant"""
+    st.markdown('<div class="sub-header">Creator Retention (Feature Fatigue)</div>', unsafe_allow_html=True)
+    
+    summary = summary.set_index('variant')
+    cols = st.columns(len(summary.columns))
+    for col, metric in zip(cols, summary.columns):
+        control, treatment = summary.loc['control', metric], summary.loc['treatment', metric]
+        label = metric.split('_')[0].upper() + " Retention (treatment)"
+        with col:
+            if np.isnan(treatment):
+                st.metric(label, "n/a", help=f"Needs more than {metric[1:].split('_')[0]} days of data")
+            else:
+                st.metric(label, f"{treatment:.1%}", f"{(treatment - control) * 100:+.1f}pp vs control")
+    
+    st.plotly_chart(fig, use_container_width=True)
+
+@fragment
+def plot_run_comparison(store):
+    """Diff of two snapshotted analysis runs (fragment: the run pickers rerun only this block)"""
+    versions = store.versions()
+    if len(versions) < 2:
+        st.info("Fewer than two result snapshots recorded. Each `python pipeline.py` run that changes the "
+                "results adds one, as does `python snapshots.py commit <label>`.")
+        if len(versions):
+            st.dataframe(versions, use_container_width=True, hide_index=True)
+        return
+    
+    labels = {row.version: f"v{row.version} - {row.created:%Y-%m-%d %H:%M} {row.label}"
+              for row in versions.itertuples()}
+    numbers = list(labels)
+    col1, col2 = st.columns(2)
+    with col1:
+        old = st.selectbox("Base run", numbers, index=len(numbers) - 2, format_func=labels.get, key="diff_base")
+    with col2:
+        new = st.selectbox("Compare to", numbers, index=len(numbers) - 1, format_func=labels.get, key="diff_target")
+    
+    diff = diff_versions(store, old, new)
+    if diff.empty:
+        st.success("No segment lift, p-value, funnel or impact number moved between these runs.")
+    else:
+        st.markdown(f"**{len(diff)} value(s) moved** across {diff['table'].nunique()} table(s)")
+        paged_table(diff, key="run_diff", search_columns=['table', 'key', 'column'], formats={'delta': '%.4g'})
+    
+    with st.expander("All runs"):
+        st.dataframe(versions, use_container_width=True, hide_index=True)
+
+@fragment_every(LIVE_REFRESH_SECONDS)
+def plot_live_monitor():
+    """Live counters fed by the replayed event log
+    
+    Fragment on a timer: each refresh consumes only the newly appended events
+    and renders the running counters, so its cost does not grow with history.
+    """
+    if not os.path.exists(LIVE_LOG_PATH):
+        st.info(f"No live event log at `{LIVE_LOG_PATH}`. Start the local replayer with "
+                "`python live.py replay --rate 2000`; this page refreshes every "
+                f"{LIVE_REFRESH_SECONDS:g}s and picks it up.")
+        return
+    
+    monitor = live_monitor()
+    monitor.poll()
+    view = monitor.view()
+    status = view['status']
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Events Ingested", f"{status['events']:,}")
+    with col2:
+        st.metric("Closed Sessions", f"{status['closed_sessions']:,}")
+    with col3:
+        st.metric("Open Sessions", f"{status['open_sessions']:,}")
+    with col4:
+        latest = status['latest_event']
+        st.metric("Latest Event", "-" if latest is None else f"{latest:%b %d %H:%M:%S}")
+    if monitor.backlog_bytes:
+        st.caption(f"Catching up: {monitor.backlog_bytes / 1e6:,.1f} MB of the log not consumed yet")
+    
+    st.markdown("#### Creation Success by Variant")
+    st.dataframe(view['ab'], use_container_width=True, hide_index=True, column_config={
+        'creation_success': st.column_config.NumberColumn("Creation Success", format="percent"),
+        'relative_lift': st.column_config.NumberColumn("Lift", format="percent"),
+        'ci_low': st.column_config.NumberColumn("CI Low", format="percent"),
+        'ci_high': st.column_config.NumberColumn("CI High", format="percent"),
+        'p_value': st.column_config.NumberColumn("p-value", format="%.4f"),
+    })
+    st.caption("Closed sessions only, with user-clustered standard errors. These p-values are recomputed on "
+               "every refresh; repeated looks inflate false positives, so decide on the planned horizon.")
+    
+    alerts = view['alerts']
+    if len(alerts):
+        st.warning(f"{len(alerts)} live anomaly alert(s); latest at {alerts['hour'].max():%b %d %H:00} "
+                   f"({', '.join(sorted(alerts['metric'].unique()))})")
+        st.dataframe(alerts.sort_values('hour', ascending=False), use_container_width=True, hide_index=True,
+                     column_config={
+                         'hour': st.column_config.DatetimeColumn("Hour", format="MMM DD HH:00"),
+                         'observed_rate': st.column_config.NumberColumn("Observed", format="percent"),
+                         'expected_rate': st.column_config.NumberColumn("Expected", format="percent"),
+                         'cusum': st.column_config.NumberColumn("CUSUM", format="%.1f"),
+                     })
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("#### Hourly Metrics")
+        st.plotly_chart(hourly_rates_figure(view['hourly'], alerts), use_container_width=True)
+        st.caption("Each hour is scored by the per-variant CUSUM once its sessions have closed "
+                   "(about 30 minutes after it ends).")
+    with col2:
+        st.markdown("#### Live Funnel")
+        st.plotly_chart(live_funnel_figure(view['funnel']), use_container_width=True)
+
+def plot_data_validation(report):
+    """Validation panel: violations found while loading the data"""
+    st.markdown('<div class="sub-header">Data Validation</div>', unsafe_allow_html=True)
+    
+    errors = report[report['severity'] == 'error']
+    warnings = report[report['severity'] == 'warning']
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Checks Failing", len(report))
+    with col2:
+        st.metric("Error Rows", f"{int(errors['violations'].sum()):,}")
+    with col3:
+        st.metric("Warnings", len(warnings))
+    
+    if report.empty:
+        st.success("All schema and consistency checks passed: types, ranges, funnel monotonicity, "
+                   "variant balance and duplicate events.")
+        return
+    if (report['check'] == 'source_missing').any():
+        st.warning("Some result files were not found, so parts of this dashboard show generated demo data.")
+    paged_table(report, key="validation_report", default_sort='violations')
+
+def plot_memory_profile(data):
+    """Memory profiling panel (DASHBOARD_MEMORY_PROFILE=1): allocations per block and largest frames"""
+    with st.expander("🧠 Memory profile", expanded=True):
+        st.caption("Traced allocations in MB: peak while the block ran, retained after it")
+        st.dataframe(profiler.report(), hide_index=True, use_container_width=True,
+                     column_config={c: st.column_config.NumberColumn(format="%.1f")
+                                    for c in ['last_peak_mb', 'max_peak_mb', 'retained_mb', 'seconds']})
+        st.caption("Largest frames (deep memory usage, MB)")
+        st.dataframe(frame_sizes(data).head(10), hide_index=True, use_container_width=True,
+                     column_config={'deep_mb': st.column_config.NumberColumn(format="%.1f")})
+
+def render_section(section, data):
+    """Render the selected section from the shared data"""
     if section == "Executive Summary":
         st.markdown('<div class="main-header">Instagram Reels Quick Edit Feature Analysis</div>', unsafe_allow_html=True)
         
@@ -511,46 +691,37 @@ def main():
         
     elif section == "A/B Test Results":
         st.markdown('<div class="main-header">A/B Test Statistical Analysis</div>', unsafe_allow_html=True)
-        plot_ab_test_results(data['ab_results'])
-        
-        # Statistical significance
-        st.markdown("""
-        ### 📈 Statistical Significance Interpretation
+        plot_ab_test_results(data['ab_contrasts'], data.get('figures', {}).get('ab_forest'), data.get('assignment_health'))
         
-        | Metric | Change | p-value | Interpretation |
-        |--------|--------|---------|----------------|
-        | Edit Tools Used | -0.6% | 0.0003 | ✅ **Positive** - Quick Edit is replacing manual editing |
-        | Quick Edit Used | +60% | <0.0001 | ✅ **Excellent** - Strong feature appeal |
-        | Session Duration | +0.1% | 0.5702 | ✅ **Neutral** - No negative UX impact |
-        
-        **Note**: All p-values < 0.05 indicate statistically significant results.
-        """)
+        plot_guardrails(data['guardrail_stats'])
         
     elif section == "Funnel Analysis":
         st.markdown('<div class="main-header">Creation Funnel Analysis</div>', unsafe_allow_html=True)
-        plot_funnel_analysis(data['funnel_overall'])
+        plot_funnel_analysis(data['funnel_overall'], data.get('figures', {}).get('funnel'))
+        plot_ordered_funnel(data['events'])
         
     elif section == "Business Impact":
         st.markdown('<div class="main-header">Business Impact Analysis</div>', unsafe_allow_html=True)
-        plot_business_impact(data['business_impact'])
-        
-        # ROI calculation
-        st.markdown("""
-        ### 💰 ROI Calculation
-        
-        | Metric | Value |
-        |--------|-------|
-        | Monthly Revenue Impact | ${:,.0f} |
-        | Engineering Cost | $500,000 |
-        | Payback Period | **<1 month** |
-        | Annualized ROI | **>2400%** |
         
-        **Note**: Engineering cost includes development, testing, and deployment.
-        """.format(data['business_impact']['monthly']['additional_revenue']))
+        business_impact_section(data['sensitivity_surface'])
         
     elif section == "Launch Strategy":
         st.markdown('<div class="main-header">Phased Launch Strategy</div>', unsafe_allow_html=True)
-        plot_launch_strategy()
+        
+        # Build the section's charts concurrently, then render in page order
+        retention = data['retention']
+        alerts = data['rollout_alerts']
+        prepared = prepare({
+            'timeline': lambda: launch_timeline_figure(alerts=alerts),
+            'anomalies': lambda: hourly_rates_figure(data['rollout_hourly'], alerts),
+            'uplift': lambda: uplift_deciles_figure(data['uplift_deciles']),
+            'retention_summary': retention.summary,
+            'retention': lambda: retention_heatmap_figure(retention.curves()),
+        })
+        plot_launch_strategy(prepared['timeline'])
+        plot_rollout_assignment(data['rollout_report'])
+        plot_rollout_anomalies(alerts, prepared['anomalies'])
+        plot_uplift_deciles(data['uplift_deciles'], prepared['uplift'])
         
         # Risks and mitigations
         st.markdown("""
@@ -563,6 +734,7 @@ def main():
         | Feature fatigue | Low | Medium | Track 7-day, 30-day retention |
         | Infrastructure scaling | Low | Medium | Gradual rollout with monitoring |
         """)
+        plot_retention(prepared['retention_summary'], prepared['retention'])
         
     elif section == "Methodology":
         st.markdown('<div class="main-header">Methodology & Technical Details</div>', unsafe_allow_html=True)
@@ -572,7 +744,7 @@ def main():
         
         | Parameter | Value |
         |-----------|-------|
-        | Experiment Type | A/B Test |
+        | Experiment Type | A/B/n Test |
         | Population | 5% of Instagram users |
         | Duration | 14 days |
         | Sample Size | 500,000 user sessions |
@@ -581,32 +753,26 @@ def main():
         
         ### 📊 Statistical Methods
         
-        1. **Hypothesis Testing**: Two-sample t-test with Welch's correction
-        2. **Confidence Intervals**: 95% using normal approximation
-        3. **Power Analysis**: 80% power to detect 10% lift
-        4. **Multiple Testing**: No correction needed (single primary metric)
+        1. **Hypothesis Testing**: Every variant against control (optionally all pairs), overall and per segment. Means are ratios of per-user sums with user-clustered delta-method standard errors (sessions of one user are not independent); p-values from the normal approximation
+        2. **Multiple Testing**: Holm-adjusted p-values within each segment and metric; Benjamini-Hochberg and Bonferroni are available
+        3. **Confidence Intervals**: Bonferroni-simultaneous 95% intervals for the relative lift
+        4. **Power Analysis**: 80% power to detect 10% lift
         
         ### 💻 Technical Implementation
         
         ```python
-        # Key analysis functions
-        def analyze_ab_test(df, metric='successful_post'):
-            control = df[df['variant'] == 'control'][metric]
-            treatment = df[df['variant'] == 'treatment'][metric]
-            
-            # Calculate means and confidence intervals
-            control_mean = control.mean()
-            treatment_mean = treatment.mean()
-            lift = (treatment_mean - control_mean) / control_mean
-            
-            # T-test for statistical significance
-            t_stat, p_value = stats.ttest_ind(treatment, control, equal_var=False)
-            
-            return {
-                'lift': lift,
-                'p_value': p_value,
-                'significant': p_value < 0.05
-            }
+        # Sessions -> per-user totals (one factorize plus a bincount per metric)
+        totals = user_totals(sessions, ['successful_post'], cluster='user_id')
+        
+        # Per-(segment, variant) sums -> ratio means with cluster-robust variances;
+        # rows of a / b select each contrast's variant and baseline arm
+        for metric, segments, sums in variant_sums(totals, ['successful_post'])[1]:
+            mean, var = ratio_variance(sums['y'], sums['n'], sums['yy'], sums['nn'], sums['yn'])
+            p_value = 2 * stats.norm.sf(np.abs(mean @ a.T - mean @ b.T) / np.sqrt(var @ a.T + var @ b.T))
+            p_adjusted = adjust_p_values(p_value, method='holm')
+        
+        # All of the above, as a table of contrasts
+        contrasts = compare_totals(totals, 'successful_post', control='control', correction='holm')
         ```
         
         ### 📈 Data Sources
@@ -627,6 +793,64 @@ def main():
         └── results/        # Analysis outputs
         ```
         """)
+        
+    elif section == "Live Monitoring":
+        st.markdown('<div class="main-header">Live Monitoring</div>', unsafe_allow_html=True)
+        plot_live_monitor()
+        
+    elif section == "Data Validation":
+        st.markdown('<div class="main-header">Data Validation</div>', unsafe_allow_html=True)
+        plot_data_validation(data['validation'])
+        
+    elif section == "Run Comparison":
+        st.markdown('<div class="main-header">Run Comparison</div>', unsafe_allow_html=True)
+        plot_run_comparison(SnapshotStore())
+
+def main():
+    """Main dashboard function"""
+    
+    # Sidebar
+    with st.sidebar:
+        st.image("https://cdn-icons-png.flaticon.com/512/124/124010.png", width=100)
+        st.title("Instagram Reels Analytics")
+        
+        st.markdown("---")
+        
+        st.markdown("### 📊 Dashboard Sections")
+        section = st.radio(
+            "Navigate to:",
+            ["Executive Summary", "A/B Test Results", "Funnel Analysis", 
+             "Business Impact", "Launch Strategy", "Methodology", "Live Monitoring", "Data Validation",
+             "Run Comparison"],
+            key="section"
+        )
+        
+        st.markdown("---")
+        
+        st.markdown("### 📈 Last Updated")
+        st.caption("February 15, 2026")
+        
+        st.markdown("### 👤 Analyst")
+        st.caption("Your Name - Senior Data Scientist")
+    
+    # Load data (shared across sessions; only widget state is per session)
+    data = load_shared_data()
+    start_metrics_api()
+    
+    with st.sidebar:
+        report = data['validation']
+        if report.empty:
+            st.caption("✅ Data validation passed")
+        else:
+            st.caption(f"⚠️ {len(report)} data validation issue(s) - see Data Validation")
+    
+    # Main content based on section
+    with profiler.measure(f"section: {section}"):
+        render_section(section, data)
+    
+    if profiler.enabled:
+        with st.sidebar:
+            plot_memory_profile(data)
     
     # Footer
     st.markdown("---")
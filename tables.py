@@ -0,0 +1,112 @@
+"""
+Server-side paginated tables for the dashboard
+
+paged_table() keeps the frame numeric and does filtering, sorting and
+pagination in pandas / numpy on the server; only the visible page is sent
+to the browser, formatted through st.column_config instead of per-cell
+string formatting. It runs as a fragment, so paging or sorting reruns only
+the table.
+"""
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+PAGE_SIZES = [10, 25, 100, 500]
+
+# Fragments rerun on their own when a widget inside them changes (Streamlit >= 1.37).
+# On older versions this is a no-op and every interaction reruns the whole page.
+fragment = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None) or (lambda func: func)
+
+
+def fragment_every(seconds):
+    """Fragment that also reruns itself every `seconds`; a plain fragment (no timer) where unsupported"""
+    timed = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None)
+    return timed(run_every=seconds) if timed else fragment
+
+
+def filter_rows(frame, query, columns):
+    """Boolean mask of rows where any of `columns` contains `query` (case-insensitive)"""
+    if not query:
+        return np.ones(len(frame), dtype=bool)
+    mask = np.zeros(len(frame), dtype=bool)
+    for column in columns:
+        mask |= frame[column].astype(str).str.contains(query, case=False, regex=False).to_numpy()
+    return mask
+
+
+def sort_order(values, ascending=True):
+    """Stable row order for one column, NaNs last"""
+    values = values.to_numpy() if isinstance(values, pd.Series) else np.asarray(values)
+    if values.dtype.kind in 'biuf':
+        keys = values.astype(float)
+        keys = np.where(np.isnan(keys), np.inf, keys if ascending else -keys)
+        return np.argsort(keys, kind='stable')
+    order = pd.Series(values).astype(str).argsort(kind='stable').to_numpy()
+    return order if ascending else order[::-1]
+
+
+def page_window(frame, page, page_size, sort_by=None, ascending=True, mask=None):
+    """(visible rows, total matching rows) after filter, sort and pagination"""
+    rows = np.flatnonzero(mask) if mask is not None else np.arange(len(frame))
+    if sort_by is not None:
+        rows = rows[sort_order(frame[sort_by].to_numpy()[rows], ascending)]
+    start = page * page_size
+    return frame.iloc[rows[start:start + page_size]], len(rows)
+
+
+def _column_config(frame, labels, percent_columns, formats):
+    config = {}
+    for column in frame.columns:
+        label = labels.get(column, column)
+        if column in percent_columns:
+            config[column] = st.column_config.NumberColumn(label, format="%.1f%%")
+        elif column in formats:
+            config[column] = st.column_config.NumberColumn(label, format=formats[column])
+        else:
+            config[column] = st.column_config.Column(label)
+    return config
+
+
+@fragment
+def paged_table(frame, key, labels=None, percent_columns=(), formats=None, search_columns=None,
+                default_sort=None, page_size=25):
+    """Filterable, sortable, paginated view of a numeric frame
+
+    percent_columns hold fractions (0.153) and are shown as percentages;
+    formats maps other columns to printf-style formats (e.g. '%.4f').
+    """
+    labels = labels or {}
+    formats = formats or {}
+    search_columns = search_columns or [c for c in frame.columns if not pd.api.types.is_numeric_dtype(frame[c])]
+
+    col1, col2, col3, col4 = st.columns([3, 2, 1, 1])
+    with col1:
+        query = st.text_input("Filter", key=f"{key}_filter", placeholder="Search " + ", ".join(
+            labels.get(c, c) for c in search_columns)) if search_columns else ''
+    with col2:
+        columns = list(frame.columns)
+        sort_by = st.selectbox("Sort by", columns, key=f"{key}_sort",
+                               index=columns.index(default_sort) if default_sort in columns else 0,
+                               format_func=lambda c: labels.get(c, c))
+    with col3:
+        descending = st.toggle("Descending", key=f"{key}_desc")
+    with col4:
+        size = st.selectbox("Rows", PAGE_SIZES, key=f"{key}_size",
+                            index=PAGE_SIZES.index(page_size) if page_size in PAGE_SIZES else 1)
+
+    mask = filter_rows(frame, query, search_columns)
+    n_pages = max(1, -(-int(mask.sum()) // size))
+    page = 0
+    if n_pages > 1:
+        page = st.number_input(f"Page (of {n_pages:,})", min_value=1, max_value=n_pages, value=1,
+                               key=f"{key}_page") - 1
+        page = min(page, n_pages - 1)
+
+    visible, total = page_window(frame, page, size, sort_by, not descending, mask)
+    # Only the visible window is scaled for display; the source frame stays untouched
+    visible = visible.assign(**{c: visible[c] * 100 for c in percent_columns if c in visible})
+    st.dataframe(visible, use_container_width=True, hide_index=True,
+                 column_config=_column_config(visible, labels, percent_columns, formats))
+    st.caption(f"Rows {page * size + min(1, total):,}-{min((page + 1) * size, total):,} of {total:,}"
+               + (f" (filtered from {len(frame):,})" if total != len(frame) else ""))
@@ -0,0 +1,184 @@
+"""
+Per-user uplift (heterogeneous treatment effect) model for Quick Edit
+Run: python uplift.py data/processed/sessions.csv results
+
+T-learner: one logistic model per variant predicts whether a user's session
+ends in a posted Reel (the A/B primary metric); a user's uplift is the
+treatment probability minus the control probability. Both models are SGD
+logistic regressions trained with partial_fit, so the session table can be
+streamed in chunks.
+
+Features are fixed before treatment can act: device, creator cohort and
+the number of sessions a user had before first opening the editor (where
+Quick Edit is shown), and only sessions from that first exposure on are
+examples. Users are split into a training set and a holdout, and the
+deciles are evaluated on the holdout users only.
+
+Scoring only needs the two coefficient vectors, so score_uplift() runs as
+a block-wise matrix product and handles arbitrarily large user tables
+(optionally into a memory-mapped output array).
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from scipy.special import expit
+from sklearn.linear_model import SGDClassifier
+
+from sessionization import STEP_BITS
+
+MODEL_PATH = 'results/uplift_model.npz'
+DECILES_PATH = 'results/uplift_deciles.csv'
+ARMS = ['control', 'treatment']
+FEATURE_NAMES = ['iphone', 'power_creator', 'iphone_x_power', 'log_prior_sessions', 'log_prior_sessions_x_power']
+EXPOSURE_STEP = 'edit_tool_opened'
+HOLDOUT_SHARE = 0.3
+SCORE_BLOCK = 1_000_000
+
+
+def session_examples(sessions):
+    """Sessions from each user's first exposure on, with the training label and pre-exposure activity
+
+    A user is exposed in their first session that opens the editor; users
+    never exposed have no examples. `prior_sessions` counts the user's
+    sessions that started before that one.
+    """
+    sessions = sessions.sort_values(['user_id', 'session_start'], kind='stable')
+    exposed = (sessions['steps_mask'].to_numpy() & STEP_BITS[EXPOSURE_STEP]) > 0
+    user_ids = sessions['user_id'].to_numpy()
+    rank = sessions.groupby('user_id').cumcount().to_numpy()
+    first = pd.Series(np.where(exposed, rank, np.iinfo(np.int64).max)).groupby(user_ids).transform('min').to_numpy()
+    after = rank >= first
+
+    examples = sessions.loc[after, ['user_id', 'variant', 'device_type', 'creator_cohort']].reset_index(drop=True)
+    examples['posted'] = (sessions['steps_mask'].to_numpy()[after] & STEP_BITS['reels_posted']) > 0
+    examples['prior_sessions'] = first[after].astype(np.int32)
+    return examples
+
+
+def user_table(examples):
+    """One row per user with the attributes user_features() needs"""
+    return examples.drop_duplicates('user_id')[['user_id', 'variant', 'device_type', 'creator_cohort',
+                                                 'prior_sessions']].reset_index(drop=True)
+
+
+def user_features(frame):
+    """float32 design matrix (columns in FEATURE_NAMES order) from user attributes"""
+    iphone = (frame['device_type'] == 'iPhone').to_numpy(dtype=np.float32)
+    power = (frame['creator_cohort'] == 'power_creator').to_numpy(dtype=np.float32)
+    log_prior = np.log1p(frame['prior_sessions'].to_numpy(dtype=np.float32))
+    return np.column_stack([iphone, power, iphone * power, log_prior, log_prior * power])
+
+
+class UpliftModel:
+    """Per-arm logistic coefficients; coef has shape (len(ARMS), n_features)"""
+
+    def __init__(self, coef, intercept):
+        self.coef = np.asarray(coef, dtype=np.float32)
+        self.intercept = np.asarray(intercept, dtype=np.float32)
+
+    def predict(self, X):
+        """(n, 2) posting probabilities under control and treatment"""
+        return expit(X @ self.coef.T + self.intercept)
+
+    def uplift(self, X):
+        probs = self.predict(X)
+        return probs[:, 1] - probs[:, 0]
+
+    def save(self, path=MODEL_PATH):
+        np.savez(path, coef=self.coef, intercept=self.intercept, features=np.asarray(FEATURE_NAMES))
+
+    @classmethod
+    def load(cls, path=MODEL_PATH):
+        with np.load(path) as f:
+            if list(f['features']) != FEATURE_NAMES:
+                raise ValueError(f"{path} was trained on different features; retrain it")
+            return cls(f['coef'], f['intercept'])
+
+
+def train_uplift(chunks, epochs=10, alpha=1e-4, seed=0):
+    """Fit the T-learner incrementally on chunks of session_examples()
+
+    `chunks` is a list of frames, or a callable returning a fresh iterator of
+    frames for every epoch (e.g. a chunked file reader).
+    """
+    models = {arm: SGDClassifier(loss='log_loss', alpha=alpha, random_state=seed) for arm in ARMS}
+    for _ in range(epochs):
+        for chunk in (chunks() if callable(chunks) else chunks):
+            X = user_features(chunk)
+            y = chunk['posted'].to_numpy(dtype=np.int8)
+            variant = chunk['variant'].to_numpy()
+            for arm, model in models.items():
+                mask = variant == arm
+                if mask.any():
+                    model.partial_fit(X[mask], y[mask], classes=[0, 1])
+    return UpliftModel(np.vstack([models[arm].coef_ for arm in ARMS]),
+                       np.concatenate([models[arm].intercept_ for arm in ARMS]))
+
+
+def score_uplift(model, users, block_size=SCORE_BLOCK, out=None):
+    """Predicted uplift for every user, computed in blocks of `block_size` rows
+
+    Pass a preallocated (or np.memmap) float32 array as `out` to score tables
+    larger than memory.
+    """
+    if out is None:
+        out = np.empty(len(users), dtype=np.float32)
+    for start in range(0, len(users), block_size):
+        block = users.iloc[start:start + block_size]
+        out[start:start + len(block)] = model.uplift(user_features(block))
+    return out
+
+
+def uplift_deciles(users, scores, examples, n_bins=10):
+    """Predicted vs observed per-session uplift by predicted-uplift decile (decile 1 = highest)"""
+    n = len(scores)
+    order = np.argsort(-scores, kind='stable')
+    decile = np.empty(n, dtype=np.int16)
+    decile[order] = np.arange(n) * n_bins // n + 1
+
+    per_user = pd.DataFrame({'decile': decile, 'predicted': scores}, index=users['user_id'].to_numpy())
+    sessions = examples[['variant', 'posted']].assign(decile=per_user['decile'].reindex(examples['user_id']).to_numpy())
+    rates = sessions.groupby(['decile', 'variant'], observed=True)['posted'].mean().unstack()
+    grouped = per_user.groupby('decile')
+    deciles = pd.DataFrame({
+        'users': grouped.size(),
+        'predicted_uplift': grouped['predicted'].mean(),
+        'control_rate': rates['control'],
+        'treatment_rate': rates['treatment'],
+    })
+    deciles['observed_uplift'] = deciles['treatment_rate'] - deciles['control_rate']
+    return deciles.reset_index()
+
+
+def holdout_users(user_ids, share=HOLDOUT_SHARE, seed=0):
+    """Boolean mask of the users held out of training, a fixed random `share` of them"""
+    return np.random.default_rng(seed).random(len(user_ids)) < share
+
+
+def build_uplift(sessions, epochs=10, chunksize=SCORE_BLOCK, holdout_share=HOLDOUT_SHARE):
+    """Train on a session table joined to user attributes; returns (model, holdout deciles)"""
+    examples = session_examples(sessions)
+    users = user_table(examples)
+    held = holdout_users(users['user_id'], holdout_share)
+    is_held = examples['user_id'].isin(users['user_id'][held]).to_numpy()
+
+    train = examples[~is_held]
+    chunks = [train.iloc[i:i + chunksize] for i in range(0, len(train), chunksize)]
+    model = train_uplift(chunks, epochs)
+    holdout = users[held].reset_index(drop=True)
+    return model, uplift_deciles(holdout, score_uplift(model, holdout), examples[is_held])
+
+
+def main(sessions_path, output_dir='results'):
+    os.makedirs(output_dir, exist_ok=True)
+    model, deciles = build_uplift(pd.read_csv(sessions_path))
+    model.save(os.path.join(output_dir, os.path.basename(MODEL_PATH)))
+    deciles.to_csv(os.path.join(output_dir, os.path.basename(DECILES_PATH)), index=False)
+    print(deciles.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:3])
@@ -0,0 +1,328 @@
+"""
+Declarative, vectorized data validation for ingestion
+
+Schemas map column -> rules (dtype kind, nullability, min/max, allowed
+values, uniqueness). Every rule is a whole-column array operation, so a
+chunk is checked in one pass with no per-row Python; the validator can sit
+inside a chunked reader (or each ETL worker) and keep pace with parsing.
+
+Consistency checks on top of the schema:
+    - funnel monotonicity: sessions_reached never increases along the funnel
+    - variant balance: chi-square sample-ratio-mismatch test on assignments
+    - duplicate events: same (user_id, event_name, timestamp) seen twice,
+      within a chunk or across chunks inside a trailing time window
+"""
+
+import numpy as np
+import pandas as pd
+
+from analysis_functions import srm_chi_square
+from data_generation import CRASH_EVENT, DIVERGENT_EVENTS, FUNNEL_STEPS, VARIANT_MULTIPLIERS
+
+VIOLATION_COLUMNS = ['dataset', 'check', 'column', 'severity', 'violations', 'detail']
+SRM_ALPHA = 0.001
+DEDUP_WINDOW = pd.Timedelta(hours=1)
+
+EVENTS_SCHEMA = {
+    'user_id': {'kind': 'integer', 'min': 1},
+    'event_name': {'kind': 'string', 'allowed': FUNNEL_STEPS + DIVERGENT_EVENTS + [CRASH_EVENT]},
+    'timestamp': {'kind': 'datetime'},
+}
+USERS_SCHEMA = {
+    'user_id': {'kind': 'integer', 'min': 1, 'unique': True},
+    'variant': {'kind': 'string', 'allowed': list(VARIANT_MULTIPLIERS)},
+    'device_type': {'kind': 'string', 'allowed': ['iPhone', 'Android']},
+    'creator_cohort': {'kind': 'string', 'allowed': ['casual_creator', 'power_creator']},
+}
+AB_RESULTS_SCHEMA = {
+    'segment': {'kind': 'string'},
+    'control_mean': {'kind': 'number', 'min': 0, 'max': 1},
+    'treatment_mean': {'kind': 'number', 'min': 0, 'max': 1},
+    'relative_lift': {'kind': 'number'},
+    'p_value': {'kind': 'number', 'min': 0, 'max': 1},
+    'significant': {'kind': 'bool'},
+}
+FUNNEL_SCHEMA = {
+    'funnel_step': {'kind': 'string', 'allowed': FUNNEL_STEPS},
+    'sessions_reached': {'kind': 'number', 'min': 0},
+    'conversion_rate': {'kind': 'number', 'min': 0, 'max': 1},
+    'dropoff_rate': {'kind': 'number', 'min': 0, 'max': 1},
+}
+SCHEMAS = {'events': EVENTS_SCHEMA, 'users': USERS_SCHEMA}
+
+_KIND_CHECKS = {
+    'integer': pd.api.types.is_integer_dtype,
+    'number': pd.api.types.is_numeric_dtype,
+    'bool': pd.api.types.is_bool_dtype,
+    'datetime': pd.api.types.is_datetime64_any_dtype,
+    'string': lambda s: pd.api.types.is_string_dtype(s) or isinstance(s.dtype, pd.CategoricalDtype),
+}
+
+
+def _violation(dataset, check, column, count, detail='', severity='error'):
+    return {'dataset': dataset, 'check': check, 'column': column, 'severity': severity,
+            'violations': int(count), 'detail': detail}
+
+
+def source_fallback(dataset, error):
+    """Warning row recording that a missing source was replaced with demo data"""
+    path = getattr(error, 'filename', None) or str(error)
+    return _violation(dataset, 'source_missing', path, 0, "file not found; showing generated demo data",
+                      severity='warning')
+
+
+def memory_budget_warning(dataset, used_mb, budget_mb, downcast_mb):
+    """Warning row for a frame loaded over its memory budget, after downcasting"""
+    still_over = downcast_mb > budget_mb
+    detail = f"{used_mb:,.1f} MB over {budget_mb:,.1f} MB budget; downcast to {downcast_mb:,.1f} MB"
+    return _violation(dataset, 'memory_budget', 'deep_memory_usage', int(still_over),
+                      detail + (" (still over)" if still_over else ""), severity='warning')
+
+
+def _example(values, mask):
+    hits = values[mask]
+    return f"e.g. {hits.iloc[0]}" if len(hits) else ''
+
+
+def check_schema(frame, schema, dataset):
+    """Type, null, range, allowed-value and uniqueness violations for one frame or chunk"""
+    violations = []
+    for column, rules in schema.items():
+        if column not in frame.columns:
+            violations.append(_violation(dataset, 'missing_column', column, len(frame), "column not present"))
+            continue
+        values = frame[column]
+
+        nulls = values.isna().to_numpy()
+        if nulls.any() and not rules.get('nullable', False):
+            violations.append(_violation(dataset, 'null', column, nulls.sum()))
+
+        kind = rules.get('kind')
+        if kind and not _KIND_CHECKS[kind](values):
+            # A numeric column read as strings: count the cells that do not parse
+            if kind in ('integer', 'number'):
+                bad = pd.to_numeric(values, errors='coerce').isna().to_numpy() & ~nulls
+                violations.append(_violation(dataset, 'type', column, bad.sum(),
+                                             f"expected {kind}, got {values.dtype}; {_example(values, bad)}"))
+                values = pd.to_numeric(values, errors='coerce')
+            else:
+                violations.append(_violation(dataset, 'type', column, len(values) - nulls.sum(),
+                                             f"expected {kind}, got {values.dtype}"))
+                continue
+
+        if 'min' in rules or 'max' in rules:
+            numeric = values.to_numpy(dtype=float, na_value=np.nan)
+            out = np.zeros(len(numeric), dtype=bool)
+            if 'min' in rules:
+                out |= numeric < rules['min']
+            if 'max' in rules:
+                out |= numeric > rules['max']
+            if out.any():
+                violations.append(_violation(dataset, 'range', column, out.sum(),
+                                             f"outside [{rules.get('min', '-inf')}, {rules.get('max', 'inf')}]; "
+                                             f"{_example(values, out)}"))
+
+        if 'allowed' in rules:
+            unknown = ~values.isin(rules['allowed']).to_numpy() & ~nulls
+            if unknown.any():
+                violations.append(_violation(dataset, 'allowed_values', column, unknown.sum(),
+                                             _example(values, unknown)))
+
+        if rules.get('unique'):
+            duplicated = values.duplicated().to_numpy()
+            if duplicated.any():
+                violations.append(_violation(dataset, 'unique', column, duplicated.sum(),
+                                             _example(values, duplicated)))
+    return violations
+
+
+def check_funnel_monotonic(funnel, dataset='funnel', group=None):
+    """sessions_reached must be non-increasing along the funnel (within each group)"""
+    counts = funnel['sessions_reached']
+    previous = funnel.groupby(group)['sessions_reached'].shift(1) if group else counts.shift(1)
+    increases = (counts > previous).to_numpy()
+    if not increases.any():
+        return []
+    steps = funnel.loc[increases, 'funnel_step'].astype(str).unique()
+    return [_violation(dataset, 'funnel_monotonicity', 'sessions_reached', increases.sum(),
+                       "count rises at " + ", ".join(steps))]
+
+
+def check_variant_balance(counts, dataset, expected_shares=(0.5, 0.5), alpha=SRM_ALPHA):
+    """Chi-square SRM test on a (groups x variants) count table"""
+    counts = pd.DataFrame(counts)
+    chi2, p_value = srm_chi_square(counts.to_numpy(), np.asarray(expected_shares))
+    failing = p_value < alpha
+    if not failing.any():
+        return []
+    names = ", ".join(f"{g} (p={p:.2g})" for g, p in zip(counts.index[failing], p_value[failing]))
+    return [_violation(dataset, 'variant_balance', 'variant', failing.sum(), names, severity='warning')]
+
+
+def assignment_health(users, first_seen=None, segments=('creator_cohort', 'device_type'), control='control',
+                      expected_shares=None, alpha=SRM_ALPHA):
+    """SRM chi-square for every segment value, over all days and per first-exposure day, in one batched pass
+
+    users has user_id, variant and the segment columns; first_seen, if given,
+    is each exposed user's first event time (a Series indexed by user_id) and
+    restricts the check to exposed users, split by exposure day. Every user
+    lands in one (segment, day, variant) cell per segment column, so the
+    counts are one bincount over the users and the tests one srm_chi_square
+    call, however many segment values and days there are.
+
+    Returns one row per (segment, day): day is NaT for the all-days test,
+    n_<variant> the user counts, and srm whether p_value is below alpha
+    (alpha / number of days for the daily tests).
+    """
+    if first_seen is not None:
+        users = users[users['user_id'].isin(first_seen.index)]
+        day_values = first_seen.reindex(users['user_id']).dt.normalize().to_numpy()
+        day_codes, days = pd.factorize(day_values, sort=True)
+    else:
+        day_codes, days = np.full(len(users), -1), np.empty(0, dtype='datetime64[ns]')
+    variant_codes, observed = pd.factorize(users['variant'].astype(str))
+    variants = [control] + sorted(set(observed) - {control})
+    variant_codes = pd.Index(variants).get_indexer(observed)[variant_codes]
+    n_days, k = len(days), len(variants)
+
+    # Per segment column: (value, day slot) rows, day slot 0 = all days
+    labels, cells, offset = [], [], 0
+    for column in [None] + [c for c in segments if c in users.columns]:
+        if column is None:
+            seg_codes, values = np.zeros(len(users), dtype=np.int64), np.array(['overall'])
+        else:
+            seg_codes, values = pd.factorize(users[column].astype(str), sort=True)
+        rows = offset + seg_codes * (n_days + 1)
+        cells.append(rows * k + variant_codes)
+        if n_days:
+            cells.append((rows + 1 + day_codes) * k + variant_codes)
+        labels.append(values)
+        offset += len(values) * (n_days + 1)
+    cells = np.concatenate(cells)
+    counts = np.bincount(cells, minlength=offset * k).reshape(offset, k)
+
+    shares = np.ones(k) if expected_shares is None else np.asarray(expected_shares, dtype=float)
+    chi2, p_value = srm_chi_square(counts, shares)
+    table = pd.DataFrame(counts, columns=[f'n_{v}' for v in variants])
+    table.insert(0, 'segment', np.repeat(np.concatenate(labels), n_days + 1))
+    table.insert(1, 'day', np.tile(np.r_[np.datetime64('NaT', 'ns'), days.astype('datetime64[ns]')],
+                                   offset // (n_days + 1)))
+    table['chi2'] = chi2
+    table['p_value'] = p_value
+    table['srm'] = p_value < np.where(table['day'].isna(), alpha, alpha / max(n_days, 1))
+    # Days with no users in a segment have nothing to test
+    return table[counts.sum(axis=1) > 0].reset_index(drop=True)
+
+
+def segment_health(table):
+    """Per-segment status from assignment_health: 'srm' (all-days test fails), 'warn' (some day fails), 'ok'"""
+    overall = table[table['day'].isna()].set_index('segment')
+    daily = table[table['day'].notna()]
+    failing_days = daily[daily['srm']].groupby('segment').size().reindex(overall.index, fill_value=0)
+    health = pd.DataFrame({
+        'p_value': overall['p_value'],
+        'min_daily_p': daily.groupby('segment')['p_value'].min().reindex(overall.index),
+        'failing_days': failing_days,
+    })
+    health['status'] = np.where(overall['srm'], 'srm', np.where(failing_days > 0, 'warn', 'ok'))
+    return health
+
+
+def assignment_health_violations(table, dataset='assignment'):
+    """Validation warnings for segments and days that fail the SRM test"""
+    failing = table[table['srm']]
+    if failing.empty:
+        return []
+    names = ", ".join(row.segment + ("" if pd.isna(row.day) else f" on {row.day:%b %d}") + f" (p={row.p_value:.2g})"
+                      for row in failing.head(10).itertuples())
+    return [_violation(dataset, 'variant_balance_by_day', 'variant', len(failing), names, severity='warning')]
+
+
+class EventValidator:
+    """Chunk-by-chunk validator for raw events
+
+    Duplicate detection across chunks keeps the hashes of events from the
+    trailing `dedup_window` only, so state stays bounded for time-ordered
+    input; duplicates further apart than the window are not detected.
+    """
+
+    def __init__(self, schema=EVENTS_SCHEMA, dataset='events', dedup_window=DEDUP_WINDOW):
+        self.schema = schema
+        self.dataset = dataset
+        self.window = pd.Timedelta(dedup_window)
+        self.violations = []
+        self.rows = 0
+        self._recent_hashes = np.empty(0, dtype=np.uint64)
+        self._recent_ts = np.empty(0, dtype='datetime64[ns]')
+
+    def validate_chunk(self, chunk):
+        """Check one chunk; violations accumulate on the validator"""
+        self.rows += len(chunk)
+        self.violations += check_schema(chunk, self.schema, self.dataset)
+
+        keys = chunk[['user_id', 'event_name', 'timestamp']]
+        hashes = pd.util.hash_pandas_object(keys.astype({'event_name': str}), index=False).to_numpy()
+        within = pd.Series(hashes).duplicated().to_numpy()
+        across = np.isin(hashes, self._recent_hashes) & ~within
+        if within.any() or across.any():
+            self.violations.append(_violation(self.dataset, 'duplicate_event', 'user_id, event_name, timestamp',
+                                              within.sum() + across.sum()))
+
+        ts = chunk['timestamp'].to_numpy(dtype='datetime64[ns]')
+        if len(ts):
+            horizon = ts.max() - self.window.to_timedelta64()
+            all_hashes = np.r_[self._recent_hashes, hashes]
+            all_ts = np.r_[self._recent_ts, ts]
+            keep = all_ts >= horizon
+            self._recent_hashes, self._recent_ts = all_hashes[keep], all_ts[keep]
+        return chunk
+
+    def report(self):
+        return violation_report(self.violations)
+
+
+def violation_report(violations):
+    """Collapse per-chunk violations into one row per (dataset, check, column)"""
+    if not violations:
+        return pd.DataFrame(columns=VIOLATION_COLUMNS)
+    frame = pd.DataFrame(violations, columns=VIOLATION_COLUMNS)
+    return (frame.groupby(['dataset', 'check', 'column', 'severity'], sort=False, as_index=False)
+            .agg(violations=('violations', 'sum'), detail=('detail', 'first')))[VIOLATION_COLUMNS]
+
+
+def validate_results(data):
+    """Schema and consistency checks for the loaded result tables"""
+    violations = check_schema(data['ab_results'], AB_RESULTS_SCHEMA, 'ab_results')
+    violations += check_schema(data['funnel_overall'], FUNNEL_SCHEMA, 'funnel_overall')
+    violations += check_funnel_monotonic(data['funnel_overall'], 'funnel_overall')
+
+    funnel_cohort = data.get('funnel_cohort')
+    if funnel_cohort is not None:
+        group = funnel_cohort.columns[0] if funnel_cohort.columns[0] != 'funnel_step' else None
+        violations += check_schema(funnel_cohort, FUNNEL_SCHEMA, 'funnel_cohort')
+        violations += check_funnel_monotonic(funnel_cohort, 'funnel_cohort', group)
+    return violations
+
+
+def check_unknown_users(events, users, dataset='events'):
+    """Events whose user_id is not in the user table; they have no variant and are left out of per-user aggregates"""
+    unknown = ~events['user_id'].isin(users['user_id']).to_numpy()
+    if not unknown.any():
+        return []
+    return [_violation(dataset, 'unknown_user', 'user_id', unknown.sum(), _example(events['user_id'], unknown),
+                       severity='warning')]
+
+
+def validate_users(users, segments=('creator_cohort', 'device_type')):
+    """Schema checks plus variant balance, overall and per segment, for the user table
+
+    Balance is tested on users (the randomization unit), not sessions, whose
+    counts are clustered by user and would inflate the chi-square statistic.
+    """
+    violations = check_schema(users, USERS_SCHEMA, 'users')
+    variants = ['control'] + sorted(set(users['variant'].astype(str)) - {'control'})
+    counts = [users['variant'].value_counts().reindex(variants, fill_value=0).to_frame('overall').T]
+    counts += [pd.crosstab(users[col], users['variant']).reindex(columns=variants, fill_value=0)
+               for col in segments if col in users.columns]
+    violations += check_variant_balance(pd.concat(counts), 'users', np.ones(len(variants)))
+    return violations
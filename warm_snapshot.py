@@ -0,0 +1,268 @@
+"""
+Deploy-time warm snapshot of everything the dashboard loads
+Run: python warm_snapshot.py build  |  python warm_snapshot.py info
+
+load_data() parses CSVs, sessionizes events and builds sketches, retention,
+guardrail and uplift tables; the first viewer after a deploy waits for all
+of it. `build` runs it once and writes the resulting data dict, plus the
+JSON of the data-only figures, into one file:
+
+    WARMSNP1 | header length | JSON header | 64-byte aligned raw arrays
+
+The header describes every entry (frames column by column, the sketch,
+retention and sensitivity objects, plain JSON values) in terms of array
+offsets. At startup the file is memory-mapped and every array is a
+zero-copy view into it, so loading costs a header parse and object
+construction, and pages are read only when a section touches them.
+String columns are stored as codes plus their distinct values. Long ones
+(events.event_name) come back as categoricals over the mapped codes, so
+no per-row strings are built at startup; columns of at most
+STRING_MAX_ROWS rows (result tables, per-user stats) are rebuilt with
+their original dtype, which costs a bounded amount and keeps string
+operations on them working.
+
+The header also records the SHA-256 of every source: the files under
+results/ and data/generated/ and the project modules load_data() runs
+(data_store and everything it imports). The snapshot is used only while
+the same sources exist with the same contents; otherwise the app falls back
+to load_data(). pipeline.py's warm stage applies this same check, so it
+rebuilds the snapshot whenever the app would reject it. Hashes are memoized
+on (size, mtime) as in pipeline.ContentHasher, so an unchanged source costs
+one stat at startup.
+"""
+
+import argparse
+import glob
+import json
+import os
+import struct
+import time
+
+import numpy as np
+import pandas as pd
+
+from creator_sketches import CreatorSketches
+from figures import section_figures
+from pipeline import ContentHasher, project_modules
+from retention import CohortRetention
+from sensitivity import SensitivitySurface
+
+WARM_SNAPSHOT_PATH = 'results/warm_snapshot.bin'
+SOURCE_GLOBS = ['results/*.csv', 'results/*.json', 'results/*.npz', 'data/generated/*']
+SOURCE_MODULES = ['data_store', 'warm_snapshot']
+STRING_MAX_ROWS = 100_000  # longer string columns are decoded as categoricals
+MAGIC = b'WARMSNP1'
+ALIGN = 64
+
+
+class _Writer:
+    """Collects arrays and their offsets while entries are encoded"""
+
+    def __init__(self):
+        self.arrays = []
+        self.offset = 0
+
+    def put(self, values):
+        values = np.ascontiguousarray(values)
+        spec = {'offset': self.offset, 'dtype': values.dtype.str, 'shape': list(values.shape)}
+        self.arrays.append(values)
+        self.offset += -(-values.nbytes // ALIGN) * ALIGN
+        return spec
+
+
+def _codes_dtype(n_categories):
+    """The integer dtype pandas keeps Categorical codes in, so decoding does not copy them"""
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_categories < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def _encode_column(values, writer):
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return {'codec': 'category', 'codes': writer.put(values.cat.codes.to_numpy()),
+                'categories': _encode_column(pd.Series(values.cat.categories), writer),
+                'ordered': bool(values.cat.ordered)}
+    if pd.api.types.is_string_dtype(values) or values.dtype == object:
+        codes, uniques = pd.factorize(values)
+        if not all(isinstance(u, str) for u in uniques):
+            raise TypeError(f"column {values.name!r}: only string object columns can be snapshotted")
+        return {'codec': 'string', 'dtype': str(values.dtype), 'uniques': list(uniques),
+                'codes': writer.put(codes.astype(_codes_dtype(len(uniques))))}
+    if getattr(values.dtype, 'tz', None) is not None:
+        raise TypeError(f"column {values.name!r}: timezone-aware datetimes are not supported")
+    return {'codec': 'array', 'values': writer.put(values.to_numpy())}
+
+
+def _encode(value, writer):
+    """Header spec of one data entry; its arrays go to the writer"""
+    if isinstance(value, pd.DataFrame):
+        columns = [dict(_encode_column(value[c], writer), name=c) for c in value.columns]
+        index = None if value.index.equals(pd.RangeIndex(len(value))) else \
+            dict(_encode_column(value.index.to_series(), writer), name=value.index.name)
+        return {'kind': 'frame', 'rows': len(value), 'columns': columns, 'index': index}
+    if isinstance(value, CreatorSketches):
+        return {'kind': 'sketches', 'keys': _encode(value.keys, writer),
+                'registers': writer.put(value.registers), 'precision': value.precision}
+    if isinstance(value, SensitivitySurface):
+        return {'kind': 'surface', 'axes': {p: writer.put(a) for p, a in value.axes.items()},
+                'values': {name: writer.put(v) for name, v in value.values.items()}}
+    if isinstance(value, CohortRetention):
+        return {'kind': 'retention', 'start': value.start.isoformat(), 'variants': value.variants,
+                'user_index': writer.put(value.user_index.to_numpy()),
+                'user_variant': writer.put(value.user_variant), 'user_cohort': writer.put(value.user_cohort),
+                'days': {str(day): writer.put(rows) for day, rows in value.days.items()},
+                'counts': writer.put(value.counts)}
+    if isinstance(value, dict) and not all(isinstance(v, (str, int, float, type(None))) for v in value.values()):
+        return {'kind': 'dict', 'entries': {k: _encode(v, writer) for k, v in value.items()}}
+    return {'kind': 'json', 'value': value}
+
+
+def write_snapshot(data, path=WARM_SNAPSHOT_PATH):
+    """Write a data dict (as returned by load_data, plus 'figures') to one mappable file"""
+    writer = _Writer()
+    entries = {key: _encode(value, writer) for key, value in data.items()}
+    hasher = ContentHasher()
+    for source in snapshot_sources():
+        hasher(source)
+    header = json.dumps({'created': time.time(), 'sources': hasher.memo, 'entries': entries}).encode()
+    start = -(-(len(MAGIC) + 8 + len(header)) // ALIGN) * ALIGN
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC + struct.pack('<Q', len(header)) + header)
+        for values in writer.arrays:
+            f.write(b'\0' * (start - f.tell()))
+            f.write(values.tobytes())
+            start += -(-values.nbytes // ALIGN) * ALIGN
+    os.replace(tmp, path)
+    return path
+
+
+class _Reader:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a warm snapshot")
+            (length,) = struct.unpack('<Q', f.read(8))
+            self.header = json.loads(f.read(length))
+        self.base = -(-(len(MAGIC) + 8 + length) // ALIGN) * ALIGN
+        # Plain ndarray views that keep the mapping alive, so frames hold no memmap subclass
+        self.buffer = np.memmap(path, dtype=np.uint8, mode='r').view(np.ndarray)
+
+    def get(self, spec):
+        """Zero-copy, read-only view of one stored array"""
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape'], dtype=np.int64))
+        start = self.base + spec['offset']
+        return self.buffer[start:start + count * dtype.itemsize].view(dtype).reshape(spec['shape'])
+
+
+def _decode_column(spec, reader):
+    if spec['codec'] == 'category':
+        categories = _decode_column(spec['categories'], reader)
+        return pd.Categorical.from_codes(reader.get(spec['codes']), categories, ordered=spec['ordered'])
+    if spec['codec'] == 'string':
+        codes = reader.get(spec['codes'])
+        if len(codes) > STRING_MAX_ROWS:
+            return pd.Categorical.from_codes(codes, pd.Index(spec['uniques'], dtype=spec['dtype']))
+        lookup = np.array(spec['uniques'] + [None], dtype=object)
+        return pd.array(lookup[codes], dtype=spec['dtype'])
+    return reader.get(spec['values'])
+
+
+def _decode(spec, reader):
+    kind = spec['kind']
+    if kind == 'frame':
+        index = None
+        if spec['index'] is not None:
+            index = pd.Index(_decode_column(spec['index'], reader), name=spec['index']['name'])
+        return pd.DataFrame({c['name']: _decode_column(c, reader) for c in spec['columns']},
+                            index=index, copy=False)
+    if kind == 'sketches':
+        return CreatorSketches(_decode(spec['keys'], reader), reader.get(spec['registers']), spec['precision'])
+    if kind == 'surface':
+        return SensitivitySurface({p: reader.get(a) for p, a in spec['axes'].items()},
+                                  {name: reader.get(v) for name, v in spec['values'].items()})
+    if kind == 'retention':
+        retention = CohortRetention(spec['start'], spec['variants'])
+        retention.user_index = pd.Index(reader.get(spec['user_index']))
+        retention.user_variant = reader.get(spec['user_variant'])
+        retention.user_cohort = reader.get(spec['user_cohort'])
+        retention.days = {int(day): reader.get(rows) for day, rows in spec['days'].items()}
+        retention.counts = reader.get(spec['counts'])
+        return retention
+    if kind == 'dict':
+        return {key: _decode(entry, reader) for key, entry in spec['entries'].items()}
+    return spec['value']
+
+
+def snapshot_sources():
+    """Data files and module sources whose contents determine what load_data() returns"""
+    files = [p for pattern in SOURCE_GLOBS for p in glob.glob(pattern)]
+    return sorted(files) + list(project_modules(SOURCE_MODULES).values())
+
+
+def read_snapshot(path=WARM_SNAPSHOT_PATH):
+    """The data dict stored in a snapshot, with arrays memory-mapped from the file"""
+    reader = _Reader(path)
+    return {key: _decode(spec, reader) for key, spec in reader.header['entries'].items()}
+
+
+def snapshot_is_fresh(path=WARM_SNAPSHOT_PATH):
+    """True if the snapshot exists and was built from the current contents of every source"""
+    if not os.path.exists(path):
+        return False
+    try:
+        recorded = _Reader(path).header.get('sources')
+    except (ValueError, OSError):
+        return False
+    sources = snapshot_sources()
+    if recorded is None or sorted(recorded) != sorted(sources):
+        return False
+    hasher = ContentHasher({p: dict(record) for p, record in recorded.items()})
+    return all(hasher(p) == recorded[p]['sha256'] for p in sources)
+
+
+def build_warm_snapshot(path=WARM_SNAPSHOT_PATH):
+    """Load and derive everything the dashboard needs, pre-render its static figures, and write the snapshot"""
+    from data_store import load_data
+
+    data = load_data()
+    data['figures'] = {name: fig.to_json() for name, fig in section_figures(data).items()}
+    return write_snapshot(data, path)
+
+
+def load_startup_data(path=WARM_SNAPSHOT_PATH):
+    """The dashboard's data: the warm snapshot when it is fresh, else a full load_data()"""
+    if snapshot_is_fresh(path):
+        return read_snapshot(path)
+    from data_store import load_data
+
+    return load_data()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deploy-time warm snapshot of the dashboard data")
+    parser.add_argument('command', choices=['build', 'info'])
+    parser.add_argument('--path', default=WARM_SNAPSHOT_PATH)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        started = time.perf_counter()
+        build_warm_snapshot(args.path)
+        print(f"Wrote {args.path} ({os.path.getsize(args.path) / 1e6:.1f} MB) "
+              f"in {time.perf_counter() - started:.1f}s")
+    else:
+        started = time.perf_counter()
+        data = read_snapshot(args.path)
+        print(f"{args.path}: mapped {len(data)} entries in {(time.perf_counter() - started) * 1000:.0f} ms, "
+              f"{'fresh' if snapshot_is_fresh(args.path) else 'stale'}")
+        for key, value in data.items():
+            shape = f"{value.shape[0]:,} x {value.shape[1]}" if isinstance(value, pd.DataFrame) else type(value).__name__
+            print(f"  {key:22s} {shape}")
+
+
+if __name__ == "__main__":
+    main()